@@ -2,7 +2,7 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 from typing import List
 
 class Settings(BaseSettings):
-    # choose: github_openai | dummy
+    # choose: github_openai | github_models | gemini | hf | dummy
     ai_provider: str = "github_openai"
 
     # GitHub Models (OpenAI SDK)
@@ -10,6 +10,143 @@ class Settings(BaseSettings):
     github_endpoint: str = "https://models.github.ai/inference"
     github_model_id: str = "openai/gpt-4o-mini"
 
+    # Google Gemini / Hugging Face Inference
+    gemini_api_key: str | None = None
+    gemini_model_id: str = "gemini-1.5-flash"
+    hf_api_token: str | None = None
+    hf_model_id: str = "mistralai/Mistral-7B-Instruct-v0.3"
+
+    # Ordered failover chain, e.g. ["github_openai","gemini"]; empty = ai_provider only.
+    # With hedging on, the next provider also starts once the current one is
+    # slower than its own p<hedge_percentile> latency (defaults until enough samples).
+    provider_chain: List[str] = []
+    hedge_requests: bool = True
+    hedge_percentile: float = 0.95
+    hedge_min_samples: int = 20
+    hedge_min_delay_seconds: float = 2.0
+    hedge_default_delay_seconds: float = 30.0
+
+    # Send the JSON Schema via response_format (falls back to prompt-only if rejected)
+    structured_output: bool = True
+    # Ceiling for the per-request completion budget (see services/prompts.plan)
+    max_output_tokens: int = 8192
+
+    # Shared upstream HTTP pool (one per worker, reused across requests)
+    http_max_connections: int = 64
+    http_max_keepalive: int = 32
+    http_keepalive_expiry: float = 60.0
+    http_http2: bool = True
+    http_connect_timeout: float = 10.0
+    http_timeout: float = 90.0
+    http_warmup: bool = False
+
+    # Serving (python -m app.serve). workers > 1 (0 = one per CPU) runs that
+    # many processes; upstream rate buckets, back-off and in-flight dedup then
+    # live in the shared SQLite file below (the generation cache and job queue
+    # are shared through their own SQLite files already).
+    host: str = "0.0.0.0"
+    port: int = 8000
+    workers: int = 1
+    shared_state_path: str = "data/shared.sqlite3"
+    shared_lease_seconds: float = 120.0
+
+    # Heavy dependencies (python-docx, reportlab, provider SDKs, httpx) load on
+    # first use; warmup=True loads them in the background after start-up.
+    warmup: bool = False
+    # Budget enforced by app/tests/test_startup.py: cold `import app.main` and
+    # RSS once started and idle.
+    startup_import_budget_seconds: float = 2.0
+    startup_rss_budget_mb: int = 120
+
+    # Upstream guard, per provider/model: 0 disables a limit. Waits longer than
+    # upstream_max_wait_seconds fail fast with 503 + Retry-After instead.
+    upstream_rpm: int = 15
+    upstream_tpm: int = 0
+    upstream_max_attempts: int = 4
+    upstream_max_wait_seconds: float = 60.0
+    breaker_failure_threshold: int = 5
+    breaker_cooldown_seconds: float = 30.0
+
+    # Request deadline for /generate, /generate/revise and /generate/stream:
+    # the X-Request-Timeout header (seconds) or this default (0 = none), capped
+    # at the max. Upstream timeouts shrink to the time left; past it -> 504.
+    request_deadline_seconds: float = 90.0
+    request_deadline_max_seconds: float = 300.0
+
+    # Admission control in front of the providers, per worker: at most
+    # admission_concurrency generations at once (0 = no gate), the last
+    # admission_interactive_reserve of them kept for interactive requests;
+    # batch work (/generate/batch, async jobs, X-Priority: batch) gets the
+    # rest. Waiters are served round-robin per client (X-API-Key, else IP) and
+    # get 503 + Retry-After up front if their queue is full or the estimated
+    # wait outlasts their deadline. admission_service_seconds seeds that estimate.
+    admission_concurrency: int = 8
+    admission_interactive_reserve: int = 2
+    admission_max_queue: int = 64
+    admission_service_seconds: float = 20.0
+
+    # Generation result cache (memory LRU + SQLite); empty path disables disk tier
+    cache_enabled: bool = True
+    cache_ttl_seconds: int = 7 * 24 * 3600
+    cache_max_entries: int = 512
+    cache_db_path: str = "data/cache.sqlite3"
+    # Disk tier bounds (0 = unbounded); least recently used rows go first.
+    # Expired rows are purged on every write.
+    cache_disk_max_entries: int = 50_000
+    cache_disk_max_bytes: int = 512 * 1024 * 1024
+
+    # Library of generated requirements, full-text indexed in SQLite FTS5 ("" = off).
+    # library_seed_examples > 0 puts that many similar past requirements in the prompt.
+    library_db_path: str = "data/library.sqlite3"
+    library_seed_examples: int = 0
+    # Ranking considers only the newest N matches, bounding search latency
+    library_rank_window: int = 5000
+
+    # Opt-in sharded generation: one concurrent call per category group
+    sharded_generation: bool = False
+    shard_groups: List[str] = [
+        "Functional",
+        "Performance,Reliability",
+        "Safety,Compliance",
+        "Maintainability,Verification",
+    ]
+    shard_concurrency: int = 4
+
+    # POST /api/generate/batch
+    batch_max_items: int = 200
+    batch_concurrency: int = 8
+
+    # Background jobs (POST /api/generate?async=true)
+    job_workers: int = 2
+    job_db_path: str = "data/jobs.sqlite3"
+    job_result_ttl_seconds: int = 24 * 3600
+    job_max_attempts: int = 2
+    job_poll_seconds: float = 2.0
+    # A running job belongs to the worker that claimed it while that worker
+    # keeps renewing its lease; an expired lease means the worker died.
+    job_lease_seconds: float = 60.0
+
+    # Export rendering: process pool size (0 = thread) and extra queued renders
+    export_workers: int = 2
+    export_max_queue: int = 8
+    # md/pdf exports with at least this many requirements are streamed
+    export_stream_threshold: int = 2000
+    # Rendered export cache (memory LRU, evictions spill to disk if dir is set)
+    export_cache_max_bytes: int = 64 * 1024 * 1024
+    export_cache_dir: str = "data/exports"
+    export_cache_disk_max_bytes: int = 512 * 1024 * 1024
+
+    # Request tracing: span tree per request appended to a JSONL file ("" = off)
+    trace_enabled: bool = True
+    trace_path: str = "data/traces.jsonl"
+    trace_sample_rate: float = 1.0
+    trace_max_spans: int = 1000
+    trace_max_bytes: int = 50 * 1024 * 1024
+
+    # Admin-only debug endpoints (/api/debug/profile); unset = disabled
+    admin_token: str | None = None
+    profile_max_seconds: float = 60.0
+
     cors_origins: List[str] = ["*"]
 
     model_config = SettingsConfigDict(env_file=".env", case_sensitive=False)
@@ -1,3 +1,5 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import ORJSONResponse
@@ -5,8 +7,33 @@ from app.config import settings
 from app.routers import generate
 from app.routers import debug 
 from app.routers import exporter 
+from app.routers import jobs
+from app.routers import requirements
+from app.services.cache import generation_cache
+from app.services.export_engine import export_engine
+from app.services.jobs import job_queue
+from app.services.library import library
+from app.services.registry import registry
+from app.services.tracing import TraceMiddleware
+from app.services.warmup import warm_up
 
-app = FastAPI(title="Mai Backend", default_response_class=ORJSONResponse)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await registry.startup()
+    await job_queue.start()
+    warming = asyncio.create_task(warm_up()) if settings.warmup else None
+    try:
+        yield
+    finally:
+        if warming is not None:
+            warming.cancel()
+        await job_queue.stop()
+        await registry.shutdown()
+        generation_cache.close()
+        library.close()
+        export_engine.shutdown()
+
+app = FastAPI(title="Mai Backend", default_response_class=ORJSONResponse, lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -16,6 +43,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so the request span covers CORS handling and streamed bodies.
+app.add_middleware(TraceMiddleware)
+
 app.include_router(generate.router, prefix="/api")
 app.include_router(debug.router, prefix="/api")
-app.include_router(exporter.router, prefix="/api") 
\ No newline at end of file
+app.include_router(exporter.router, prefix="/api")
+app.include_router(jobs.router, prefix="/api")
+app.include_router(requirements.router, prefix="/api") 
\ No newline at end of file
@@ -1,5 +1,18 @@
-from fastapi import APIRouter
+import asyncio
+import hmac
+import threading
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
 from app.config import settings
+from app.services.admission import admission
+from app.services.cache import generation_cache
+from app.services.export_cache import export_cache
+from app.services.export_engine import export_engine
+from app.services.metrics import IN_FLIGHT, REGISTRY, render_prometheus
+from app.services.profiler import ProfilerBusy, sample
+from app.services.ratelimit import guard_stats
+from app.services.registry import registry
+from app.services.singleflight import inflight
 
 router = APIRouter()
 
@@ -7,7 +20,66 @@ router = APIRouter()
 def dbg():
     return {
         "ai_provider": settings.ai_provider,
+        "provider_chain": registry.chain_names(),
         "github_model_id": settings.github_model_id,
         "github_endpoint": settings.github_endpoint,
         "github_token_present": bool(settings.github_token),
     }
+
+@router.get("/debug/cache")
+def cache_stats():
+    return generation_cache.stats()
+
+@router.get("/debug/counters")
+def counters():
+    return {c.name: c.snapshot() for c in REGISTRY}
+
+@router.get("/debug/exports")
+def export_stats():
+    return {"engine": export_engine.stats(), "cache": export_cache.stats()}
+
+@router.get("/debug/upstream")
+def upstream_stats():
+    return guard_stats()
+
+@router.get("/debug/admission")
+def admission_stats():
+    return admission.stats()
+
+@router.get("/debug/providers")
+def provider_stats():
+    return registry.stats()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus scrape endpoint (text exposition format)."""
+    IN_FLIGHT.set(len(inflight), kind="generate")
+    IN_FLIGHT.set(export_engine.stats()["pending"], kind="export")
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def _require_admin(x_admin_token: str | None = Header(None)):
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled (ADMIN_TOKEN not set)")
+    if not hmac.compare_digest((x_admin_token or "").encode(), settings.admin_token.encode()):
+        raise HTTPException(status_code=403, detail="Bad admin token")
+
+@router.get("/debug/profile", response_class=PlainTextResponse, dependencies=[Depends(_require_admin)])
+async def profile(
+    seconds: float = Query(5.0, gt=0),
+    interval_ms: float = Query(5.0, ge=1, le=1000),
+    all_threads: bool = Query(False, description="Sample every thread, not just the event loop"),
+):
+    """
+    Sample this worker's stacks for ``seconds`` and return collapsed stacks
+    (flamegraph.pl / speedscope input). Admin only: send ``X-Admin-Token``.
+    """
+    if seconds > settings.profile_max_seconds:
+        raise HTTPException(status_code=422, detail=f"seconds is limited to {settings.profile_max_seconds}")
+    loop_thread = threading.get_ident()  # async endpoint: this is the event loop's thread
+    try:
+        stacks, samples = await asyncio.to_thread(
+            sample, seconds, interval_ms / 1000, None if all_threads else loop_thread
+        )
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(stacks, headers={"X-Profile-Samples": str(samples)})
@@ -1,8 +1,22 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import ORJSONResponse
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from datetime import datetime
-from app.schemas import GenerateRequest, GenerateResponse
+from typing import List
+from pydantic import ValidationError
+from app.config import settings
+from app.schemas import GenerateRequest, GenerateResponse, RevisionRequest
+from app.services import admission, deadline
 from app.services.ai_provider import get_provider
+from app.services.batch import run_batch
+from app.services.deadline import ClientDisconnected, DeadlineExceeded
+from app.services.jobs import job_queue
+from app.services.pipeline import run_generate
+from app.services.ratelimit import UpstreamUnavailable
+from app.services.revision import run_revision
+from app.services.streaming import requirement_events
+from app.services.tracing import stage
 
 router = APIRouter()
 
@@ -10,11 +24,146 @@ router = APIRouter()
 async def health():
     return {"status": "ok", "time": datetime.utcnow().isoformat() + "Z"}
 
-@router.post("/generate", response_model=GenerateResponse, response_class=ORJSONResponse)
-async def generate(req: GenerateRequest):
-    provider = get_provider()
+def _bypass_cache(request: Request) -> bool:
+    cc = request.headers.get("cache-control", "").lower()
+    if "no-cache" in cc or "no-store" in cc:
+        return True
+    return request.headers.get("x-cache-bypass", "").lower() in ("1", "true", "yes")
+
+def _client(request: Request, priority: str = admission.INTERACTIVE) -> tuple:
+    """``(client id, priority class)`` for admission; ``X-Priority: batch`` opts down, never up."""
+    if request.headers.get("x-priority", "").lower() == admission.BATCH:
+        priority = admission.BATCH
+    address = request.client.host if request.client else None
+    return admission.client_id(request.headers.get("x-api-key"), address), priority
+
+async def _brief(request: Request) -> GenerateRequest:
+    """The request body as a brief, parsed here (not by FastAPI) so the request_validation stage can be timed."""
+    body = await request.body()
+    with stage("request_validation"):
+        try:
+            return GenerateRequest.model_validate_json(body)
+        except ValidationError as e:
+            errors = e.errors(include_url=False)
+            for err in errors:
+                err["loc"] = ("body", *err["loc"])
+            raise RequestValidationError(errors, body=body)
+
+# _brief reads the body itself, so the schema has to be declared for OpenAPI
+_BRIEF_BODY = {
+    "requestBody": {"required": True, "content": {"application/json": {"schema": GenerateRequest.model_json_schema()}}}
+}
+
+# nginx's "client closed request"; nobody reads it, but it shows up in access logs
+CLIENT_CLOSED = 499
+
+@router.post("/generate", response_model=GenerateResponse, response_class=ORJSONResponse, openapi_extra=_BRIEF_BODY)
+async def generate(
+    request: Request,
+    response: Response,
+    req: GenerateRequest = Depends(_brief),
+    sharded: bool | None = Query(None, description="Generate per category group in parallel (defaults to server setting)"),
+    run_async: bool = Query(False, alias="async", description="Queue the job and return 202 with a job id"),
+):
+    if run_async or "respond-async" in request.headers.get("prefer", "").lower():
+        job_id = await job_queue.submit(req, sharded=sharded)
+        url = f"{request.scope.get('root_path', '')}/api/jobs/{job_id}"
+        return ORJSONResponse(
+            {"job_id": job_id, "status": "queued", "status_url": url, "events_url": f"{url}/events"},
+            status_code=202,
+            headers={"Location": url},
+        )
     try:
-        data = await provider.generate(req)
-        return data
+        with deadline.scope(deadline.budget_from(request.headers)), admission.client(*_client(request)):
+            result = await deadline.unless_disconnected(
+                request.receive, run_generate(req, bypass_cache=_bypass_cache(request), sharded=sharded)
+            )
+    except ClientDisconnected:
+        return Response(status_code=CLIENT_CLOSED)
+    except UpstreamUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=502, detail=str(e))
+    response.headers["X-Cache"] = result.cache
+    if result.coalesced:
+        response.headers["X-Coalesced"] = "1"
+    return result.doc
+
+@router.post("/generate/revise", response_model=GenerateResponse, response_class=ORJSONResponse)
+async def revise(body: RevisionRequest, request: Request):
+    """
+    Regenerate whole ``categories`` (or extend them with ``count`` more), or
+    regenerate/refine the requirements at ``indexes``, and return the merged
+    document. Everything not selected keeps its place and content.
+    """
+    try:
+        with deadline.scope(deadline.budget_from(request.headers)), admission.client(*_client(request)):
+            return await deadline.unless_disconnected(request.receive, run_revision(body))
+    except ClientDisconnected:
+        return Response(status_code=CLIENT_CLOSED)
+    except UpstreamUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=str(e))
+
+async def _encode(provider, req: GenerateRequest, sse: bool, budget: float | None, who: tuple):
+    # StreamingResponse cancels this generator when the client disconnects.
+    try:
+        with deadline.scope(budget), admission.client(*who):
+            async for event, data in requirement_events(provider, req):
+                if sse:
+                    yield b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+                else:
+                    yield orjson.dumps({"event": event, "data": data}) + b"\n"
+    except Exception as e:
+        err = {"detail": str(e)}
+        if isinstance(e, UpstreamUnavailable):
+            err["retry_after"] = e.retry_after
+        if sse:
+            yield b"event: error\ndata: " + orjson.dumps(err) + b"\n\n"
+        else:
+            yield orjson.dumps({"event": "error", "data": err}) + b"\n"
+
+@router.post("/generate/stream", openapi_extra=_BRIEF_BODY)
+async def generate_stream(request: Request, req: GenerateRequest = Depends(_brief)):
+    """
+    Same input as /generate, but requirements are sent one by one as the model
+    writes them: NDJSON by default, Server-Sent Events when the client sends
+    ``Accept: text/event-stream``.
+    """
+    provider = get_provider()
+    sse = "text/event-stream" in request.headers.get("accept", "")
+    return StreamingResponse(
+        _encode(provider, req, sse, deadline.budget_from(request.headers), _client(request)),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def _ndjson(records, who: tuple):
+    with admission.client(*who):
+        async for rec in records:
+            yield orjson.dumps(rec) + b"\n"
+
+@router.post("/generate/batch")
+async def generate_batch(
+    reqs: List[GenerateRequest],
+    request: Request,
+    sharded: bool | None = Query(None),
+):
+    """
+    Many briefs in one call. Results stream back as NDJSON in completion order,
+    one line per brief carrying its ``index`` in the submitted list.
+    """
+    if not reqs:
+        raise HTTPException(status_code=422, detail="Batch is empty")
+    if len(reqs) > settings.batch_max_items:
+        raise HTTPException(status_code=413, detail=f"Batch is limited to {settings.batch_max_items} briefs")
+    return StreamingResponse(
+        _ndjson(run_batch(reqs, bypass_cache=_bypass_cache(request), sharded=sharded), _client(request, admission.BATCH)),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
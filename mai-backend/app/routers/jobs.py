@@ -0,0 +1,39 @@
+import orjson
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from app.services.jobs import FINAL_STATES, job_queue
+
+router = APIRouter()
+
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job
+
+async def _job_events(job_id: str):
+    last = None
+    while True:
+        job = await job_queue.get(job_id)
+        if job is None:
+            yield b"event: error\ndata: " + orjson.dumps({"detail": "Unknown or expired job"}) + b"\n\n"
+            return
+        if job["status"] != last:
+            last = job["status"]
+            event = job["status"] if last in FINAL_STATES else "status"
+            yield b"event: " + event.encode() + b"\ndata: " + orjson.dumps(job) + b"\n\n"
+        if last in FINAL_STATES:
+            return
+        # woken early when this process finishes the job; otherwise re-check
+        await job_queue.wait(job_id, timeout=5)
+        yield b": keep-alive\n\n"
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-Sent Events: ``status`` on every state change, then ``done`` or ``failed`` with the job."""
+    return StreamingResponse(
+        _job_events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,28 @@
+import time
+from typing import Literal, Optional
+from fastapi import APIRouter, Query
+from app.schemas import Category, ProjectType
+from app.services.library import library
+
+router = APIRouter()
+
+@router.get("/requirements/search")
+async def search_requirements(
+    q: str = Query(..., min_length=1, max_length=200, description="Words to match (all of them) in text, criteria or project"),
+    category: Optional[Category] = None,
+    priority: Optional[Literal["MUST", "SHOULD", "MAY"]] = None,
+    projectType: Optional[ProjectType] = None,
+    project: Optional[str] = Query(None, description="Project name (phrase match)"),
+    limit: int = Query(20, ge=1, le=200),
+):
+    """Past generated requirements ranked by BM25 relevance."""
+    started = time.perf_counter()
+    results = await library.search(
+        q, limit=limit, category=category, priority=priority, project_type=projectType, project=project,
+    )
+    return {
+        "query": q,
+        "took_ms": round((time.perf_counter() - started) * 1000, 2),
+        "count": len(results),
+        "results": results,
+    }
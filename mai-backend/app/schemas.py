@@ -1,8 +1,10 @@
-from pydantic import BaseModel, Field
-from typing import List, Literal, Optional
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Literal, Optional, get_args
 from datetime import datetime
 
 ProjectType = Literal["Mechanical", "Electrical", "Civil", "Software", "Other"]
+Category = Literal["Functional","Performance","Safety","Compliance","Reliability","Maintainability","Verification"]
+CATEGORIES = get_args(Category)
 
 class GenerateRequest(BaseModel):
     projectName: str = Field(min_length=2, max_length=120)
@@ -12,7 +14,7 @@ class GenerateRequest(BaseModel):
     level: Literal["high","detailed"] = "detailed"
 
 class RequirementItem(BaseModel):
-    category: Literal["Functional","Performance","Safety","Compliance","Reliability","Maintainability","Verification"]
+    category: Category
     text: str
     priority: Literal["MUST","SHOULD","MAY"] = "MUST"
     acceptance_criteria: List[str]
@@ -25,3 +27,30 @@ class GenerateResponse(BaseModel):
     categories: List[str]
     requirements: List[RequirementItem]
     generated_at: datetime
+
+class RevisionRequest(BaseModel):
+    """Rework part of ``document``: whole ``categories`` or the requirements at ``indexes``."""
+    brief: GenerateRequest
+    document: GenerateResponse
+    mode: Literal["regenerate","refine","extend"] = "regenerate"
+    categories: List[Category] = []
+    indexes: List[int] = []
+    count: Optional[int] = Field(None, ge=1, le=50)
+    instructions: Optional[str] = Field(None, max_length=500)
+
+    @model_validator(mode="after")
+    def _check_selection(self):
+        if bool(self.categories) == bool(self.indexes):
+            raise ValueError("give either categories or indexes")
+        if self.indexes:
+            if self.mode == "extend":
+                raise ValueError("extend works on categories, not indexes")
+            n = len(self.document.requirements)
+            bad = [i for i in self.indexes if not 0 <= i < n]
+            if bad:
+                raise ValueError(f"indexes out of range 0..{n - 1}: {bad}")
+            self.indexes = sorted(set(self.indexes))
+        elif self.mode == "refine":
+            raise ValueError("refine works on indexes, not categories")
+        self.categories = list(dict.fromkeys(self.categories))
+        return self
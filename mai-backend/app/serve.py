@@ -0,0 +1,25 @@
+"""
+Production entry point: ``python -m app.serve``.
+
+Runs uvicorn with ``settings.workers`` processes (``WORKERS`` env; 0 = one
+per CPU) on ``settings.host``:``settings.port``. Workers coordinate upstream
+quota and duplicate requests through ``settings.shared_state_path``.
+"""
+import uvicorn
+
+from app.config import settings
+from app.services.shared_state import worker_count
+
+
+def main() -> None:
+    uvicorn.run(
+        "app.main:app",
+        host=settings.host,
+        port=settings.port,
+        workers=worker_count(),
+        proxy_headers=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
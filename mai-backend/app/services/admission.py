@@ -0,0 +1,199 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, Optional, Set, Tuple
+
+from app.config import settings
+from app.services import deadline
+from app.services.deadline import DeadlineExceeded
+from app.services.metrics import Counter, Gauge
+from app.services.ratelimit import UpstreamUnavailable
+
+INTERACTIVE, BATCH = "interactive", "batch"
+CLASSES = (INTERACTIVE, BATCH)  # highest priority first
+
+ADMISSIONS = Counter(
+    "mai_admissions_total",
+    "Generations by admission outcome: admitted, queue_full, too_slow, expired or cancelled",
+    ("priority", "outcome"),
+)
+QUEUED = Gauge("mai_admission_queued", "Generations waiting for a slot", ("priority",))
+
+
+class AdmissionRejected(UpstreamUnavailable):
+    """Turned away before queueing: the queue is full or the wait would outlast the deadline."""
+
+
+_client: ContextVar[Tuple[str, str]] = ContextVar("admission_client", default=("anonymous", INTERACTIVE))
+
+
+def client_id(api_key: Optional[str], address: Optional[str]) -> str:
+    """Fair-share identity: the API key (hashed) if there is one, else the client address."""
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+    return "ip:" + (address or "unknown")
+
+
+@contextmanager
+def client(cid: str, priority: str = INTERACTIVE) -> Iterator[None]:
+    """Generations started inside this block (tasks included) queue as ``cid`` in ``priority``."""
+    token = _client.set((cid, priority if priority in CLASSES else INTERACTIVE))
+    try:
+        yield
+    finally:
+        _client.reset(token)
+
+
+class AdmissionController:
+    """
+    Gate in front of the providers. At most ``admission_concurrency``
+    generations run at once; batch work may only take the slots beyond
+    ``admission_interactive_reserve``, so interactive requests always find
+    room and batch soaks up what is left.
+
+    Callers that cannot start wait in their priority class, one FIFO per
+    client, and free slots go to the highest class with waiters, round-robin
+    over its clients, so one busy client cannot starve the others. A caller
+    is turned away up front (503 + Retry-After) when its class queue is full
+    or when the estimated wait plus a typical generation would outlast its
+    deadline. The estimate uses an EWMA of how long slots are held.
+
+    Per process: with several workers each has its own gate (the upstream
+    quota itself is shared by the upstream guard).
+    """
+
+    def __init__(self) -> None:
+        self.active: Dict[str, int] = {c: 0 for c in CLASSES}
+        self.queued: Dict[str, int] = {c: 0 for c in CLASSES}
+        self._queues: Dict[str, "OrderedDict[str, Deque[asyncio.Future]]"] = {c: OrderedDict() for c in CLASSES}
+        self.service_seconds = settings.admission_service_seconds
+        self._waiting: Set[asyncio.Task] = set()
+
+    def _slots(self, priority: str) -> int:
+        total = settings.admission_concurrency
+        if priority == INTERACTIVE:
+            return total
+        return max(1, total - settings.admission_interactive_reserve)
+
+    def _free(self, priority: str) -> bool:
+        return sum(self.active.values()) < self._slots(priority)
+
+    def _ahead(self, cid: str, priority: str) -> int:
+        """Waiters served before a newcomer from ``cid``: all of higher classes, round-robin share of its own."""
+        n = 0
+        for c in CLASSES:
+            if c == priority:
+                break
+            n += self.queued[c]
+        queues = self._queues[priority]
+        mine = len(queues.get(cid, ()))
+        return n + mine + sum(min(len(q), mine + 1) for other, q in queues.items() if other != cid)
+
+    def estimate(self, cid: str, priority: str) -> float:
+        """Expected seconds before a new caller gets a slot."""
+        if not any(self.queued[c] for c in CLASSES[: CLASSES.index(priority) + 1]) and self._free(priority):
+            return 0.0
+        return (self._ahead(cid, priority) + 1) * self.service_seconds / self._slots(priority)
+
+    def _dispatch(self) -> None:
+        for priority in CLASSES:
+            queues = self._queues[priority]
+            while queues and self._free(priority):
+                cid, waiters = next(iter(queues.items()))
+                fut = waiters.popleft()
+                self.queued[priority] -= 1
+                if waiters:
+                    queues.move_to_end(cid)
+                else:
+                    del queues[cid]
+                if not fut.done():
+                    self.active[priority] += 1
+                    fut.set_result(None)
+            if queues:
+                return  # lower classes wait while a higher one is queueing
+
+    def _drop(self, cid: str, priority: str, fut: asyncio.Future) -> None:
+        waiters = self._queues[priority].get(cid)
+        if waiters is not None and fut in waiters:
+            waiters.remove(fut)
+            self.queued[priority] -= 1
+            if not waiters:
+                del self._queues[priority][cid]
+
+    def _release(self, priority: str, held: Optional[float] = None) -> None:
+        self.active[priority] -= 1
+        if held is not None:
+            self.service_seconds += 0.2 * (held - self.service_seconds)
+        self._dispatch()
+
+    async def _acquire(self, cid: str, priority: str) -> None:
+        wait = self.estimate(cid, priority)
+        if wait == 0.0:
+            self.active[priority] += 1
+            ADMISSIONS.inc(priority=priority, outcome="admitted")
+            return
+        if self.queued[priority] >= settings.admission_max_queue:
+            ADMISSIONS.inc(priority=priority, outcome="queue_full")
+            raise AdmissionRejected("Too many generations queued, try again later", wait)
+        left = deadline.remaining()
+        if left is not None and wait + self.service_seconds > left:
+            ADMISSIONS.inc(priority=priority, outcome="too_slow")
+            raise AdmissionRejected(f"Estimated wait of {wait:.0f}s would outlast the request deadline", wait)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(cid, deque()).append(fut)
+        self.queued[priority] += 1
+        task = asyncio.current_task()
+        self._waiting.add(task)
+        try:
+            with QUEUED.track(priority=priority):
+                async with asyncio.timeout(left):
+                    await fut
+        except BaseException as e:
+            if fut.done() and not fut.cancelled():
+                self._release(priority)  # granted, but the caller is already gone
+            else:
+                self._drop(cid, priority, fut)
+                self._dispatch()
+            if isinstance(e, TimeoutError):
+                ADMISSIONS.inc(priority=priority, outcome="expired")
+                raise DeadlineExceeded("Request deadline exceeded while queued for a generation slot") from e
+            ADMISSIONS.inc(priority=priority, outcome="cancelled")
+            raise
+        finally:
+            self._waiting.discard(task)
+        ADMISSIONS.inc(priority=priority, outcome="admitted")
+
+    def is_waiting(self, task: asyncio.Task) -> bool:
+        """True while ``task`` is queued for a slot (it has not called upstream yet)."""
+        return task in self._waiting
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold a generation slot for the caller set by :func:`client` (no-op when the gate is off)."""
+        if settings.admission_concurrency <= 0:
+            yield
+            return
+        cid, priority = _client.get()
+        await self._acquire(cid, priority)
+        started = time.monotonic()
+        try:
+            yield
+        except BaseException:
+            self._release(priority)
+            raise
+        self._release(priority, time.monotonic() - started)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": dict(self.active),
+            "queued": dict(self.queued),
+            "clients_waiting": {c: len(q) for c, q in self._queues.items()},
+            "service_seconds": round(self.service_seconds, 2),
+        }
+
+
+admission = AdmissionController()
@@ -0,0 +1,35 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, List
+
+from app.config import settings
+from app.schemas import GenerateRequest
+from app.services.pipeline import run_generate
+from app.services.ratelimit import UpstreamUnavailable
+
+
+async def run_batch(reqs: List[GenerateRequest], bypass_cache: bool = False, sharded: bool | None = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Generate every brief with at most ``settings.batch_concurrency`` upstream
+    calls in flight and yield one record per brief as it completes:
+    ``{"index", "ok": True, "cache", "result"}`` or ``{"index", "ok": False, "error"}``.
+    Outstanding work is cancelled if the consumer goes away.
+    """
+    sem = asyncio.Semaphore(max(1, settings.batch_concurrency))
+
+    async def one(i: int, req: GenerateRequest) -> Dict[str, Any]:
+        async with sem:
+            try:
+                res = await run_generate(req, bypass_cache=bypass_cache, sharded=sharded)
+            except UpstreamUnavailable as e:
+                return {"index": i, "ok": False, "error": str(e), "retry_after": e.retry_after}
+            except Exception as e:
+                return {"index": i, "ok": False, "error": str(e)}
+            return {"index": i, "ok": True, "cache": res.cache, "result": res.doc}
+
+    tasks = [asyncio.ensure_future(one(i, r)) for i, r in enumerate(reqs)]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            yield await fut
+    finally:
+        for t in tasks:
+            t.cancel()
@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import orjson
+
+from app.config import settings
+from app.schemas import GenerateRequest
+
+
+def _norm(s: str) -> str:
+    return " ".join(s.split())
+
+
+def cache_key(req: GenerateRequest, provider: str, model: str, prompt_version: str, mode: str = "single") -> str:
+    """Stable key for a brief: whitespace-normalised inputs + who/what generates it."""
+    parts = {
+        "projectName": _norm(req.projectName),
+        "projectType": req.projectType,
+        "description": _norm(req.description),
+        "tone": req.tone,
+        "level": req.level,
+        "provider": provider,
+        "model": model,
+        "prompt": prompt_version,
+        "mode": mode,
+    }
+    return hashlib.sha256(orjson.dumps(parts, option=orjson.OPT_SORT_KEYS)).hexdigest()
+
+
+class GenerationCache:
+    """
+    Two tiers: a bounded in-process LRU (with TTL) in front of an SQLite table
+    that survives restarts. Disk access runs in a worker thread. The table is
+    bounded too: every write purges expired rows and then evicts the least
+    recently read ones beyond ``cache_disk_max_entries`` / ``_max_bytes``.
+    """
+
+    def __init__(self) -> None:
+        self._mem: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+
+    # ---- disk tier
+
+    def _conn(self) -> Optional[sqlite3.Connection]:
+        if not settings.cache_db_path:
+            return None
+        if self._db is None:
+            d = os.path.dirname(settings.cache_db_path)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            self._db = sqlite3.connect(settings.cache_db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS gen_cache (
+                    key TEXT PRIMARY KEY, value BLOB NOT NULL, created REAL NOT NULL, used REAL, size INTEGER
+                )"""
+            )
+            columns = {r[1] for r in self._db.execute("PRAGMA table_info(gen_cache)")}
+            if "used" not in columns:  # table from before the disk tier was bounded
+                self._db.execute("ALTER TABLE gen_cache ADD COLUMN used REAL")
+                self._db.execute("ALTER TABLE gen_cache ADD COLUMN size INTEGER")
+                self._db.execute("UPDATE gen_cache SET used = created, size = length(value)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS gen_cache_created ON gen_cache (created)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS gen_cache_used ON gen_cache (used)")
+            self._db.commit()
+        return self._db
+
+    def _disk_get(self, key: str) -> Optional[tuple[float, Dict[str, Any]]]:
+        with self._lock:
+            db = self._conn()
+            if db is None:
+                return None
+            row = db.execute("SELECT created, value FROM gen_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[0] > settings.cache_ttl_seconds:
+                db.execute("DELETE FROM gen_cache WHERE key = ?", (key,))
+                db.commit()
+                return None
+            db.execute("UPDATE gen_cache SET used = ? WHERE key = ?", (now, key))
+            db.commit()
+            return row[0], orjson.loads(row[1])
+
+    def _disk_set(self, key: str, created: float, value: Dict[str, Any]) -> None:
+        with self._lock:
+            db = self._conn()
+            if db is None:
+                return
+            blob = orjson.dumps(value)
+            db.execute(
+                "INSERT OR REPLACE INTO gen_cache (key, value, created, used, size) VALUES (?, ?, ?, ?, ?)",
+                (key, blob, created, created, len(blob)),
+            )
+            self._trim(db)
+            db.commit()
+
+    def _trim(self, db: sqlite3.Connection) -> None:
+        db.execute("DELETE FROM gen_cache WHERE created < ?", (time.time() - settings.cache_ttl_seconds,))
+        rows, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM gen_cache").fetchone()
+        max_rows = settings.cache_disk_max_entries or rows
+        max_bytes = settings.cache_disk_max_bytes or size
+        if rows <= max_rows and size <= max_bytes:
+            return
+        victims = []
+        for key, n in db.execute("SELECT key, size FROM gen_cache ORDER BY used"):
+            if rows <= max_rows and size <= max_bytes:
+                break
+            victims.append((key,))
+            rows, size = rows - 1, size - n
+        db.executemany("DELETE FROM gen_cache WHERE key = ?", victims)
+
+    # ---- memory tier
+
+    def _mem_put(self, key: str, created: float, value: Dict[str, Any]) -> None:
+        self._mem[key] = (created, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > settings.cache_max_entries:
+            self._mem.popitem(last=False)
+
+    # ---- public
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._mem.get(key)
+        if entry is not None:
+            if time.time() - entry[0] <= settings.cache_ttl_seconds:
+                self._mem.move_to_end(key)
+                self.hits["memory"] += 1
+                return entry[1]
+            del self._mem[key]
+        entry = await asyncio.to_thread(self._disk_get, key)
+        if entry is not None:
+            self._mem_put(key, *entry)
+            self.hits["disk"] += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        created = time.time()
+        self._mem_put(key, created, value)
+        await asyncio.to_thread(self._disk_set, key, created, value)
+
+    def _disk_stats(self) -> Dict[str, int]:
+        with self._lock:
+            db = self._conn()
+            if db is None:
+                return {"entries": 0, "bytes": 0}
+            rows, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM gen_cache").fetchone()
+        return {"entries": rows, "bytes": size}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.cache_enabled,
+            "memory_entries": len(self._mem),
+            "disk": self._disk_stats(),
+            "hits": dict(self.hits),
+            "misses": self.misses,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+generation_cache = GenerationCache()
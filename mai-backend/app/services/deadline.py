@@ -0,0 +1,108 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Iterator, Mapping, Optional, TypeVar
+
+from app.config import settings
+from app.services.metrics import Counter
+
+HEADER = "x-request-timeout"
+
+CANCELLED = Counter(
+    "mai_requests_cancelled_total",
+    "Requests abandoned before completion: client disconnect or deadline",
+    ("reason",),
+)
+
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(RuntimeError):
+    """The request's time budget ran out before the upstream answered."""
+
+
+class ClientDisconnected(RuntimeError):
+    """The client went away before the response was ready."""
+
+
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+def budget_from(headers: Mapping[str, Any]) -> Optional[float]:
+    """
+    Seconds the client will wait: ``X-Request-Timeout`` if it is a positive
+    number, else ``settings.request_deadline_seconds`` (0 = no deadline),
+    capped at ``settings.request_deadline_max_seconds``.
+    """
+    try:
+        seconds = float(headers.get(HEADER) or 0)
+    except ValueError:
+        seconds = 0.0
+    if seconds <= 0:
+        seconds = settings.request_deadline_seconds
+    return min(seconds, settings.request_deadline_max_seconds) if seconds > 0 else None
+
+
+@contextmanager
+def scope(seconds: Optional[float]) -> Iterator[None]:
+    """Work started inside this block (tasks included) must finish within ``seconds``."""
+    if not seconds:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left, or ``None`` without a deadline."""
+    d = _deadline.get()
+    return None if d is None else d - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def timeout(default: float) -> float:
+    """Upstream call timeout: ``default`` or what is left of the deadline, whichever is shorter."""
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return min(default, left)
+
+
+async def _disconnect(receive: Callable[[], Awaitable[Mapping[str, Any]]]) -> None:
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def unless_disconnected(receive: Callable[[], Awaitable[Mapping[str, Any]]], work: Awaitable[T]) -> T:
+    """
+    Await ``work`` while watching the ASGI ``receive`` channel (request body
+    already read); if the client disconnects first, ``work`` is cancelled and
+    ``ClientDisconnected`` raised.
+    """
+    task = asyncio.ensure_future(work)
+    watch = asyncio.ensure_future(_disconnect(receive))
+    try:
+        await asyncio.wait((task, watch), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watch.cancel()
+        if not task.done():
+            task.cancel()
+    if not task.done():
+        CANCELLED.inc(reason="disconnect")
+        raise ClientDisconnected("Client disconnected")
+    if isinstance(task.exception(), DeadlineExceeded):
+        CANCELLED.inc(reason="deadline")
+    return task.result()
@@ -0,0 +1,115 @@
+import asyncio
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import orjson
+
+from app.config import settings
+from app.schemas import GenerateResponse
+from app.services.renderers import RENDERER_VERSION, ExportFormat
+
+
+def export_key(doc: GenerateResponse, fmt: ExportFormat) -> str:
+    """Content address of a rendered export: canonical document + format + renderer version."""
+    h = hashlib.sha256(orjson.dumps(doc.model_dump(mode="json"), option=orjson.OPT_SORT_KEYS))
+    h.update(f"|{fmt}|{RENDERER_VERSION}".encode())
+    return h.hexdigest()
+
+
+class ExportCache:
+    """
+    Size-bounded LRU of rendered export bytes. Entries evicted from memory are
+    spilled to ``settings.export_cache_dir`` (if set), itself capped at
+    ``settings.export_cache_disk_max_bytes`` by dropping the oldest files.
+    """
+
+    def __init__(self) -> None:
+        self._mem: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(settings.export_cache_dir, key)
+
+    def _spill(self, key: str, body: bytes) -> None:
+        if not settings.export_cache_dir:
+            return
+        os.makedirs(settings.export_cache_dir, exist_ok=True)
+        tmp = self._path(key) + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(body)
+        os.replace(tmp, self._path(key))
+        self._prune_disk()
+
+    def _prune_disk(self) -> None:
+        entries = []
+        with os.scandir(settings.export_cache_dir) as it:
+            for e in it:
+                if e.is_file() and not e.name.endswith(".tmp"):
+                    st = e.stat()
+                    entries.append((st.st_mtime, st.st_size, e.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= settings.export_cache_disk_max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        if not settings.export_cache_dir:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _put(self, key: str, body: bytes) -> list:
+        """Insert into memory; returns the entries that no longer fit."""
+        evicted = []
+        with self._lock:
+            if key in self._mem:
+                self._size -= len(self._mem.pop(key))
+            self._mem[key] = body
+            self._size += len(body)
+            while self._size > settings.export_cache_max_bytes and len(self._mem) > 1:
+                old_key, old = self._mem.popitem(last=False)
+                self._size -= len(old)
+                evicted.append((old_key, old))
+        return evicted
+
+    async def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            body = self._mem.get(key)
+            if body is not None:
+                self._mem.move_to_end(key)
+                self.hits["memory"] += 1
+                return body
+        body = await asyncio.to_thread(self._disk_get, key)
+        if body is not None:
+            self.hits["disk"] += 1
+            await self.set(key, body)
+            return body
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, body: bytes) -> None:
+        if len(body) > settings.export_cache_max_bytes:
+            await asyncio.to_thread(self._spill, key, body)
+            return
+        for old_key, old in self._put(key, body):
+            await asyncio.to_thread(self._spill, old_key, old)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._mem), "bytes": self._size, "hits": dict(self.hits), "misses": self.misses}
+
+
+export_cache = ExportCache()
@@ -0,0 +1,147 @@
+import asyncio
+import math
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterator
+
+from app.config import settings
+from app.schemas import GenerateResponse
+from app.services.metrics import EXPORT_RENDER_SECONDS
+from app.services.renderers import ExportFormat, preload, render, render_to_file
+from app.services.tracing import span
+
+
+class ExportBusy(RuntimeError):
+    """All render slots and queue places are taken; try again later."""
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(f"Export queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class ExportEngine:
+    """
+    Renders exports off the event loop in a bounded process pool, so large
+    PDF/DOCX jobs neither hold the GIL of the API worker nor pile up without
+    limit: once ``workers + max_queue`` renders are pending, new ones are
+    refused with ``ExportBusy``. Streamed renders count against the same
+    limit: the worker writes to a temp file that ``stream`` tails. ``export_workers = 0`` renders in a thread
+    instead (handy for tests and tiny deployments).
+    """
+
+    def __init__(self) -> None:
+        self._pool: ProcessPoolExecutor | None = None
+        self._pending = 0
+        self._avg_seconds = 0.5  # EWMA of render time, for Retry-After
+
+    def _executor(self) -> ProcessPoolExecutor | None:
+        if settings.export_workers <= 0:
+            return None
+        if self._pool is None:
+            # spawn: never fork a process that is running an event loop.
+            # Each worker loads the document libraries as it starts.
+            self._pool = ProcessPoolExecutor(
+                max_workers=settings.export_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=preload,
+            )
+        return self._pool
+
+    @property
+    def capacity(self) -> int:
+        return max(1, settings.export_workers) + settings.export_max_queue
+
+    def retry_after(self) -> int:
+        slots = max(1, settings.export_workers)
+        backlog = self._pending - slots + 1
+        return max(1, math.ceil(self._avg_seconds * backlog / slots))
+
+    def _admit(self) -> None:
+        if self._pending >= self.capacity:
+            raise ExportBusy(self.retry_after())
+        self._pending += 1
+
+    def _done(self, fmt: ExportFormat, start: float) -> None:
+        self._pending -= 1
+        elapsed = time.perf_counter() - start
+        self._avg_seconds = 0.8 * self._avg_seconds + 0.2 * elapsed
+        EXPORT_RENDER_SECONDS.observe(elapsed, format=fmt)
+
+    def _submit(self, fn, *args) -> asyncio.Future:
+        pool = self._executor()
+        if pool is None:
+            return asyncio.ensure_future(asyncio.to_thread(fn, *args))
+        return asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+
+    def stream(self, fmt: ExportFormat, doc: GenerateResponse, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+        """
+        Start an md/pdf render in the pool now (``ExportBusy`` when full) and
+        return the bytes as the worker writes them. Memory stays flat: output
+        goes through a temp file, unlinked once the render is over (the open
+        read handle keeps it readable until the response is done).
+        """
+        self._admit()
+        start = time.perf_counter()
+        try:
+            fd, path = tempfile.mkstemp(prefix="export-", suffix=f".{fmt}")
+            os.close(fd)
+            f = open(path, "rb")
+            job = self._submit(render_to_file, fmt, doc, path)
+        except BaseException:
+            self._done(fmt, start)
+            raise
+
+        def finished(_: asyncio.Future) -> None:
+            self._done(fmt, start)
+            os.unlink(path)
+
+        job.add_done_callback(finished)
+        return self._tail(job, f, chunk_size)
+
+    async def _tail(self, job: asyncio.Future, f, chunk_size: int) -> AsyncIterator[bytes]:
+        with span("export_stream"), f:
+            while True:
+                chunk = await asyncio.to_thread(f.read, chunk_size)
+                if chunk:
+                    yield chunk
+                elif job.done():
+                    job.result()  # re-raise a render failure
+                    rest = await asyncio.to_thread(f.read)
+                    if not rest:
+                        return
+                    yield rest
+                else:
+                    await asyncio.sleep(0.02)
+
+    async def render(self, fmt: ExportFormat, doc: GenerateResponse) -> bytes:
+        self._admit()
+        start = time.perf_counter()
+        try:
+            with span("export_render", format=fmt, requirements=len(doc.requirements)):
+                return await self._submit(render, fmt, doc)
+        finally:
+            self._done(fmt, start)
+
+    async def warm(self) -> None:
+        """Start every render worker now rather than on the first exports (where rendering happens)."""
+        pool = self._executor()
+        if pool is None:
+            await asyncio.to_thread(preload)
+            return
+        loop = asyncio.get_running_loop()
+        # concurrent submissions: the pool spawns a process for each
+        await asyncio.gather(*(loop.run_in_executor(pool, preload) for _ in range(settings.export_workers)))
+
+    def stats(self) -> dict:
+        return {"pending": self._pending, "capacity": self.capacity, "avg_seconds": round(self._avg_seconds, 3)}
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+export_engine = ExportEngine()
@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Sequence
+
+import orjson
+
+from app.config import settings
+from app.schemas import GenerateRequest, GenerateResponse
+from app.services import deadline
+from app.services.deadline import DeadlineExceeded
+from app.services.metrics import Counter
+from app.services.prompts import Revision
+from app.services.ratelimit import UpstreamUnavailable
+from app.services.tracing import span
+
+log = logging.getLogger(__name__)
+
+PROVIDER_ATTEMPTS = Counter(
+    "mai_provider_attempts_total",
+    "Generate attempts per backend in the provider chain: win, error or cancelled",
+    ("provider", "outcome"),
+)
+HEDGES = Counter(
+    "mai_hedged_requests_total",
+    "Secondary providers started because the previous one was slower than its latency percentile",
+    ("provider",),
+)
+
+
+def _label(provider: Any) -> str:
+    return getattr(provider, "name", type(provider).__name__)
+
+
+class LatencyWindow:
+    """Last ``size`` successful call durations, for percentile-based hedging."""
+
+    def __init__(self, size: int = 200) -> None:
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+class ProviderChain:
+    """
+    Ordered list of providers behaving like one. ``generate`` starts with the
+    first; if it fails the next one starts straight away (failover), and if it
+    is still running after its usual p``hedge_percentile`` latency the next one
+    is started alongside it (hedging). The first valid document wins and the
+    other calls are cancelled.
+
+    Streams are not hedged: they fail over only while nothing has been sent.
+    """
+
+    def __init__(self, providers: Sequence[Any]) -> None:
+        self.providers = list(providers)
+        self.name = ">".join(_label(p) for p in self.providers)
+        self.supports_categories = True
+        self.latency: Dict[str, LatencyWindow] = {_label(p): LatencyWindow() for p in self.providers}
+
+    # Read on every use: a provider that falls back to prompt-only JSON
+    # changes its prompt version, and the cache key must follow.
+    @property
+    def model(self) -> str:
+        return ",".join(getattr(p, "model", "") for p in self.providers)
+
+    @property
+    def prompt_version(self) -> str:
+        return ",".join(getattr(p, "prompt_version", "") for p in self.providers)
+
+    def hedge_delay(self, provider: Any) -> float:
+        window = self.latency[_label(provider)]
+        if len(window) >= settings.hedge_min_samples:
+            return max(window.percentile(settings.hedge_percentile), settings.hedge_min_delay_seconds)
+        return settings.hedge_default_delay_seconds
+
+    async def _call(self, provider: Any, payload: GenerateRequest, categories: Sequence[str] | None,
+                    rev: Revision | None) -> Dict[str, Any]:
+        if rev is not None:
+            return await provider.generate(payload, rev=rev)
+        if categories and getattr(provider, "supports_categories", False):
+            return await provider.generate(payload, categories=categories)
+        raw = await provider.generate(payload)
+        if categories:
+            wanted = set(categories)
+            raw["requirements"] = [r for r in raw.get("requirements", []) if r.get("category") in wanted]
+            raw["categories"] = [c for c in raw.get("categories", []) if c in wanted]
+        return raw
+
+    async def _attempt(self, provider: Any, payload: GenerateRequest, categories: Sequence[str] | None,
+                       rev: Revision | None) -> Dict[str, Any]:
+        label = _label(provider)
+        started = time.perf_counter()
+        try:
+            with span("provider_attempt", provider=label):
+                raw = await self._call(provider, payload, categories, rev)
+                # A document that does not validate must not win the race.
+                GenerateResponse.model_validate(raw)
+        except asyncio.CancelledError:
+            PROVIDER_ATTEMPTS.inc(provider=label, outcome="cancelled")
+            raise
+        except Exception:
+            PROVIDER_ATTEMPTS.inc(provider=label, outcome="error")
+            raise
+        self.latency[label].add(time.perf_counter() - started)
+        PROVIDER_ATTEMPTS.inc(provider=label, outcome="win")
+        return raw
+
+    async def generate(self, payload: GenerateRequest, categories: Sequence[str] | None = None,
+                       rev: Revision | None = None) -> Dict[str, Any]:
+        pending: Dict[asyncio.Future, Any] = {}
+        errors: List[tuple] = []
+        queue = list(self.providers)
+
+        def launch() -> Any:
+            provider = queue.pop(0)
+            pending[asyncio.ensure_future(self._attempt(provider, payload, categories, rev))] = provider
+            return provider
+
+        current = launch()
+        try:
+            while pending:
+                hedge = settings.hedge_requests and bool(queue)
+                done, _ = await asyncio.wait(
+                    pending, timeout=self.hedge_delay(current) if hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    log.info("hedging %s after %.1fs", _label(queue[0]), self.hedge_delay(current))
+                    HEDGES.inc(provider=_label(queue[0]))
+                    current = launch()
+                    continue
+                for fut in done:
+                    provider = pending.pop(fut)
+                    if fut.exception() is None:
+                        return fut.result()
+                    log.warning("provider %s failed: %r", _label(provider), fut.exception())
+                    errors.append((provider, fut.exception()))
+                if not pending and queue and not deadline.expired():
+                    current = launch()
+        finally:
+            for fut in pending:
+                fut.cancel()
+        raise self._failure(errors)
+
+    @staticmethod
+    def _failure(errors: List[tuple]) -> BaseException:
+        if len(errors) == 1:
+            return errors[0][1]
+        late = [e for _, e in errors if isinstance(e, DeadlineExceeded)]
+        if late:
+            return late[-1]
+        if all(isinstance(e, UpstreamUnavailable) for _, e in errors):
+            return min((e for _, e in errors), key=lambda e: e.retry_after)
+        detail = "; ".join(f"{_label(p)}: {e}" for p, e in errors)
+        return RuntimeError(f"All {len(errors)} providers failed: {detail}")
+
+    async def stream(self, payload: GenerateRequest) -> AsyncIterator[str]:
+        errors: List[tuple] = []
+        for provider in self.providers:
+            sent = False
+            try:
+                if hasattr(provider, "stream"):
+                    async for chunk in provider.stream(payload):
+                        sent = True
+                        yield chunk
+                else:
+                    doc = await provider.generate(payload)
+                    sent = True
+                    yield orjson.dumps(doc).decode()
+                return
+            except Exception as e:
+                if sent or isinstance(e, DeadlineExceeded):
+                    raise
+                log.warning("provider %s failed before streaming: %r", _label(provider), e)
+                errors.append((provider, e))
+        raise self._failure(errors)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            label: {"samples": len(w), "p50": w.percentile(0.5), f"p{round(settings.hedge_percentile * 100)}": w.percentile(settings.hedge_percentile)}
+            for label, w in self.latency.items()
+        }
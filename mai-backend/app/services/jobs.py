@@ -0,0 +1,280 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+import orjson
+
+from app.config import settings
+from app.schemas import GenerateRequest
+from app.services import admission
+from app.services.pipeline import run_generate
+
+log = logging.getLogger(__name__)
+
+FINAL_STATES = ("done", "failed")
+
+
+class JobStore:
+    """
+    SQLite-backed job table; survives restarts and is shared by all worker
+    processes. A running job records the worker that claimed it (``owner``)
+    and a lease that worker renews, so one worker's restart never touches
+    jobs another live worker is running. All methods are blocking.
+    """
+
+    def __init__(self) -> None:
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            d = os.path.dirname(settings.job_db_path)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            self._db = sqlite3.connect(settings.job_db_path, check_same_thread=False)
+            self._db.row_factory = sqlite3.Row
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    request BLOB NOT NULL,
+                    sharded INTEGER,
+                    result BLOB,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL,
+                    owner TEXT,
+                    lease REAL
+                )"""
+            )
+            columns = {r[1] for r in self._db.execute("PRAGMA table_info(jobs)")}
+            for column, kind in (("owner", "TEXT"), ("lease", "REAL")):
+                if column not in columns:  # table from before leases
+                    self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created)")
+        return self._db
+
+    def submit(self, req: GenerateRequest, sharded: bool | None) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            db.execute(
+                "INSERT INTO jobs (id, status, request, sharded, created, updated) VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, orjson.dumps(req.model_dump()), None if sharded is None else int(sharded), now, now),
+            )
+            db.commit()
+        return job_id
+
+    def claim(self) -> Optional[sqlite3.Row]:
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            row = db.execute(
+                """UPDATE jobs SET status = 'running', attempts = attempts + 1, updated = ?, owner = ?, lease = ?
+                   WHERE id = (SELECT id FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1)
+                   RETURNING *""",
+                (now, self.owner, now + settings.job_lease_seconds),
+            ).fetchone()
+            db.commit()
+            return row
+
+    def renew(self) -> None:
+        """Extend the lease on every job this worker is running."""
+        with self._lock:
+            db = self._conn()
+            db.execute(
+                "UPDATE jobs SET lease = ? WHERE status = 'running' AND owner = ?",
+                (time.time() + settings.job_lease_seconds, self.owner),
+            )
+            db.commit()
+
+    def _set(self, job_id: str, status: str, result: Any = None, error: str | None = None) -> None:
+        with self._lock:
+            db = self._conn()
+            db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated = ?, owner = NULL, lease = NULL WHERE id = ?",
+                (status, None if result is None else orjson.dumps(result), error, time.time(), job_id),
+            )
+            db.commit()
+
+    def finish(self, job_id: str, result: Dict[str, Any]) -> None:
+        self._set(job_id, "done", result=result)
+
+    def fail(self, job_id: str, error: str, retry: bool) -> None:
+        self._set(job_id, "queued" if retry else "failed", error=error)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = {
+            "id": row["id"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "created": row["created"],
+            "updated": row["updated"],
+        }
+        if row["result"] is not None:
+            job["result"] = orjson.loads(row["result"])
+        if row["error"]:
+            job["error"] = row["error"]
+        return job
+
+    def requeue(self, expired_only: bool = False) -> int:
+        """
+        Put running jobs back in the queue: this worker's own (on shutdown), or
+        ``expired_only`` those whose owner stopped renewing (it died).
+        """
+        now = time.time()
+        where = "lease IS NULL OR lease < ?" if expired_only else "owner = ?"
+        with self._lock:
+            db = self._conn()
+            n = db.execute(
+                f"UPDATE jobs SET status = 'queued', updated = ?, owner = NULL, lease = NULL WHERE status = 'running' AND ({where})",
+                (now, now if expired_only else self.owner),
+            ).rowcount
+            db.commit()
+            return n
+
+    def purge(self, older_than: float) -> int:
+        with self._lock:
+            db = self._conn()
+            n = db.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated < ?", (older_than,)
+            ).rowcount
+            db.commit()
+            return n
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {r[0]: r[1] for r in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+class JobQueue:
+    """
+    Background generation: ``submit`` persists the brief and returns an id,
+    ``settings.job_workers`` tasks claim queued jobs and run them through the
+    normal generate pipeline. Results stay in the store for
+    ``settings.job_result_ttl_seconds`` so reconnecting clients can collect them.
+    """
+
+    def __init__(self) -> None:
+        self.store = JobStore()
+        self._wake = asyncio.Event()
+        self._workers: List[asyncio.Task] = []
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._waiters: Dict[str, asyncio.Event] = {}
+        self._watchers: Dict[str, int] = {}  # callers in wait() per job
+        self._last_purge = 0.0
+
+    async def submit(self, req: GenerateRequest, sharded: bool | None = None) -> str:
+        job_id = await asyncio.to_thread(self.store.submit, req, sharded)
+        self._wake.set()
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def wait(self, job_id: str, timeout: float) -> None:
+        """Return when the job changes state in this process, or after ``timeout``."""
+        ev = self._waiters.setdefault(job_id, asyncio.Event())
+        self._watchers[job_id] = self._watchers.get(job_id, 0) + 1
+        try:
+            await asyncio.wait_for(ev.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            # the job may finish elsewhere (or be long done): do not keep its event
+            left = self._watchers.pop(job_id) - 1
+            if left:
+                self._watchers[job_id] = left
+            else:
+                self._waiters.pop(job_id, None)
+
+    def _notify(self, job_id: str) -> None:
+        ev = self._waiters.pop(job_id, None)
+        if ev is not None:
+            ev.set()
+
+    async def _run_one(self, row) -> None:
+        job_id = row["id"]
+        req = GenerateRequest.model_validate(orjson.loads(row["request"]))
+        sharded = None if row["sharded"] is None else bool(row["sharded"])
+        try:
+            with admission.client("jobs", admission.BATCH):
+                res = await run_generate(req, sharded=sharded)
+        except Exception as e:
+            retry = row["attempts"] < settings.job_max_attempts
+            log.warning("job %s attempt %s failed: %r", job_id, row["attempts"], e)
+            await asyncio.to_thread(self.store.fail, job_id, str(e), retry)
+        else:
+            await asyncio.to_thread(self.store.finish, job_id, res.doc)
+        self._notify(job_id)
+
+    async def _maybe_purge(self) -> None:
+        now = time.time()
+        if now - self._last_purge > 600:
+            self._last_purge = now
+            await asyncio.to_thread(self.store.purge, now - settings.job_result_ttl_seconds)
+
+    async def _renew(self) -> None:
+        while True:
+            await asyncio.sleep(settings.job_lease_seconds / 3)
+            await asyncio.to_thread(self.store.renew)
+            n = await asyncio.to_thread(self.store.requeue, True)
+            if n:
+                log.info("requeued %d jobs of a worker that stopped", n)
+                self._wake.set()
+
+    async def _worker(self) -> None:
+        while True:
+            row = await asyncio.to_thread(self.store.claim)
+            if row is None:
+                await self._maybe_purge()
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), settings.job_poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run_one(row)
+
+    async def start(self) -> None:
+        if self._workers or settings.job_workers <= 0:
+            return
+        self._wake = asyncio.Event()
+        n = await asyncio.to_thread(self.store.requeue, True)
+        if n:
+            log.info("requeued %d interrupted jobs", n)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(settings.job_workers)]
+        self._heartbeat = asyncio.create_task(self._renew())
+
+    async def stop(self) -> None:
+        tasks = self._workers + ([self._heartbeat] if self._heartbeat else [])
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers, self._heartbeat = [], None
+        # our jobs cancelled mid-run are picked up again (here or by another worker)
+        await asyncio.to_thread(self.store.requeue)
+        self.store.close()
+
+
+job_queue = JobQueue()
@@ -0,0 +1,124 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+_FENCE_START = re.compile(r"^\s*```(?:json)?\s*", re.I)
+_FENCE_END = re.compile(r"\s*```\s*$", re.I)
+
+_OPEN_QUOTES = "“„‟"
+_CLOSE_QUOTES = "”"
+_CLOSERS = {"{": "}", "[": "]"}
+_REQUIRED_ITEM_KEYS = ("category", "text", "acceptance_criteria")
+
+
+def strip_fences(s: str) -> str:
+    return _FENCE_END.sub("", _FENCE_START.sub("", s or "")).strip()
+
+
+def _normalise(s: str) -> Tuple[str, List[str], bool, int, List[str]]:
+    """
+    One pass over the text that:
+      * turns smart double quotes used as JSON delimiters into ``"`` (smart
+        quotes inside ordinary strings are left alone),
+      * drops trailing commas before ``}``/``]``,
+      * remembers the last point where a value was complete, with the
+        container stack at that point, for cutting off a truncated tail.
+
+    Returns ``(text, stack_at_end, in_string, safe_cut, stack_at_safe_cut)``.
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    in_str = esc = False
+    curly = False
+    safe_cut, safe_stack = 0, []
+    for ch in s:
+        if in_str:
+            if esc:
+                esc = False
+            elif ch == "\\":
+                esc = True
+            elif (ch == '"' and not curly) or (curly and ch in _CLOSE_QUOTES + '"'):
+                in_str = False
+                out.append('"')
+                continue
+            elif ch == "\n":
+                out.append("\\n")
+                continue
+            out.append(ch)
+            continue
+        if ch == '"' or ch in _OPEN_QUOTES or ch in _CLOSE_QUOTES:
+            in_str, curly = True, ch != '"'
+            out.append('"')
+        elif ch in "{[":
+            stack.append(ch)
+            out.append(ch)
+        elif ch in "}]":
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            if stack:
+                stack.pop()
+            out.append(ch)
+            safe_cut, safe_stack = len(out), list(stack)
+        elif ch == ",":
+            safe_cut, safe_stack = len(out), list(stack)
+            out.append(ch)
+        else:
+            out.append(ch)
+    return "".join(out), stack, in_str, safe_cut, safe_stack
+
+
+_DANGLING_KEY = re.compile(r'([{,])\s*"(?:[^"\\]|\\.)*"\s*:?\s*$')
+
+
+def _close(text: str, stack: List[str]) -> str:
+    text = text.rstrip()
+    if stack and stack[-1] == "{":
+        # a key without its value cannot be completed, so drop it
+        text = _DANGLING_KEY.sub(r"\1", text)
+    text = text.rstrip().rstrip(",:").rstrip()
+    return text + "".join(_CLOSERS[c] for c in reversed(stack))
+
+
+def _drop_partial_requirement(obj: Dict[str, Any], truncated_inside_item: bool) -> None:
+    reqs = obj.get("requirements")
+    if not isinstance(reqs, list) or not reqs:
+        return
+    last = reqs[-1]
+    if truncated_inside_item or not isinstance(last, dict) or any(k not in last for k in _REQUIRED_ITEM_KEYS):
+        reqs.pop()
+
+
+def repair_json(raw: str) -> Optional[Dict[str, Any]]:
+    """
+    Deterministic, local repair of model output that is almost JSON —
+    typically cut off at ``max_tokens``. Strips fences and prose, normalises
+    smart quotes, removes trailing commas, closes open strings/arrays/objects
+    and drops a half-written last requirement. Returns None if nothing
+    parseable can be recovered, so the caller can fall back further.
+    """
+    s = strip_fences(raw)
+    first = s.find("{")
+    if first == -1:
+        return None
+    text, stack, in_str, safe_cut, safe_stack = _normalise(s[first:])
+
+    candidates = []
+    if not stack and not in_str:
+        candidates.append((text[: text.rfind("}") + 1] if "}" in text else text, False))
+    else:
+        closed = text + ('"' if in_str else "")
+        candidates.append((_close(closed, stack), len(stack) >= 3))
+        candidates.append((_close(text[:safe_cut], safe_stack), False))
+
+    for cand, inside_item in candidates:
+        try:
+            obj = json.loads(cand)
+        except ValueError:
+            continue
+        if isinstance(obj, dict):
+            if stack or in_str:
+                _drop_partial_requirement(obj, inside_item)
+            return obj
+    return None
@@ -0,0 +1,174 @@
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import orjson
+
+from app.config import settings
+from app.schemas import GenerateRequest
+
+_WORD = re.compile(r"[^\W_]+")
+_STOP = frozenset(
+    "the and for with that this from have will shall must should may into are was were not but all any "
+    "can our their its has been per via each when then than also such use used using system".split()
+)
+
+
+def match_expr(text: str, any_terms: bool = False, min_len: int = 1, max_terms: int = 24) -> str:
+    """
+    FTS5 MATCH expression for free text: every word quoted (so user input
+    cannot inject query syntax), joined by AND (implicit) or by OR, in which
+    case common words are left out since they would match nearly everything.
+    """
+    words = (w.lower() for w in _WORD.findall(text))
+    terms = [w for w in words if len(w) >= min_len and not (any_terms and w in _STOP)]
+    terms = list(dict.fromkeys(terms))[:max_terms]
+    return (" OR " if any_terms else " ").join(f'"{t}"' for t in terms)
+
+
+class RequirementLibrary:
+    """
+    Every generated requirement, indexed with SQLite FTS5 (BM25 ranking) and
+    tagged with project, project type, category and priority. Documents are
+    stored once per generation cache key. All disk work runs in a worker
+    thread; an empty ``settings.library_db_path`` turns the library off.
+    """
+
+    def __init__(self) -> None:
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _conn(self) -> Optional[sqlite3.Connection]:
+        if not settings.library_db_path:
+            return None
+        if self._db is None:
+            d = os.path.dirname(settings.library_db_path)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            self._db = sqlite3.connect(settings.library_db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS lib_docs (key TEXT PRIMARY KEY, project TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            # Tags are indexed too, so filters are column filters inside the
+            # MATCH (posting-list intersections) rather than row reads after it.
+            self._db.execute(
+                """CREATE VIRTUAL TABLE IF NOT EXISTS lib_fts USING fts5(
+                    text, criteria, project, project_type, category, priority,
+                    item UNINDEXED, created UNINDEXED,
+                    tokenize = 'porter unicode61 remove_diacritics 2'
+                )"""
+            )
+        return self._db
+
+    def _add(self, key: str, req: GenerateRequest, doc: Dict[str, Any]) -> int:
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            if db is None:
+                return 0
+            cur = db.execute(
+                "INSERT OR IGNORE INTO lib_docs (key, project, created) VALUES (?, ?, ?)",
+                (key, req.projectName, now),
+            )
+            if cur.rowcount == 0:
+                return 0  # this exact generation is already in the library
+            rows = [
+                (
+                    r["text"],
+                    "\n".join(r.get("acceptance_criteria") or []),
+                    req.projectName,
+                    req.projectType,
+                    r["category"],
+                    r["priority"],
+                    orjson.dumps(r),
+                    now,
+                )
+                for r in doc.get("requirements") or []
+            ]
+            db.executemany(
+                "INSERT INTO lib_fts (text, criteria, project, project_type, category, priority, item, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            db.commit()
+            return len(rows)
+
+    def _search(
+        self,
+        match: str,
+        category: str | None = None,
+        priority: str | None = None,
+        project_type: str | None = None,
+        project: str | None = None,
+        limit: int = 20,
+    ) -> List[Dict[str, Any]]:
+        if not match:
+            return []
+        terms = [f"{{text criteria project}} : ({match})"]
+        for column, value in (("category", category), ("priority", priority), ("project_type", project_type), ("project", project)):
+            if value:
+                terms.append(f'{column} : "{value.replace(chr(34), chr(34) * 2)}"')
+        # BM25 over every match of a very common word costs ~1.5 µs per row;
+        # ranking only the newest library_rank_window matches keeps the worst
+        # case at tens of milliseconds however large the library grows.
+        sql = """SELECT bm25(lib_fts, 10.0, 3.0, 1.0, 0.0, 0.0, 0.0) AS rank, project, project_type, created, item
+                 FROM lib_fts
+                 WHERE lib_fts MATCH ?1 AND rowid >= coalesce((
+                     SELECT min(rowid) FROM (SELECT rowid FROM lib_fts WHERE lib_fts MATCH ?1 ORDER BY rowid DESC LIMIT ?2)
+                 ), 0)
+                 ORDER BY rank LIMIT ?3"""
+        with self._lock:
+            db = self._conn()
+            if db is None:
+                return []
+            rows = db.execute(sql, (" AND ".join(terms), settings.library_rank_window, limit)).fetchall()
+        return [
+            {
+                "score": round(-rank, 4),
+                "project": proj,
+                "project_type": ptype,
+                "created": datetime.fromtimestamp(created, timezone.utc).isoformat().replace("+00:00", "Z"),
+                "requirement": orjson.loads(item),
+            }
+            for rank, proj, ptype, created, item in rows
+        ]
+
+    # ---- public
+
+    async def add(self, key: str, req: GenerateRequest, doc: Dict[str, Any]) -> int:
+        """Index the requirements of a freshly generated ``doc``; returns how many were added."""
+        return await asyncio.to_thread(self._add, key, req, doc)
+
+    async def search(self, q: str, limit: int = 20, **filters: str | None) -> List[Dict[str, Any]]:
+        """Best BM25 matches for all words of ``q``, optionally filtered by tag (``project`` as a phrase)."""
+        return await asyncio.to_thread(self._search, match_expr(q), limit=limit, **filters)
+
+    async def similar(self, req: GenerateRequest, n: int) -> List[Dict[str, Any]]:
+        """
+        ``n`` past requirements closest to the brief (any of its distinctive
+        words), from the same project type, one per distinct text.
+        """
+        match = match_expr(f"{req.projectName} {req.description}", any_terms=True, min_len=3)
+        hits = await asyncio.to_thread(self._search, match, project_type=req.projectType, limit=n * 3)
+        seen, out = set(), []
+        for h in hits:
+            r = h["requirement"]
+            if r["text"] not in seen:
+                seen.add(r["text"])
+                out.append(r)
+        return out[:n]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+library = RequirementLibrary()
@@ -0,0 +1,174 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+# Seconds; wide enough for both microsecond parsing and minute-long upstream calls.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+
+class Counter:
+    """Monotonic counter with optional labels; cheap enough for hot paths."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> None:
+        self.name, self.help, self.labels = name, help, labels
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(l, "")) for l in self.labels)
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def snapshot(self) -> Dict[str, float]:
+        return {",".join(k) or "total": v for k, v in self._values.items()}
+
+    def samples(self) -> Iterator[Tuple[str, LabelValues, Tuple[Tuple[str, str], ...], float]]:
+        for key, v in sorted(self._values.items()):
+            yield self.name, key, (), v
+
+
+class Gauge(Counter):
+    """Value that goes up and down (in-flight work, queue depth)."""
+
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    @contextmanager
+    def track(self, **labels: str) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.name, self.help, self.labels = name, help, labels
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [count per bucket..., +Inf], sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(l, "")) for l in self.labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[i] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(tuple(str(labels.get(l, "")) for l in self.labels))
+        return sum(entry[0]) if entry else 0
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        return {
+            ",".join(k) or "total": {"count": sum(counts), "sum": round(total[0], 6)}
+            for k, (counts, total) in self._values.items()
+        }
+
+    def samples(self) -> Iterator[Tuple[str, LabelValues, Tuple[Tuple[str, str], ...], float]]:
+        for key, (counts, total) in sorted(self._values.items()):
+            running = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                running += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                yield self.name + "_bucket", key, (("le", le),), running
+            yield self.name + "_sum", key, (), total[0]
+            yield self.name + "_count", key, (), running
+
+
+REGISTRY: List = []
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+def render_prometheus() -> str:
+    """Every registered metric in the Prometheus text exposition format (0.0.4)."""
+    lines: List[str] = []
+    for m in REGISTRY:
+        lines.append(f"# HELP {m.name} {m.help}")
+        lines.append(f"# TYPE {m.name} {m.kind}")
+        for name, key, extra, value in m.samples():
+            pairs = [*zip(m.labels, key), *extra]
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in pairs)
+            lines.append(f"{name}{{{labels}}} {_number(value)}" if labels else f"{name} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+JSON_PARSE = Counter(
+    "mai_json_parse_total",
+    "How model output was turned into JSON: direct, local_repair, llm_repair or failed",
+    ("provider", "path"),
+)
+
+STAGE_SECONDS = Histogram(
+    "mai_stage_seconds",
+    "Time spent per pipeline stage: request_validation, prompt_build, upstream_call, "
+    "json_parse, local_repair, llm_repair, response_validation",
+    ("stage", "provider"),
+)
+
+EXPORT_RENDER_SECONDS = Histogram(
+    "mai_export_render_seconds",
+    "Export rendering time (including pool queueing) by format",
+    ("format",),
+)
+
+UPSTREAM_TOKENS = Counter(
+    "mai_upstream_tokens_total",
+    "Tokens reported by the upstream usage fields",
+    ("provider", "kind"),
+)
+
+CACHE_REQUESTS = Counter(
+    "mai_cache_requests_total",
+    "Cache lookups by cache (generation, export) and result (hit, miss, bypass, not_modified)",
+    ("cache", "result"),
+)
+
+IN_FLIGHT = Gauge(
+    "mai_in_flight",
+    "Work currently in progress: upstream calls, distinct generations, export renders",
+    ("kind",),
+)
@@ -0,0 +1,89 @@
+import logging
+import sqlite3
+from typing import Any, Dict, NamedTuple, Tuple
+
+from app.config import settings
+from app.schemas import GenerateRequest, GenerateResponse
+from app.services.admission import admission
+from app.services.ai_provider import get_provider
+from app.services import prompts
+from app.services.cache import cache_key, generation_cache
+from app.services.library import library
+from app.services.metrics import CACHE_REQUESTS
+from app.services.sharding import generate_sharded
+from app.services import shared_state
+from app.services.singleflight import inflight, shared_flight
+from app.services.tracing import span, stage
+
+log = logging.getLogger(__name__)
+
+
+class Generated(NamedTuple):
+    doc: Dict[str, Any]
+    cache: str       # HIT | MISS | BYPASS
+    coalesced: bool  # True when another identical in-flight request did the work
+
+
+async def run_generate(req: GenerateRequest, bypass_cache: bool = False, sharded: bool | None = None) -> Generated:
+    """
+    Generate a document for ``req``: serve it from the result cache when
+    possible, otherwise join (or start) the single in-flight upstream call for
+    the same normalised request. ``sharded`` overrides
+    ``settings.sharded_generation``.
+    """
+    provider = get_provider()
+    if sharded is None:
+        sharded = settings.sharded_generation
+    label = getattr(provider, "name", type(provider).__name__)
+    key = cache_key(
+        req,
+        provider=label,
+        model=getattr(provider, "model", ""),
+        prompt_version=getattr(provider, "prompt_version", ""),
+        mode="sharded" if sharded else "single",
+    )
+    use_cache = settings.cache_enabled and not bypass_cache
+    if use_cache:
+        with span("cache_get"):
+            hit = await generation_cache.get(key)
+        CACHE_REQUESTS.inc(cache="generation", result="miss" if hit is None else "hit")
+        if hit is not None:
+            return Generated(hit, "HIT", False)
+    else:
+        CACHE_REQUESTS.inc(cache="generation", result="bypass")
+
+    async def produce() -> Dict[str, Any]:
+        seeds = []
+        if settings.library_seed_examples > 0:
+            with span("library_seed"):
+                seeds = await library.similar(req, settings.library_seed_examples)
+        # Only documents that validate are worth sharing or keeping.
+        async with admission.slot():
+            with span("generate", provider=label, sharded=sharded), prompts.examples(seeds):
+                raw = await (generate_sharded(provider, req) if sharded else provider.generate(req))
+        with stage("response_validation", label):
+            doc = GenerateResponse.model_validate(raw).model_dump(mode="json")
+        if settings.cache_enabled:
+            await generation_cache.set(key, doc)
+        try:
+            await library.add(key, req, doc)
+        except sqlite3.Error as e:
+            # the document is fine; losing it from the library is not worth a 5xx
+            log.warning("could not add document to the requirements library: %r", e)
+        return doc
+
+    async def call() -> Tuple[Dict[str, Any], bool]:
+        # With several workers, identical requests in other processes wait
+        # for this one too (and vice versa).
+        if shared_state.enabled():
+            return await shared_flight.do(key, produce)
+        return await produce(), False
+
+    # A cached result is worth finishing even if every client gave up (the
+    # retry will hit it), but only once it holds an admission slot: work still
+    # queued when its last client leaves is dropped, as is anything uncached.
+    def keep(task) -> bool:
+        return settings.cache_enabled and not admission.is_waiting(task)
+
+    (doc, joined), shared = await inflight.do(key, call, keep=keep)
+    return Generated(doc, "MISS" if use_cache else "BYPASS", shared or joined)
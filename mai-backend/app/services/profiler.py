@@ -0,0 +1,53 @@
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional, Tuple
+
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+
+_lock = threading.Lock()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    parts = code.co_filename.replace("\\", "/").rsplit("/", 2)
+    where = "/".join(parts[-2:]) if len(parts) > 1 else parts[0]
+    return f"{code.co_name}@{where}:{code.co_firstlineno}".replace(";", ":").replace(" ", "_")
+
+
+def sample(seconds: float, interval: float = 0.005, thread_id: Optional[int] = None) -> Tuple[str, int]:
+    """
+    Wall-clock sampling profiler: every ``interval`` seconds, take the Python
+    stack of ``thread_id`` (every thread but this one if None) and count it.
+    Returns ``(collapsed, samples)``: collapsed stacks, one
+    ``frame;frame;frame count`` line each, which flamegraph.pl, speedscope and
+    inferno read as-is.
+
+    Runs in the calling thread (call it via ``to_thread``), so a stalled event
+    loop is sampled too — which is the point.
+    """
+    if not _lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running")
+    try:
+        me = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        stacks: Counter = Counter()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == me or (thread_id is not None and ident != thread_id):
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(f"thread:{names.get(ident, ident)}".replace(" ", "_"))
+                stacks[";".join(reversed(labels))] += 1
+            time.sleep(interval)
+    finally:
+        _lock.release()
+    return "".join(f"{stack} {n}\n" for stack, n in stacks.most_common()), sum(stacks.values())
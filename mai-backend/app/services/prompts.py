@@ -0,0 +1,276 @@
+"""
+The one place prompts are built, for every provider.
+
+The system message is static: rules, schema and task guidance. It is also the
+longest part, so it forms an identical prefix across calls, which upstream
+prompt caching can reuse. Everything request-specific goes in the user
+message, with the brief last.
+"""
+import hashlib
+import math
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, NamedTuple, Sequence, Tuple
+
+import orjson
+
+from app.config import settings
+from app.schemas import CATEGORIES, GenerateRequest
+
+_CATEGORY_ENUM = "|".join(f'"{c}"' for c in CATEGORIES)
+
+_RULES = """You are a senior Requirements Engineer.
+Write clear, testable, measurable requirements using RFC 2119 terms (MUST/SHOULD/MAY).
+Each requirement MUST include acceptance_criteria (bullet list), priority (MUST/SHOULD/MAY), and optional standard_refs.
+Be specific and measurable (numbers/units). Write only in the categories you are asked for.
+Level "high" means system-level requirements with one or two acceptance criteria each;
+"detailed" means component-level requirements with two to four acceptance criteria.
+Tone "concise" means short sentences and no rationale unless essential.
+"""
+
+SYSTEM_RULES = _RULES + """Return ONLY valid JSON that matches the schema below. Do NOT include markdown, code fences or any other text.
+
+SCHEMA:
+{
+ "project_name": str,
+ "summary": str,
+ "categories": [str],
+ "requirements": [
+   {
+     "category": %s,
+     "text": str,
+     "priority": "MUST"|"SHOULD"|"MAY",
+     "acceptance_criteria": [str],
+     "rationale": str|null,
+     "standard_refs": [str]
+   }
+ ]
+}
+""" % _CATEGORY_ENUM
+
+# With schema-enforced output the schema travels in response_format instead.
+SYSTEM_RULES_STRUCTURED = _RULES + "Respond with the requirements document as JSON.\n"
+
+USER_TEMPLATE = """Project Name: {p.projectName}
+Project Type: {p.projectType}
+Tone: {p.tone}; Level: {p.level}
+Task: Create {count} requirements across categories ({categories}).
+{examples}
+Brief:
+{p.description}
+"""
+
+# Revisions share the system prefix above; only the user message differs.
+REVISION_TEMPLATE = """Project Name: {p.projectName}
+Project Type: {p.projectType}
+Tone: {p.tone}; Level: {p.level}
+Task: {task}
+Put only the new requirements in "requirements".{instructions}
+
+Current requirements:
+{items}
+
+Brief:
+{p.description}
+"""
+
+REVISION_TASKS = {
+    "regenerate": "Create {count} requirements across categories ({categories}) to replace the current ones.",
+    "extend": "Create {count} additional requirements across categories ({categories}) that do not repeat the current ones.",
+    "regenerate_each": "Rewrite each of the {n} current requirements from scratch: exactly {n} requirements, same order and categories.",
+    "refine_each": "Improve each of the {n} current requirements (wording, measurability, acceptance criteria) keeping its intent: exactly {n} requirements, same order and categories.",
+}
+
+REPAIR_SYSTEM = "You repair malformed JSON. Return ONLY valid JSON (no markdown), matching the given schema."
+REPAIR_USER = "Fix and return as valid JSON only:\n\n"
+
+# Part of the generation cache key: editing a prompt invalidates old results.
+PROMPT_VERSION = hashlib.sha256(
+    (SYSTEM_RULES + SYSTEM_RULES_STRUCTURED + USER_TEMPLATE + REPAIR_SYSTEM
+     + REVISION_TEMPLATE + "".join(REVISION_TASKS.values())).encode()
+).hexdigest()[:12]
+
+
+# ---- token accounting
+
+@lru_cache(maxsize=1)
+def _encoder():
+    # Exact counts when tiktoken (and its BPE file) is available; optional.
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Local token count: tiktoken if installed, else ~4 characters per token."""
+    enc = _encoder()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+# ---- output budget
+
+# Requirements asked for per level (full document), and rough output tokens
+# per requirement by (level, tone), measured on real responses.
+_COUNTS = {"high": (12, 20), "detailed": (25, 45)}
+_PER_REQUIREMENT = {
+    ("high", "concise"): 60,
+    ("high", "formal"): 75,
+    ("detailed", "concise"): 85,
+    ("detailed", "formal"): 105,
+}
+_DOC_OVERHEAD = 200  # project_name, summary, categories, JSON punctuation
+_MARGIN = 1.15
+
+
+class PromptPlan(NamedTuple):
+    count: str        # e.g. "25–45", goes into the prompt
+    max_tokens: int   # completion budget for that many requirements
+
+
+def _count_range(req: GenerateRequest, categories: Sequence[str] | None) -> Tuple[int, int]:
+    lo, hi = _COUNTS[req.level]
+    # Long briefs describe more scope; leave room rather than truncate.
+    brief_tokens = count_tokens(req.description)
+    if brief_tokens > 200:
+        hi += min(10, (brief_tokens - 200) // 60)
+    if categories:
+        share = len(categories) / len(CATEGORIES)
+        lo = max(3, round(lo * share))
+        hi = max(lo + 2, round(hi * share))
+    return lo, hi
+
+
+def _budget(req: GenerateRequest, n: int) -> int:
+    budget = math.ceil((_DOC_OVERHEAD + n * _PER_REQUIREMENT[(req.level, req.tone)]) * _MARGIN)
+    return max(600, min(budget, settings.max_output_tokens))
+
+
+def plan(req: GenerateRequest, categories: Sequence[str] | None = None) -> PromptPlan:
+    """
+    How many requirements to ask for and the matching ``max_tokens``:
+    fewer and shorter for ``level="high"`` / ``tone="concise"``, more room
+    for long briefs, scaled down to the share of ``categories`` for a shard.
+    """
+    lo, hi = _count_range(req, categories)
+    return PromptPlan(f"{lo}–{hi}", _budget(req, hi))
+
+
+class Revision(NamedTuple):
+    """Partial rework of an existing document, see ``revision()``."""
+    task: str
+    categories: List[str]
+    items: List[Dict[str, Any]]  # requirements sent back as context
+    each: bool                   # one output per item, in order
+    count: str
+    max_tokens: int
+    instructions: str | None = None
+
+
+def revision(
+    req: GenerateRequest,
+    mode: str,
+    categories: Sequence[str],
+    items: List[Dict[str, Any]],
+    each: bool,
+    count: int | None = None,
+    instructions: str | None = None,
+) -> Revision:
+    """
+    Prompt plan for reworking part of a document: ``mode`` is regenerate,
+    refine or extend; ``each`` means one replacement per item in ``items``
+    (selected by index), otherwise whole ``categories`` are regenerated or
+    extended. The budget only covers the requirements asked for.
+    """
+    if each:
+        n = len(items)
+        wanted = str(n)
+        task = REVISION_TASKS[f"{mode}_each"].format(n=n)
+    else:
+        lo, n = (count, count) if count else _count_range(req, categories)
+        wanted = f"exactly {n}" if lo == n else f"{lo}–{n}"
+        task = REVISION_TASKS[mode].format(count=wanted, categories=", ".join(categories))
+    return Revision(task, list(categories), items, each, wanted, _budget(req, n), instructions)
+
+
+def output_budget(req: GenerateRequest, categories: Sequence[str] | None = None, rev: Revision | None = None) -> int:
+    """``max_tokens`` for a generate call, or for the revision ``rev``."""
+    return rev.max_tokens if rev is not None else plan(req, categories).max_tokens
+
+
+def repair_budget(text: str) -> int:
+    """``max_tokens`` for re-emitting ``text`` as valid JSON."""
+    return max(600, min(math.ceil(count_tokens(text) * _MARGIN) + 200, settings.max_output_tokens))
+
+
+# ---- messages
+
+def system_prompt(structured: bool = False) -> str:
+    return SYSTEM_RULES_STRUCTURED if structured else SYSTEM_RULES
+
+
+_examples: ContextVar[Sequence[Dict[str, Any]]] = ContextVar("prompt_examples", default=())
+
+
+@contextmanager
+def examples(items: Sequence[Dict[str, Any]]) -> Iterator[None]:
+    """Seed prompts built inside this block (and its tasks) with earlier requirements."""
+    token = _examples.set(items)
+    try:
+        yield
+    finally:
+        _examples.reset(token)
+
+
+def _examples_block(categories: Sequence[str] | None) -> str:
+    items = [e for e in _examples.get() if not categories or e["category"] in categories]
+    if not items:
+        return ""
+    lines = "\n".join(f"- [{e['category']}/{e['priority']}] {e['text']}" for e in items)
+    return f"\nSimilar requirements from earlier projects (adapt where relevant, do not copy):\n{lines}\n"
+
+
+def user_prompt(req: GenerateRequest, categories: Sequence[str] | None = None, count: str | None = None) -> str:
+    return USER_TEMPLATE.format(
+        p=req,
+        count=count or plan(req, categories).count,
+        categories=", ".join(categories or CATEGORIES),
+        examples=_examples_block(categories),
+    )
+
+
+def revision_prompt(req: GenerateRequest, rev: Revision) -> str:
+    items = "\n".join(
+        orjson.dumps({k: v for k, v in item.items() if v not in (None, [])}).decode() for item in rev.items
+    )
+    return REVISION_TEMPLATE.format(
+        p=req,
+        task=rev.task,
+        instructions=f"\nUser instructions: {rev.instructions}" if rev.instructions else "",
+        items=items or "(none)",
+    )
+
+
+def build_messages(
+    req: GenerateRequest,
+    categories: Sequence[str] | None = None,
+    structured: bool = False,
+    rev: Revision | None = None,
+) -> List[Dict[str, str]]:
+    """OpenAI-style ``[{"role", "content"}]``; other SDKs map these 1:1."""
+    user = revision_prompt(req, rev) if rev is not None else user_prompt(req, categories)
+    return [
+        {"role": "system", "content": system_prompt(structured)},
+        {"role": "user", "content": user},
+    ]
+
+
+def repair_messages(text: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": REPAIR_SYSTEM},
+        {"role": "user", "content": REPAIR_USER + text},
+    ]
@@ -1,9 +1,17 @@
+import asyncio, json
 from datetime import datetime
-from typing import Dict, Any
+from typing import AsyncIterator, Dict, Any, Sequence
 from app.schemas import GenerateRequest
+from app.services.prompts import Revision
 
 class DummyProvider:
-    async def generate(self, payload: GenerateRequest) -> Dict[str, Any]:
+    name = "dummy"
+    model = "dummy"
+    prompt_version = "dummy-1"
+    supports_categories = True
+
+    async def generate(self, payload: GenerateRequest, categories: Sequence[str] | None = None,
+                       rev: Revision | None = None) -> Dict[str, Any]:
         # Simple, deterministic sample so the frontend can be built immediately.
         name = payload.projectName
         t = payload.projectType
@@ -42,6 +50,22 @@ class DummyProvider:
             }
         ]
 
+        if categories:
+            reqs = [r for r in reqs if r["category"] in categories]
+        if rev is not None and rev.each:
+            reqs = [{**r, "text": r["text"] + " (revised)"} for r in rev.items]
+        elif rev is not None:
+            reqs = [
+                {
+                    "category": c,
+                    "text": f"The system SHALL meet {c.lower()} targets stated in the brief.",
+                    "priority": "SHOULD",
+                    "acceptance_criteria": [f"{c} targets verified at design review."],
+                    "standard_refs": [],
+                }
+                for c in rev.categories
+            ]
+
         return {
             "project_name": name,
             "summary": f"Initial draft for a {t} project based on the brief: {desc}",
@@ -49,3 +73,10 @@ class DummyProvider:
             "requirements": reqs,
             "generated_at": datetime.utcnow().isoformat() + "Z"
         }
+
+    async def stream(self, payload: GenerateRequest) -> AsyncIterator[str]:
+        # Replays the sample document in small slices to mimic token deltas.
+        text = json.dumps(await self.generate(payload), ensure_ascii=False)
+        for i in range(0, len(text), 48):
+            yield text[i:i + 48]
+            await asyncio.sleep(0)
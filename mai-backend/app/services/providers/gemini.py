@@ -2,101 +2,114 @@ import json, re
 from datetime import datetime
 from typing import Dict, Any
 import httpx
-from tenacity import retry, stop_after_attempt, wait_exponential
 from app.schemas import GenerateRequest
 from app.config import settings
+from app.services.json_repair import repair_json
+from app.services import prompts
+from app.services.metrics import JSON_PARSE, UPSTREAM_TOKENS
+from app.services import deadline
+from app.services.ratelimit import estimate_tokens, guard_for
+from app.services.structured_output import gemini_response_schema
+from app.services.tracing import stage
 
 JSON_RE = re.compile(r"\{.*\}\s*$", re.S)
 
-SYSTEM_RULES = """You are a senior Requirements Engineer.
-Write clear, testable, measurable requirements using RFC 2119 terms (MUST/SHOULD/MAY).
-Return ONLY valid JSON matching this schema:
-{
- "project_name": str,
- "summary": str,
- "categories": [str],
- "requirements": [
-   {
-     "category": "Functional"|"Performance"|"Safety"|"Compliance"|"Reliability"|"Maintainability"|"Verification",
-     "text": str,
-     "priority": "MUST"|"SHOULD"|"MAY",
-     "acceptance_criteria": [str],
-     "rationale": str|null,
-     "standard_refs": [str]
-   }
- ],
- "generated_at": str
-}
-"""
+def _extract_json(txt: str) -> dict:
+    with stage("json_parse", "gemini"):
+        try:
+            obj = json.loads(txt)
+        except Exception:
+            obj = None
+            m = JSON_RE.search(txt or "")
+            if m:
+                try:
+                    obj = json.loads(m.group(0))
+                except ValueError:
+                    pass
+    if obj is not None:
+        JSON_PARSE.inc(provider="gemini", path="direct")
+        return obj
+    with stage("local_repair", "gemini"):
+        obj = repair_json(txt or "")
+    if obj is not None:
+        JSON_PARSE.inc(provider="gemini", path="local_repair")
+        return obj
+    JSON_PARSE.inc(provider="gemini", path="failed")
+    raise ValueError(f"Gemini text was not valid JSON. First 200 chars: {txt[:200]!r}")
 
-def _user_prompt(p: GenerateRequest) -> str:
-    return f"""Project Name: {p.projectName}
-Project Type: {p.projectType}
-Tone: {p.tone}; Level: {p.level}
+class GeminiProvider:
+    name = "gemini"
 
-Brief:
-{p.description}
+    def __init__(self, http_client: httpx.AsyncClient | None = None) -> None:
+        # Shared pooled client from the provider registry; falls back to a
+        # private one for standalone use.
+        self.model = settings.gemini_model_id
+        self.client = http_client or httpx.AsyncClient(timeout=90)
+        # response_schema enforces the format, so the prompt can leave it out
+        self.structured = settings.structured_output
 
-Tasks:
-1) Create 25–45 requirements across categories (Functional, Performance, Safety, Compliance, Reliability, Maintainability, Verification).
-2) Each requirement MUST include acceptance_criteria (bullet list), priority (MUST/SHOULD/MAY), and optional standard_refs.
-3) Be specific and measurable (numbers/units).
-Return JSON only.
-"""
+    @property
+    def prompt_version(self) -> str:
+        return prompts.PROMPT_VERSION + ("-schema" if self.structured else "")
 
-def _extract_json(txt: str) -> dict:
-    try:
-        return json.loads(txt)
-    except Exception:
-        m = JSON_RE.search(txt or "")
-        if m:
-            return json.loads(m.group(0))
-        raise ValueError(f"Gemini text was not valid JSON. First 200 chars: {txt[:200]!r}")
+    async def _post(self, url: str, body: Dict[str, Any]) -> httpx.Response:
+        r = await self.client.post(url, json=body, headers={"Content-Type": "application/json"}, timeout=deadline.timeout(90))
+        if r.status_code >= 400:
+            # Surface Gemini's real error in FastAPI response; keep the
+            # response attached so the upstream guard can read 429/Retry-After.
+            raise httpx.HTTPStatusError(f"[Gemini {r.status_code}] {r.text}", request=r.request, response=r)
+        return r
 
-class GeminiProvider:
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(min=1, max=6))
-    async def generate(self, payload: GenerateRequest) -> Dict[str, Any]:
+    async def generate(self, payload: GenerateRequest, rev: prompts.Revision | None = None) -> Dict[str, Any]:
         if not settings.gemini_api_key:
             raise RuntimeError("GEMINI_API_KEY not configured")
 
         url = (f"https://generativelanguage.googleapis.com/v1beta/models/"
-               f"{settings.gemini_model_id}:generateContent?key={settings.gemini_api_key}")
+               f"{self.model}:generateContent?key={settings.gemini_api_key}")
 
+        with stage("prompt_build", self.name):
+            system, prompt = (m["content"] for m in prompts.build_messages(payload, structured=self.structured, rev=rev))
+            max_tokens = prompts.output_budget(payload, rev=rev)
         body = {
             "contents": [{
                 "role": "user",
-                "parts": [{"text": _user_prompt(payload)}],
+                "parts": [{"text": prompt}],
             }],
             # IMPORTANT: role must be "system" here
             "system_instruction": {
                 "role": "system",
-                "parts": [{"text": SYSTEM_RULES}]
+                "parts": [{"text": system}]
             },
             "generationConfig": {
                 "temperature": 0.2,
                 "topP": 0.9,
                 "topK": 40,
-                "maxOutputTokens": 1200,
+                "maxOutputTokens": max_tokens,
                 "response_mime_type": "application/json",
             },
         }
+        if self.structured:
+            body["generationConfig"]["response_schema"] = gemini_response_schema()
 
-        async with httpx.AsyncClient(timeout=90) as client:
-            r = await client.post(url, json=body, headers={"Content-Type": "application/json"})
-            if r.status_code >= 400:
-                # Surface Gemini’s real error in FastAPI response
-                raise RuntimeError(f"[Gemini {r.status_code}] {r.text}")
+        r = await guard_for(self.name, self.model).call(
+            lambda: self._post(url, body),
+            est_tokens=estimate_tokens(system, prompt, max_tokens=max_tokens),
+        )
 
-            data = r.json()
-            candidates = data.get("candidates") or []
-            if not candidates:
-                raise RuntimeError(f"Empty Gemini response: {data}")
-            parts = candidates[0].get("content", {}).get("parts", [])
-            txt = (parts[0].get("text") if parts else "") or ""
-            obj = _extract_json(txt)
+        data = r.json()
+        usage = data.get("usageMetadata") or {}
+        for field, kind in (("promptTokenCount", "prompt"), ("candidatesTokenCount", "completion")):
+            if isinstance(usage.get(field), int):
+                UPSTREAM_TOKENS.inc(usage[field], provider=self.name, kind=kind)
+        candidates = data.get("candidates") or []
+        if not candidates:
+            raise RuntimeError(f"Empty Gemini response: {data}")
+        parts = candidates[0].get("content", {}).get("parts", [])
+        txt = (parts[0].get("text") if parts else "") or ""
+        obj = _extract_json(txt)
 
-            obj.setdefault("project_name", payload.projectName)
-            obj["generated_at"] = datetime.utcnow().isoformat() + "Z"
-            if not obj.get("categories") and obj.get("requirements"):
-                obj["categories"] = sorted({r.get("category","Uncategorized") for r in obj["requirements"]})
-            return obj
+        obj.setdefault("project_name", payload.projectName)
+        obj["generated_at"] = datetime.utcnow().isoformat() + "Z"
+        if not obj.get("categories") and obj.get("requirements"):
+            obj["categories"] = sorted({r.get("category","Uncategorized") for r in obj["requirements"]})
+        return obj
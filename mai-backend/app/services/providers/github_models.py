@@ -1,56 +1,26 @@
-import json, re
+import asyncio, json, re
 from datetime import datetime
 from typing import Dict, Any, List
 
 from azure.ai.inference import ChatCompletionsClient
-from azure.ai.inference.models import SystemMessage, UserMessage
+from azure.ai.inference.models import JsonSchemaFormat, SystemMessage, UserMessage
 from azure.core.credentials import AzureKeyCredential
+from azure.core.exceptions import HttpResponseError
 
 from app.schemas import GenerateRequest
 from app.config import settings
+from app.services.json_repair import repair_json
+from app.services import deadline, prompts
+from app.services.metrics import JSON_PARSE
+from app.services.deadline import ClientDisconnected, DeadlineExceeded
+from app.services.ratelimit import UpstreamUnavailable, estimate_tokens, guard_for
+from app.services.structured_output import SCHEMA_NAME, response_json_schema
+from app.services.tracing import stage
 
 _CODE_FENCE_START = re.compile(r"^```(?:json)?\s*", re.I)
 _CODE_FENCE_END = re.compile(r"\s*```$", re.I)
 
 
-SYSTEM_RULES = """You are a senior Requirements Engineer.
-Write clear, testable, measurable requirements using RFC 2119 terms (MUST/SHOULD/MAY).
-Return ONLY valid JSON that matches the schema below. Do NOT include any extra text, prose, or markdown fences.
-
-SCHEMA:
-{
- "project_name": str,
- "summary": str,
- "categories": [str],
- "requirements": [
-   {
-     "category": "Functional"|"Performance"|"Safety"|"Compliance"|"Reliability"|"Maintainability"|"Verification",
-     "text": str,
-     "priority": "MUST"|"SHOULD"|"MAY",
-     "acceptance_criteria": [str],
-     "rationale": str|null,
-     "standard_refs": [str]
-   }
- ],
- "generated_at": str
-}
-"""
-
-def _user_prompt(p: GenerateRequest) -> str:
-    return f"""Project Name: {p.projectName}
-Project Type: {p.projectType}
-Tone: {p.tone}; Level: {p.level}
-
-Brief:
-{p.description}
-
-Tasks:
-1) Create 25–45 requirements across categories (Functional, Performance, Safety, Compliance, Reliability, Maintainability, Verification).
-2) Each requirement MUST include acceptance_criteria (bullet list), priority (MUST/SHOULD/MAY), and optional standard_refs.
-3) Be specific and measurable (numbers/units).
-Return JSON only (no markdown).
-"""
-
 def _strip_fences(s: str) -> str:
     s = s.strip()
     s = _CODE_FENCE_START.sub("", s)
@@ -78,49 +48,106 @@ def _parse_or_raise(raw: str) -> dict:
 class GitHubModelsProvider:
     """Provider that calls GitHub Models via Azure AI Inference SDK (DeepSeek-V3-0324)."""
 
+    name = "github_models"
+
     def __init__(self) -> None:
         if not settings.github_token:
             raise RuntimeError("GITHUB_TOKEN not configured")
         self.client = ChatCompletionsClient(
             endpoint=settings.github_endpoint,
             credential=AzureKeyCredential(settings.github_token),
+            retry_total=0,  # retries/back-off are the upstream guard's job
         )
         self.model = settings.github_model_id
-
-    def _complete(self, messages: List, max_tokens: int = 3200):
-        # SDK is sync; fine for our usage.
-        return self.client.complete(
-            messages=messages,
-            temperature=0.2,
-            top_p=0.9,
-            max_tokens=max_tokens,  # more room to avoid truncation
-            model=self.model,
+        self.structured = settings.structured_output
+        self.guard = guard_for(self.name, self.model)
+
+    @property
+    def prompt_version(self) -> str:
+        return prompts.PROMPT_VERSION + ("-schema" if self.structured else "")
+
+    async def _complete(self, messages: List, max_tokens: int, structured: bool = False):
+        extra = {}
+        if structured:
+            extra["response_format"] = JsonSchemaFormat(
+                name=SCHEMA_NAME, schema=response_json_schema(), strict=True
+            )
+        # SDK is sync; run it in a worker thread so the event loop stays free.
+        # The transport timeouts are taken per attempt so the thread cannot
+        # outlive the request deadline.
+        def call():
+            budget = deadline.timeout(settings.http_timeout)
+            return asyncio.to_thread(
+                self.client.complete,
+                messages=messages,
+                temperature=0.2,
+                top_p=0.9,
+                max_tokens=max_tokens,
+                model=self.model,
+                connection_timeout=budget,
+                read_timeout=budget,
+                **extra,
+            )
+
+        return await self.guard.call(
+            call,
+            est_tokens=estimate_tokens(*(m.content for m in messages), max_tokens=max_tokens),
         )
 
-    async def generate(self, payload: GenerateRequest) -> Dict[str, Any]:
+    @staticmethod
+    def _sdk_messages(messages: List[dict]) -> List:
+        kinds = {"system": SystemMessage, "user": UserMessage}
+        return [kinds[m["role"]](m["content"]) for m in messages]
+
+    def _messages(self, payload: GenerateRequest, structured: bool, rev: prompts.Revision | None) -> List:
+        with stage("prompt_build", self.name):
+            return self._sdk_messages(prompts.build_messages(payload, structured=structured, rev=rev))
+
+    async def _first_pass(self, payload: GenerateRequest, rev: prompts.Revision | None):
+        max_tokens = prompts.output_budget(payload, rev=rev)
+        if self.structured:
+            try:
+                return await self._complete(
+                    self._messages(payload, True, rev),
+                    max_tokens=max_tokens,
+                    structured=True,
+                )
+            except HttpResponseError as e:
+                if e.status_code != 400:
+                    raise
+                # model has no structured output: stay prompt-only from now on
+                self.structured = False
+        return await self._complete(self._messages(payload, False, rev), max_tokens=max_tokens)
+
+    async def generate(self, payload: GenerateRequest, rev: prompts.Revision | None = None) -> Dict[str, Any]:
         # ---- First attempt: full generation
-        messages = [
-            SystemMessage(SYSTEM_RULES),
-            UserMessage(_user_prompt(payload)),
-        ]
         try:
-            resp = self._complete(messages, max_tokens=3200)
+            resp = await self._first_pass(payload, rev)
             text = resp.choices[0].message.content if resp.choices else ""
             try:
-                obj = _parse_or_raise(text)
+                with stage("json_parse", self.name):
+                    obj, path = _parse_or_raise(text), "direct"
             except ValueError:
-                # ---- Second attempt: repair pass
-                repair_messages = [
-                    SystemMessage(
-                        "You repair malformed JSON. Return ONLY valid JSON, no markdown, matching the given schema."
-                    ),
-                    UserMessage(
-                        "Fix and return as valid JSON only:\n\n" + _strip_fences(text)
-                    ),
-                ]
-                repair = self._complete(repair_messages, max_tokens=2000)
-                repaired_text = repair.choices[0].message.content if repair.choices else ""
-                obj = _parse_or_raise(repaired_text)
+                # ---- Local repair of truncated / sloppy JSON
+                with stage("local_repair", self.name):
+                    obj, path = repair_json(text or ""), "local_repair"
+                if obj is None:
+                    # ---- Last resort: LLM repair pass
+                    broken = _strip_fences(text)
+                    try:
+                        with stage("llm_repair", self.name):
+                            repair = await self._complete(
+                                self._sdk_messages(prompts.repair_messages(broken)),
+                                max_tokens=prompts.repair_budget(broken),
+                            )
+                            repaired_text = repair.choices[0].message.content if repair.choices else ""
+                            obj, path = _parse_or_raise(repaired_text), "llm_repair"
+                    except ValueError:
+                        JSON_PARSE.inc(provider=self.name, path="failed")
+                        raise
+            JSON_PARSE.inc(provider=self.name, path=path)
+        except (UpstreamUnavailable, DeadlineExceeded, ClientDisconnected):
+            raise
         except Exception as e:
             raise RuntimeError(f"GitHub Models request failed: {repr(e)}") from e
 
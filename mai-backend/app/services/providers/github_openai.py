@@ -1,54 +1,27 @@
-import json, re
+import json, logging, re
 from datetime import datetime
-from typing import Dict, Any, List
-from openai import OpenAI
+from typing import AsyncIterator, Dict, Any, List, Sequence
+import httpx
+from openai import AsyncOpenAI, BadRequestError
 
 from app.schemas import GenerateRequest
 from app.config import settings
+from app.services.json_repair import repair_json
+from app.services import prompts
+from app.services.metrics import JSON_PARSE
+from app.services import deadline
+from app.services.deadline import ClientDisconnected, DeadlineExceeded
+from app.services.ratelimit import UpstreamUnavailable, estimate_tokens, guard_for
+from app.services.structured_output import openai_response_format
+from app.services.tracing import stage
+
+log = logging.getLogger(__name__)
 
 # ---- helpers
 
 _CODE_FENCE_START = re.compile(r"^```(?:json)?\s*", re.I)
 _CODE_FENCE_END = re.compile(r"\s*```$", re.I)
 
-SYSTEM_RULES = """You are a senior Requirements Engineer.
-Write clear, testable, measurable requirements using RFC 2119 terms (MUST/SHOULD/MAY).
-Return ONLY valid JSON that matches the schema below. Do NOT include markdown or code fences.
-
-SCHEMA:
-{
- "project_name": str,
- "summary": str,
- "categories": [str],
- "requirements": [
-   {
-     "category": "Functional"|"Performance"|"Safety"|"Compliance"|"Reliability"|"Maintainability"|"Verification",
-     "text": str,
-     "priority": "MUST"|"SHOULD"|"MAY",
-     "acceptance_criteria": [str],
-     "rationale": str|null,
-     "standard_refs": [str]
-   }
- ],
- "generated_at": str
-}
-"""
-
-def _user_prompt(p: GenerateRequest) -> str:
-    return f"""Project Name: {p.projectName}
-Project Type: {p.projectType}
-Tone: {p.tone}; Level: {p.level}
-
-Brief:
-{p.description}
-
-Tasks:
-1) Create 25–45 requirements across categories (Functional, Performance, Safety, Compliance, Reliability, Maintainability, Verification).
-2) Each requirement MUST include acceptance_criteria (bullet list), priority (MUST/SHOULD/MAY), and optional standard_refs.
-3) Be specific and measurable (numbers/units).
-Return JSON only (no markdown).
-"""
-
 def _strip_fences(s: str) -> str:
     s = s.strip()
     s = _CODE_FENCE_START.sub("", s)
@@ -76,44 +49,102 @@ class GitHubOpenAIProvider:
     Provider using OpenAI SDK pointed at GitHub Models endpoint.
     """
 
-    def __init__(self) -> None:
+    name = "github_openai"
+    supports_categories = True
+
+    def __init__(self, http_client: httpx.AsyncClient | None = None) -> None:
         if not settings.github_token:
             raise RuntimeError("GITHUB_TOKEN not configured")
-        self.client = OpenAI(
+        # http_client comes from the provider registry so connections are
+        # pooled and kept alive across requests.
+        self.client = AsyncOpenAI(
             base_url=settings.github_endpoint,
             api_key=settings.github_token,
+            http_client=http_client,
+            timeout=settings.http_timeout,
+            max_retries=0,  # retries/back-off are the upstream guard's job
         )
         self.model = settings.github_model_id
-
-    def _complete(self, messages: List[dict], max_tokens: int = 3200):
-        # Synchronous call – fine for our usage
-        return self.client.chat.completions.create(
-            messages=messages,
-            model=self.model,
-            temperature=0.2,
-            top_p=0.95,
-            max_tokens=max_tokens,
+        self.guard = guard_for(self.name, self.model)
+        # Flipped off for good if the model rejects response_format.
+        self.structured = settings.structured_output
+
+    @property
+    def prompt_version(self) -> str:
+        return prompts.PROMPT_VERSION + ("-schema" if self.structured else "")
+
+    def _messages(self, payload: GenerateRequest, categories: Sequence[str] | None, structured: bool,
+                  rev: prompts.Revision | None = None) -> List[dict]:
+        with stage("prompt_build", self.name):
+            return prompts.build_messages(payload, categories, structured, rev)
+
+    async def _complete(self, messages: List[dict], max_tokens: int, structured: bool = False, stream: bool = False):
+        extra = {"response_format": openai_response_format()} if structured else {}
+        return await self.guard.call(
+            lambda: self.client.chat.completions.create(
+                messages=messages,
+                model=self.model,
+                temperature=0.2,
+                top_p=0.95,
+                max_tokens=max_tokens,
+                stream=stream,
+                timeout=deadline.timeout(settings.http_timeout),
+                **extra,
+            ),
+            est_tokens=estimate_tokens(*(m["content"] for m in messages), max_tokens=max_tokens),
         )
 
-    async def generate(self, payload: GenerateRequest) -> Dict[str, Any]:
-        base_msgs = [
-            {"role": "system", "content": SYSTEM_RULES},
-            {"role": "user", "content": _user_prompt(payload)},
-        ]
+    async def _generate_call(self, payload: GenerateRequest, categories: Sequence[str] | None, max_tokens: int,
+                             stream: bool = False, rev: prompts.Revision | None = None):
+        """Schema-enforced call when available, prompt-only otherwise."""
+        if self.structured:
+            try:
+                return await self._complete(self._messages(payload, categories, True, rev), max_tokens, structured=True, stream=stream)
+            except BadRequestError as e:
+                log.warning("%s rejected structured output, using prompt-only JSON: %s", self.model, e)
+                self.structured = False
+        return await self._complete(self._messages(payload, categories, False, rev), max_tokens, stream=stream)
+
+    async def stream(self, payload: GenerateRequest) -> AsyncIterator[str]:
+        """Yield raw text deltas of the completion as the model produces them."""
+        try:
+            chunks = await self._generate_call(payload, None, prompts.plan(payload).max_tokens, stream=True)
+            async for chunk in chunks:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except (UpstreamUnavailable, DeadlineExceeded, ClientDisconnected):
+            raise
+        except Exception as e:
+            raise RuntimeError(f"GitHub OpenAI stream failed: {repr(e)}") from e
+
+    async def generate(self, payload: GenerateRequest, categories: Sequence[str] | None = None,
+                       rev: prompts.Revision | None = None) -> Dict[str, Any]:
+        """Full document, only ``categories`` when called for one shard, or the requirements asked for by ``rev``."""
+        max_tokens = prompts.output_budget(payload, categories, rev)
 
         try:
-            resp = self._complete(base_msgs, max_tokens=3200)
+            resp = await self._generate_call(payload, categories, max_tokens, rev=rev)
             text = resp.choices[0].message.content or ""
             try:
-                obj = _parse_or_raise(text)
+                with stage("json_parse", self.name):
+                    obj, path = _parse_or_raise(text), "direct"
             except ValueError:
-                # Repair pass: ask model to output valid JSON only
-                repair_msgs = [
-                    {"role": "system", "content": "You repair malformed JSON. Return ONLY valid JSON (no markdown)."},
-                    {"role": "user", "content": "Fix and return as valid JSON only:\n\n" + _strip_fences(text)},
-                ]
-                repair = self._complete(repair_msgs, max_tokens=2000)
-                obj = _parse_or_raise(repair.choices[0].message.content or "")
+                # Usually truncated at max_tokens: close it up locally first
+                with stage("local_repair", self.name):
+                    obj, path = repair_json(text), "local_repair"
+                if obj is None:
+                    # Last resort: ask model to output valid JSON only
+                    broken = _strip_fences(text)
+                    try:
+                        with stage("llm_repair", self.name):
+                            repair = await self._complete(prompts.repair_messages(broken), prompts.repair_budget(broken))
+                            obj, path = _parse_or_raise(repair.choices[0].message.content or ""), "llm_repair"
+                    except ValueError:
+                        JSON_PARSE.inc(provider=self.name, path="failed")
+                        raise
+            JSON_PARSE.inc(provider=self.name, path=path)
+        except (UpstreamUnavailable, DeadlineExceeded, ClientDisconnected):
+            raise
         except Exception as e:
             raise RuntimeError(f"GitHub OpenAI request failed: {repr(e)}") from e
 
@@ -0,0 +1,325 @@
+import asyncio
+import logging
+import re
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.config import settings
+from app.services import deadline, shared_state
+from app.services.deadline import DeadlineExceeded
+from app.services.metrics import IN_FLIGHT, UPSTREAM_TOKENS
+from app.services.prompts import count_tokens
+from app.services.shared_state import shared_store
+from app.services.tracing import stage
+
+log = logging.getLogger(__name__)
+
+
+class UpstreamUnavailable(RuntimeError):
+    """Upstream cannot take the call right now; ``retry_after`` is a hint in seconds."""
+
+    def __init__(self, message: str, retry_after: float) -> None:
+        super().__init__(message)
+        self.retry_after = max(1, int(retry_after + 0.999))
+
+
+class UpstreamThrottled(UpstreamUnavailable):
+    pass
+
+
+class CircuitOpen(UpstreamUnavailable):
+    pass
+
+
+# ---- reading upstream errors
+
+_DURATION = re.compile(r"(?:(\d+(?:\.\d+)?)h)?(?:(\d+(?:\.\d+)?)m(?!s))?(?:(\d+(?:\.\d+)?)s)?(?:(\d+)ms)?$")
+_TRANSPORT_ERRORS = {"APIConnectionError", "APITimeoutError", "TransportError", "TimeoutException",
+                     "ServiceRequestError", "ServiceResponseError", "TimeoutError"}
+
+
+def _seconds(value: Optional[str]) -> Optional[float]:
+    """Parse ``Retry-After`` / ``x-ratelimit-reset-*`` values: seconds, HTTP date or ``6m0s``."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    m = _DURATION.match(value)
+    if m and any(m.groups()):
+        h, mi, s, ms = (float(g) if g else 0.0 for g in m.groups())
+        return h * 3600 + mi * 60 + s + ms / 1000
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _status_and_headers(exc: BaseException) -> Tuple[Optional[int], Any]:
+    response = getattr(exc, "response", None)
+    status = getattr(exc, "status_code", None) or getattr(response, "status_code", None)
+    return status, getattr(response, "headers", None) or {}
+
+
+def retry_after_of(headers: Any) -> Optional[float]:
+    for name in ("retry-after", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens", "x-ratelimit-reset"):
+        secs = _seconds(headers.get(name)) if headers else None
+        if secs is not None:
+            return secs
+    return None
+
+
+def classify(exc: BaseException) -> Tuple[str, Optional[float]]:
+    """``("throttled", retry_after)``, ``("transient", None)`` or ``("fatal", None)``."""
+    status, headers = _status_and_headers(exc)
+    if status == 429:
+        return "throttled", retry_after_of(headers)
+    if status is not None and (status >= 500 or status == 408):
+        return "transient", retry_after_of(headers)
+    if any(c.__name__ in _TRANSPORT_ERRORS for c in type(exc).__mro__):
+        return "transient", None
+    return "fatal", None
+
+
+# ---- limiter
+
+class TokenBucket:
+    """
+    Bucket refilled at ``per_minute / 60`` per second. ``reserve`` always
+    succeeds and returns how long the caller must wait: taking tokens in
+    arrival order (running into debt if needed) queues callers FIFO instead
+    of failing them.
+    """
+
+    def __init__(self, per_minute: float) -> None:
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, n: float, now: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= n
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self, n: float) -> None:
+        if self.rate > 0:
+            self.tokens = min(self.capacity, self.tokens + n)
+
+
+class SharedTokenBucket(TokenBucket):
+    """``TokenBucket`` whose level lives in the shared store, so all workers draw from one quota."""
+
+    def __init__(self, name: str, per_minute: float) -> None:
+        super().__init__(per_minute)
+        self.name = name
+
+    def reserve(self, n: float, now: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        return shared_store.reserve(self.name, self.rate, self.capacity, n)
+
+    def refund(self, n: float) -> None:
+        if self.rate > 0:
+            shared_store.refund(self.name, self.capacity, n)
+
+
+class CircuitBreaker:
+    """Opens after ``threshold`` consecutive upstream failures; one probe after ``cooldown``."""
+
+    def __init__(self, threshold: int, cooldown: float) -> None:
+        self.threshold, self.cooldown = threshold, cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def before(self) -> None:
+        state = self.state
+        if state == "open" or (state == "half_open" and self.probing):
+            left = self.cooldown - (time.monotonic() - (self.opened_at or 0))
+            raise CircuitOpen("Upstream circuit is open after repeated failures", max(left, 1))
+        if state == "half_open":
+            self.probing = True
+
+    def success(self) -> None:
+        self.failures, self.opened_at, self.probing = 0, None, False
+
+    def failure(self) -> None:
+        self.failures += 1
+        self.probing = False
+        if self.opened_at is not None or self.failures >= self.threshold:
+            if self.opened_at is None:
+                log.warning("upstream circuit opened after %d failures", self.failures)
+            self.opened_at = time.monotonic()
+
+
+class UpstreamGuard:
+    """
+    Everything between a provider and one upstream model: requests/min and
+    tokens/min buckets, Retry-After back-off, bounded retries and a circuit
+    breaker. Providers wrap each upstream call in :meth:`call`.
+
+    With several workers the buckets and the back-off deadline are shared
+    through ``shared_state``, so the quota holds for the host as a whole; the
+    breaker stays per process.
+
+    Under a request deadline (``services.deadline``) each attempt gets only
+    the time that is left, and waits or retries that cannot fit fail at once.
+    """
+
+    def __init__(self, name: str, provider: str = "") -> None:
+        self.name = name
+        self.provider = provider or name
+        self.shared = shared_state.enabled()
+        if self.shared:
+            self.requests = SharedTokenBucket(f"{name}:rpm", settings.upstream_rpm)
+            self.tokens = SharedTokenBucket(f"{name}:tpm", settings.upstream_tpm)
+        else:
+            self.requests = TokenBucket(settings.upstream_rpm)
+            self.tokens = TokenBucket(settings.upstream_tpm)
+        self.breaker = CircuitBreaker(settings.breaker_failure_threshold, settings.breaker_cooldown_seconds)
+        self.blocked_until = 0.0
+
+    def blocked_for(self) -> float:
+        if self.shared:
+            return shared_store.blocked_for(self.name)
+        return max(0.0, self.blocked_until - time.monotonic())
+
+    async def _offload(self, fn: Callable[..., Any], *args: Any) -> Any:
+        # Shared buckets are SQLite transactions that may wait on another
+        # worker's write lock: keep them off the event loop.
+        if self.shared:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def _take(self, est_tokens: int) -> float:
+        now = time.monotonic()
+        wait = max(self.requests.reserve(1, now), self.tokens.reserve(est_tokens, now))
+        return max(wait, self.blocked_for())
+
+    def _give_back(self, requests: int, tokens: int) -> None:
+        if requests:
+            self.requests.refund(requests)
+        if tokens:
+            self.tokens.refund(tokens)
+
+    async def _reserve(self, est_tokens: int) -> float:
+        return await self._offload(self._take, est_tokens)
+
+    async def _refund(self, requests: int, tokens: int) -> None:
+        await self._offload(self._give_back, requests, tokens)
+
+    async def penalize(self, seconds: float) -> None:
+        """Upstream said stop: nobody calls it again before ``seconds`` have passed."""
+        if self.shared:
+            await asyncio.to_thread(shared_store.block, self.name, seconds)
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    async def _settle(self, result: Any, est_tokens: int) -> None:
+        usage = getattr(result, "usage", None)
+        for kind in ("prompt_tokens", "completion_tokens"):
+            n = getattr(usage, kind, None)
+            if isinstance(n, int):
+                UPSTREAM_TOKENS.inc(n, provider=self.provider, kind=kind.split("_")[0])
+        used = getattr(usage, "total_tokens", None)
+        if isinstance(used, int) and used < est_tokens:
+            await self._refund(0, est_tokens - used)
+
+    async def _pause(self, seconds: float) -> None:
+        left = deadline.remaining()
+        if left is not None and seconds >= left:
+            raise DeadlineExceeded(f"{self.name}: retry would not finish before the request deadline")
+        await asyncio.sleep(seconds)
+
+    async def call(self, fn: Callable[[], Awaitable[Any]], est_tokens: int = 0) -> Any:
+        attempts = max(1, settings.upstream_max_attempts)
+        for attempt in range(1, attempts + 1):
+            if deadline.expired():
+                raise DeadlineExceeded(f"{self.name}: request deadline exceeded")
+            self.breaker.before()
+            wait = await self._reserve(est_tokens)
+            left = deadline.remaining()
+            if wait > settings.upstream_max_wait_seconds or (left is not None and wait >= left):
+                self.breaker.probing = False
+                await self._refund(1, est_tokens)
+                raise UpstreamThrottled(f"{self.name}: upstream quota exhausted", wait)
+            if wait > 0:
+                try:
+                    await asyncio.sleep(wait)
+                except (asyncio.CancelledError, DeadlineExceeded):
+                    # the call will not happen: return its place in the quota
+                    self.breaker.probing = False
+                    await self._refund(1, est_tokens)
+                    raise
+            try:
+                with IN_FLIGHT.track(kind="upstream"), stage("upstream_call", self.provider):
+                    async with asyncio.timeout(deadline.remaining()):
+                        result = await fn()
+            except asyncio.CancelledError:
+                self.breaker.probing = False
+                raise
+            except Exception as e:
+                self.breaker.probing = False
+                if deadline.expired():
+                    # our own budget ran out; says nothing about upstream health
+                    raise DeadlineExceeded(f"{self.name}: request deadline exceeded") from e
+                kind, retry_after = classify(e)
+                if kind == "fatal":
+                    raise
+                if kind == "throttled":
+                    backoff = retry_after if retry_after is not None else min(2 ** attempt, 30)
+                    await self.penalize(backoff)
+                    log.info("%s throttled, backing off %.1fs (attempt %d)", self.name, backoff, attempt)
+                    if attempt == attempts:
+                        raise UpstreamThrottled(f"{self.name}: upstream rate limit", backoff) from e
+                    left = deadline.remaining()
+                    if left is not None and backoff >= left:
+                        raise UpstreamThrottled(f"{self.name}: upstream rate limit", backoff) from e
+                else:
+                    self.breaker.failure()
+                    if attempt == attempts:
+                        raise
+                    await self._pause(retry_after if retry_after is not None else min(2 ** attempt, 8))
+                continue
+            self.breaker.success()
+            await self._settle(result, est_tokens)
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "breaker": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "blocked_for": round(self.blocked_for(), 1),
+        }
+
+
+_guards: Dict[str, UpstreamGuard] = {}
+
+
+def guard_for(provider: str, model: str) -> UpstreamGuard:
+    key = f"{provider}:{model}"
+    g = _guards.get(key)
+    if g is None:
+        g = _guards[key] = UpstreamGuard(key, provider)
+    return g
+
+
+def guard_stats() -> Dict[str, Any]:
+    return {k: g.stats() for k, g in _guards.items()}
+
+
+def estimate_tokens(*texts: str, max_tokens: int = 0) -> int:
+    """Prompt size, counted locally, plus the completion budget."""
+    return sum(count_tokens(t) for t in texts) + max_tokens
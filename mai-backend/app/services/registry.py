@@ -0,0 +1,141 @@
+import importlib
+import logging
+from typing import TYPE_CHECKING, Any, Dict, List
+
+from app.config import settings
+
+if TYPE_CHECKING:
+    import httpx
+
+log = logging.getLogger(__name__)
+
+PROVIDER_ALIASES = {
+    "github_openai": "github_openai",
+    "openai": "github_openai",
+    "gpt4o": "github_openai",
+    "github_models": "github_models",
+    "azure": "github_models",
+    "gemini": "gemini",
+    "google": "gemini",
+    "hf": "hf",
+    "huggingface": "hf",
+    "dummy": "dummy",
+}
+
+# name -> (module, class, shares the pooled http client). Modules are imported
+# on first use, so SDKs of providers that are not configured never load.
+PROVIDER_CLASSES = {
+    "github_openai": ("app.services.providers.github_openai", "GitHubOpenAIProvider", True),
+    "github_models": ("app.services.providers.github_models", "GitHubModelsProvider", False),
+    "gemini": ("app.services.providers.gemini", "GeminiProvider", True),
+    "hf": ("app.services.providers.hf", "HFProvider", True),
+    "dummy": ("app.services.providers.dummy", "DummyProvider", False),
+}
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class ProviderRegistry:
+    """
+    Long-lived providers and the pooled HTTP client they share.
+
+    Started and stopped with the app (see ``app.main``); if something asks for
+    a provider before startup (tests, scripts) everything is created lazily.
+    """
+
+    def __init__(self) -> None:
+        self._http: "httpx.AsyncClient | None" = None
+        self._providers: Dict[str, Any] = {}
+        self._chain = None
+
+    def http_client(self) -> "httpx.AsyncClient":
+        if self._http is None or self._http.is_closed:
+            import httpx
+            self._http = httpx.AsyncClient(
+                http2=settings.http_http2 and _http2_available(),
+                limits=httpx.Limits(
+                    max_connections=settings.http_max_connections,
+                    max_keepalive_connections=settings.http_max_keepalive,
+                    keepalive_expiry=settings.http_keepalive_expiry,
+                ),
+                timeout=httpx.Timeout(settings.http_timeout, connect=settings.http_connect_timeout),
+            )
+        return self._http
+
+    def _build(self, name: str):
+        module, cls, pooled = PROVIDER_CLASSES[name]
+        provider_cls = getattr(importlib.import_module(module), cls)
+        return provider_cls(http_client=self.http_client()) if pooled else provider_cls()
+
+    def modules(self) -> List[str]:
+        """Provider modules the configured chain will import."""
+        return [PROVIDER_CLASSES[n][0] for n in self.chain_names()]
+
+    @staticmethod
+    def _key(name: str | None) -> str:
+        return PROVIDER_ALIASES.get((name or "dummy").lower(), "dummy")
+
+    def chain_names(self) -> List[str]:
+        names: List[str] = []
+        for n in settings.provider_chain or [settings.ai_provider]:
+            key = self._key(n)
+            if key not in names:
+                names.append(key)
+        return names
+
+    def get(self, name: str | None = None):
+        """
+        A single provider by name, or (no name) the configured chain: the bare
+        provider when the chain has one entry, else a ``ProviderChain``.
+        """
+        if name is None:
+            names = self.chain_names()
+            if len(names) > 1:
+                if self._chain is None:
+                    from app.services.failover import ProviderChain
+                    self._chain = ProviderChain([self.get(n) for n in names])
+                return self._chain
+            name = names[0]
+        key = self._key(name)
+        provider = self._providers.get(key)
+        if provider is None:
+            provider = self._providers[key] = self._build(key)
+        return provider
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "chain": self.chain_names(),
+            "hedge_requests": settings.hedge_requests,
+            "latency": self._chain.stats() if self._chain is not None else {},
+        }
+
+    async def warmup(self) -> None:
+        # Open (and keep alive) a connection to the upstream so the first
+        # generate does not pay for DNS + TLS.
+        import httpx
+        try:
+            await self.http_client().head(settings.github_endpoint, timeout=settings.http_connect_timeout)
+        except httpx.HTTPError as e:
+            log.warning("upstream warm-up failed: %r", e)
+
+    async def startup(self) -> None:
+        # The http client (and httpx) is created with the first provider
+        # that needs it, unless the upstream connection is warmed up now.
+        if settings.http_warmup:
+            await self.warmup()
+
+    async def shutdown(self) -> None:
+        self._providers.clear()
+        self._chain = None
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+registry = ProviderRegistry()
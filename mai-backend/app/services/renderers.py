@@ -0,0 +1,267 @@
+import zlib
+from collections import defaultdict
+from functools import lru_cache
+from io import BytesIO
+from typing import Dict, Iterator, List, Literal
+
+from app.schemas import GenerateResponse, RequirementItem
+
+ExportFormat = Literal["pdf", "docx", "md"]
+
+# Bump whenever rendered output changes, so cached exports are not reused.
+RENDERER_VERSION = "2"
+
+
+def group_by_category(doc: GenerateResponse) -> Dict[str, List[RequirementItem]]:
+    """Requirements per category in one pass, keeping document order."""
+    groups: Dict[str, List[RequirementItem]] = defaultdict(list)
+    for r in doc.requirements:
+        groups[r.category].append(r)
+    return groups
+
+
+def iter_md(doc: GenerateResponse, chunk_size: int = 64 * 1024) -> Iterator[str]:
+    """Markdown in ~``chunk_size`` pieces; memory stays flat however long the document."""
+    groups = group_by_category(doc)
+    buf: List[str] = []
+    size = 0
+
+    def emit(line: str):
+        nonlocal size
+        buf.append(line)
+        buf.append("\n")
+        size += len(line) + 1
+
+    emit(f"# {doc.project_name}")
+    emit("")
+    emit(doc.summary)
+    emit("")
+    for cat in doc.categories:
+        emit(f"## {cat}")
+        for r in groups.get(cat, ()):
+            emit(f"- **{r.priority}** {r.text}")
+            if r.acceptance_criteria:
+                for ac in r.acceptance_criteria:
+                    emit(f"  - [ ] {ac}")
+            if r.rationale:
+                emit(f"  - _Rationale_: {r.rationale}")
+            if r.standard_refs:
+                emit(f"  - _Standards_: {', '.join(r.standard_refs)}")
+            if size >= chunk_size:
+                yield "".join(buf)
+                buf.clear()
+                size = 0
+        emit("")
+    if buf:
+        yield "".join(buf)
+
+
+def render_md(doc: GenerateResponse) -> str:
+    return "".join(iter_md(doc))
+
+
+def render_docx(doc: GenerateResponse) -> bytes:
+    # python-docx is imported on first use: it is slow to import and most
+    # workers never render a .docx.
+    from docx import Document
+    from docx.shared import Pt
+
+    groups = group_by_category(doc)
+    d = Document()
+    d.add_heading(doc.project_name, 0)
+    p = d.add_paragraph(doc.summary)
+    p.style.font.size = Pt(11)
+
+    for cat in doc.categories:
+        d.add_heading(cat, level=2)
+        for r in groups.get(cat, ()):
+            p = d.add_paragraph()
+            run = p.add_run(f"{r.priority} — {r.text}")
+            run.bold = True
+            if r.acceptance_criteria:
+                for ac in r.acceptance_criteria:
+                    d.add_paragraph(ac, style="List Bullet")
+            if r.rationale:
+                d.add_paragraph(f"Rationale: {r.rationale}")
+            if r.standard_refs:
+                d.add_paragraph(f"Standards: {', '.join(r.standard_refs)}")
+
+    bio = BytesIO()
+    d.save(bio)
+    return bio.getvalue()
+
+
+# ---- PDF: a small streaming writer (one page at a time, Helvetica/WinAnsi)
+
+# Same arithmetic as reportlab.lib.units / pagesizes, without importing them.
+_CM = 72.0 / 2.54
+_MM = _CM * 0.1
+_PAGE_W, _PAGE_H = 210 * _MM, 297 * _MM  # A4
+_MARGIN = 2 * _CM
+_TEXT_W = _PAGE_W - 2 * _MARGIN
+_FONTS = {"F1": "Helvetica", "F2": "Helvetica-Bold"}
+
+
+@lru_cache(maxsize=None)
+def _widths(font: str) -> List[int]:
+    from reportlab.pdfbase import pdfmetrics  # only the AFM width tables are used
+    return pdfmetrics.getFont(font).widths
+
+
+def preload() -> None:
+    """Import the document libraries and load font metrics ahead of the first export."""
+    import docx  # noqa: F401
+    for font in _FONTS.values():
+        _widths(font)
+
+
+def _encode(text: str) -> bytes:
+    return text.encode("cp1252", errors="replace")
+
+
+@lru_cache(maxsize=8192)
+def _word_width(word: str, font: str) -> float:
+    """Width of ``word`` at 1pt, from the font's cached AFM width table."""
+    w = _widths(font)
+    return sum(w[b] for b in _encode(word)) / 1000.0
+
+
+def wrap_text(text: str, font: str, size: float, width: float) -> List[str]:
+    """Greedy word wrap to ``width`` points; over-long words are split."""
+    limit = width / size
+    space = _word_width(" ", font)
+    lines: List[str] = []
+    for para in text.splitlines() or [""]:
+        line, line_w = "", 0.0
+        for word in para.split(" "):
+            ww = _word_width(word, font)
+            if line and line_w + space + ww <= limit:
+                line, line_w = f"{line} {word}", line_w + space + ww
+                continue
+            if line:
+                lines.append(line)
+            while ww > limit and len(word) > 1:
+                cut = len(word) - 1
+                while cut > 1 and _word_width(word[:cut], font) > limit:
+                    cut -= 1
+                lines.append(word[:cut])
+                word = word[cut:]
+                ww = _word_width(word, font)
+            line, line_w = word, ww
+        lines.append(line)
+    return lines
+
+
+def _pdf_str(text: str) -> bytes:
+    return b"(" + _encode(text).replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def iter_pdf(doc: GenerateResponse) -> Iterator[bytes]:
+    """
+    Yield a PDF one page at a time. Only the current page's content and the
+    object offsets are kept, so memory does not grow with the document; text
+    is wrapped to the page width instead of being cut off.
+    """
+    groups = group_by_category(doc)
+    offsets: List[int] = []   # byte offset of object n+1
+    page_ids: List[int] = []
+    pos = 0
+
+    def obj(body: bytes) -> bytes:
+        nonlocal pos
+        offsets.append(pos)
+        out = b"%d 0 obj\n" % len(offsets) + body + b"\nendobj\n"
+        pos += len(out)
+        return out
+
+    head = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+    pos = len(head)
+    yield head
+    # 1: catalog, 2: page tree (written last, once the kids are known), 3-4: fonts
+    yield obj(b"<< /Type /Catalog /Pages 2 0 R >>")
+    offsets.append(0)
+    for name in _FONTS.values():
+        yield obj(b"<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>" % name.encode())
+
+    ops: List[bytes] = []
+    y = _PAGE_H - _MARGIN
+
+    def flush_page() -> bytes:
+        nonlocal y
+        content = zlib.compress(b"\n".join(ops))
+        ops.clear()
+        y = _PAGE_H - _MARGIN
+        out = obj(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(content) + content + b"\nendstream")
+        page_ids.append(len(offsets) + 1)
+        out += obj(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] "
+            b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>"
+            % (_PAGE_W, _PAGE_H, len(offsets))
+        )
+        return out
+
+    def draw(text: str, font: str = "F1", size: float = 10, leading: float = 14, hang: float = 0):
+        # ``hang`` indents continuation lines (bullets)
+        nonlocal y
+        for i, line in enumerate(wrap_text(text, _FONTS[font], size, _TEXT_W - hang)):
+            if y < _MARGIN:
+                yield flush_page()
+            x = _MARGIN + (hang if i else 0)
+            ops.append(b"BT /%s %g Tf %.2f %.2f Td %s Tj ET" % (font.encode(), size, x, y, _pdf_str(line)))
+            y -= leading
+
+    yield from draw(doc.project_name, "F2", 16, leading=22)
+    yield from draw(doc.summary)
+    for cat in doc.categories:
+        y -= 6
+        yield from draw(cat, "F2", 11)
+        for r in groups.get(cat, ()):
+            yield from draw(f"{r.priority} — {r.text}")
+            for ac in r.acceptance_criteria or []:
+                yield from draw(f"• {ac}", hang=10)
+            if r.rationale:
+                yield from draw(f"Rationale: {r.rationale}")
+            if r.standard_refs:
+                yield from draw(f"Standards: {', '.join(r.standard_refs)}")
+    if ops or not page_ids:
+        yield flush_page()
+
+    # page tree, then the cross-reference table
+    kids = b" ".join(b"%d 0 R" % i for i in page_ids)
+    body = b"2 0 obj\n<< /Type /Pages /Kids [" + kids + b"] /Count %d >>\nendobj\n" % len(page_ids)
+    offsets[1] = pos
+    pos += len(body)
+    yield body
+    xref = [b"xref\n0 %d\n0000000000 65535 f \n" % (len(offsets) + 1)]
+    xref.extend(b"%010d 00000 n \n" % off for off in offsets)
+    xref.append(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(offsets) + 1, pos))
+    yield b"".join(xref)
+
+
+def render_pdf(doc: GenerateResponse) -> bytes:
+    return b"".join(iter_pdf(doc))
+
+
+def render_to_file(fmt: ExportFormat, doc: GenerateResponse, path: str) -> None:
+    """Streaming counterpart of ``render`` for export workers: chunks are flushed to ``path`` as they come."""
+    if fmt == "md":
+        chunks: Iterator[bytes] = (c.encode("utf-8") for c in iter_md(doc))
+    elif fmt == "pdf":
+        chunks = iter_pdf(doc)
+    else:
+        raise ValueError(f"Unsupported streaming format: {fmt}")
+    with open(path, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+            f.flush()
+
+
+def render(fmt: ExportFormat, doc: GenerateResponse) -> bytes:
+    """Entry point for export workers: one format in, bytes out."""
+    if fmt == "md":
+        return render_md(doc).encode("utf-8")
+    if fmt == "docx":
+        return render_docx(doc)
+    if fmt == "pdf":
+        return render_pdf(doc)
+    raise ValueError(f"Unsupported format: {fmt}")
@@ -0,0 +1,91 @@
+from datetime import datetime
+from typing import Any, Dict, List
+
+from pydantic import ValidationError
+
+from app.schemas import GenerateResponse, RequirementItem, RevisionRequest
+from app.services import prompts
+from app.services.admission import admission
+from app.services.ai_provider import get_provider
+from app.services.tracing import span, stage
+
+
+def _usable(raw: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The model's requirements that validate; the rest are dropped."""
+    items = []
+    for r in raw.get("requirements") or []:
+        try:
+            items.append(RequirementItem.model_validate(r).model_dump(mode="json"))
+        except ValidationError:
+            continue
+    return items
+
+
+def merge_revision(doc: Dict[str, Any], body: RevisionRequest, new: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Put ``new`` requirements back into ``doc`` without reordering the rest:
+    by index they replace their originals in place (keeping the category);
+    a regenerated category takes the place of its first old requirement;
+    extensions go after the last requirement of their category. Anything the
+    model did not return is left as it was.
+    """
+    old = doc["requirements"]
+    if body.indexes:
+        out = list(old)
+        for i, item in zip(body.indexes, new):
+            out[i] = {**item, "category": old[i]["category"]}
+    else:
+        fresh = {c: [r for r in new if r["category"] == c] for c in body.categories}
+        if body.mode == "extend":
+            out = list(old)
+            for c, items in fresh.items():
+                last = max((i for i, r in enumerate(out) if r["category"] == c), default=len(out) - 1)
+                out[last + 1:last + 1] = items
+        else:
+            out, placed = [], set()
+            for r in old:
+                c = r["category"]
+                if not fresh.get(c):
+                    out.append(r)
+                elif c not in placed:
+                    out.extend(fresh[c])
+                    placed.add(c)
+            for c, items in fresh.items():
+                if c not in placed:
+                    out.extend(items)
+    categories = list(doc["categories"])
+    for r in out:
+        if r["category"] not in categories:
+            categories.append(r["category"])
+    return {**doc, "categories": categories, "requirements": out, "generated_at": datetime.utcnow().isoformat() + "Z"}
+
+
+async def run_revision(body: RevisionRequest) -> Dict[str, Any]:
+    """
+    Regenerate, refine or extend part of a document. Only the brief and the
+    selected requirements go to the model, and only they are asked for, so
+    the call is a fraction of a full generation.
+    """
+    provider = get_provider()
+    label = getattr(provider, "name", type(provider).__name__)
+    doc = body.document.model_dump(mode="json")
+    if body.indexes:
+        items = [doc["requirements"][i] for i in body.indexes]
+        categories = list(dict.fromkeys(r["category"] for r in items))
+    else:
+        categories = body.categories
+        items = [r for r in doc["requirements"] if r["category"] in categories]
+    rev = prompts.revision(
+        body.brief, body.mode, categories, items,
+        each=bool(body.indexes), count=body.count, instructions=body.instructions,
+    )
+    async with admission.slot():
+        with span("revise", provider=label, mode=body.mode, items=len(items)):
+            raw = await provider.generate(body.brief, rev=rev)
+    with stage("response_validation", label):
+        new = _usable(raw)
+        if not body.indexes:
+            new = [r for r in new if r["category"] in categories]
+        if not new:
+            raise RuntimeError("Model returned no usable requirements for the revision")
+        return GenerateResponse.model_validate(merge_revision(doc, body, new)).model_dump(mode="json")
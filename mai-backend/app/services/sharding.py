@@ -0,0 +1,76 @@
+import asyncio
+from datetime import datetime
+from typing import Any, Dict, List, Sequence
+
+from app.config import settings
+from app.schemas import CATEGORIES, GenerateRequest
+from app.services.deadline import ClientDisconnected, DeadlineExceeded
+from app.services.ratelimit import UpstreamUnavailable
+from app.services.tracing import span
+
+
+def shard_groups(spec: Sequence[str] | None = None) -> List[List[str]]:
+    """
+    Parse ``settings.shard_groups`` ("Safety,Compliance" per entry) into
+    category groups. Unknown names are dropped; any category not mentioned
+    gets its own shard so the merged document always covers all seven.
+    """
+    groups: List[List[str]] = []
+    seen = set()
+    for entry in spec if spec is not None else settings.shard_groups:
+        group = [c.strip() for c in entry.split(",") if c.strip() in CATEGORIES and c.strip() not in seen]
+        seen.update(group)
+        if group:
+            groups.append(group)
+    groups.extend([c] for c in CATEGORIES if c not in seen)
+    return groups
+
+
+def merge_shards(req: GenerateRequest, groups: List[List[str]], parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Stitch per-shard documents together in group order, keeping each shard to its own categories."""
+    summary = next((p["summary"] for p in parts if p.get("summary")), "")
+    categories: List[str] = []
+    requirements: List[Dict[str, Any]] = []
+    for group, part in zip(groups, parts):
+        for r in part.get("requirements") or []:
+            if r.get("category") in group:
+                requirements.append(r)
+                if r["category"] not in categories:
+                    categories.append(r["category"])
+    return {
+        "project_name": req.projectName,
+        "summary": summary,
+        "categories": categories,
+        "requirements": requirements,
+        "generated_at": datetime.utcnow().isoformat() + "Z",
+    }
+
+
+async def generate_sharded(provider, req: GenerateRequest) -> Dict[str, Any]:
+    """
+    One smaller completion per category group, at most
+    ``settings.shard_concurrency`` at a time, merged into one document.
+    Latency tracks the slowest shard instead of the whole document.
+    """
+    if not getattr(provider, "supports_categories", False):
+        return await provider.generate(req)
+
+    groups = shard_groups()
+    sem = asyncio.Semaphore(max(1, settings.shard_concurrency))
+
+    async def one(group: List[str]) -> Dict[str, Any]:
+        async with sem:
+            with span("shard", categories=",".join(group)):
+                return await provider.generate(req, categories=group)
+
+    results = await asyncio.gather(*(one(g) for g in groups), return_exceptions=True)
+    failed = [(g, r) for g, r in zip(groups, results) if isinstance(r, BaseException)]
+    if failed:
+        # Quota/breaker refusals and deadline/disconnect keep their type so
+        # callers can answer 503 + Retry-After or 504.
+        for _, r in failed:
+            if isinstance(r, (UpstreamUnavailable, DeadlineExceeded, ClientDisconnected)):
+                raise r
+        names = "; ".join(f"{'/'.join(g)}: {r}" for g, r in failed)
+        raise RuntimeError(f"{len(failed)} of {len(groups)} shards failed: {names}")
+    return merge_shards(req, groups, results)
@@ -0,0 +1,137 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional, Tuple
+
+import orjson
+
+from app.config import settings
+
+# How long a finished result stays readable for workers still polling for it.
+_RESULT_KEEP_SECONDS = 5.0
+
+
+def worker_count() -> int:
+    return settings.workers if settings.workers > 0 else (os.cpu_count() or 1)
+
+
+def enabled() -> bool:
+    """True when several worker processes must coordinate through the store."""
+    return worker_count() > 1
+
+
+class SharedStore:
+    """
+    Coordination state for all worker processes on one host, in one SQLite
+    file (WAL, so readers never block and writes are short): upstream rate
+    buckets, back-off deadlines and single-flight leases. Every method is one
+    short ``BEGIN IMMEDIATE`` transaction, so read-modify-write is atomic
+    across processes.
+    """
+
+    def __init__(self) -> None:
+        self._db: Optional[sqlite3.Connection] = None
+        self._path = ""
+        self._lock = threading.Lock()
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None or self._path != settings.shared_state_path:
+            if self._db is not None:
+                self._db.close()
+            d = os.path.dirname(settings.shared_state_path)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            self._path = settings.shared_state_path
+            self._db = sqlite3.connect(self._path, check_same_thread=False, timeout=10, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+            self._db.execute("CREATE TABLE IF NOT EXISTS blocks (name TEXT PRIMARY KEY, until REAL NOT NULL)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS flights (key TEXT PRIMARY KEY, owner TEXT, expires REAL NOT NULL, result BLOB)"
+            )
+        return self._db
+
+    @contextmanager
+    def _tx(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            db = self._conn()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    # ---- token buckets (see ratelimit.TokenBucket for the semantics)
+
+    def reserve(self, name: str, rate: float, capacity: float, n: float) -> float:
+        now = time.time()
+        with self._tx() as db:
+            row = db.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+            tokens -= n
+            db.execute("INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)", (name, tokens, now))
+        return 0.0 if tokens >= 0 else -tokens / rate
+
+    def refund(self, name: str, capacity: float, n: float) -> None:
+        with self._tx() as db:
+            db.execute("UPDATE buckets SET tokens = min(?, tokens + ?) WHERE name = ?", (capacity, n, name))
+
+    def block(self, name: str, seconds: float) -> None:
+        until = time.time() + seconds
+        with self._tx() as db:
+            db.execute(
+                "INSERT INTO blocks (name, until) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET until = max(until, excluded.until)",
+                (name, until),
+            )
+
+    def blocked_for(self, name: str) -> float:
+        with self._lock:
+            row = self._conn().execute("SELECT until FROM blocks WHERE name = ?", (name,)).fetchone()
+        return max(0.0, row[0] - time.time()) if row else 0.0
+
+    # ---- single-flight leases
+
+    def flight_acquire(self, key: str, owner: str, ttl: float) -> Tuple[str, Any]:
+        """``("lead", None)``, ``("follow", None)`` or ``("done", result)``."""
+        now = time.time()
+        with self._tx() as db:
+            db.execute("DELETE FROM flights WHERE expires < ?", (now,))
+            row = db.execute("SELECT owner, result FROM flights WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                db.execute("INSERT INTO flights (key, owner, expires) VALUES (?, ?, ?)", (key, owner, now + ttl))
+                return "lead", None
+        if row[1] is not None:
+            return "done", orjson.loads(row[1])
+        return "follow", None
+
+    def flight_renew(self, key: str, owner: str, ttl: float) -> None:
+        with self._tx() as db:
+            db.execute("UPDATE flights SET expires = ? WHERE key = ? AND owner = ?", (time.time() + ttl, key, owner))
+
+    def flight_finish(self, key: str, owner: str, result: Any = None) -> None:
+        """Publish ``result`` to waiting workers, or (``None``) give the lease up so one of them retries."""
+        with self._tx() as db:
+            if result is None:
+                db.execute("DELETE FROM flights WHERE key = ? AND owner = ?", (key, owner))
+            else:
+                db.execute(
+                    "UPDATE flights SET owner = NULL, result = ?, expires = ? WHERE key = ? AND owner = ?",
+                    (orjson.dumps(result), time.time() + _RESULT_KEEP_SECONDS, key, owner),
+                )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+shared_store = SharedStore()
@@ -0,0 +1,119 @@
+import asyncio
+import os
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Tuple, Union
+
+from app.config import settings
+from app.services import deadline
+from app.services.deadline import DeadlineExceeded
+from app.services.shared_state import shared_store
+
+
+Keep = Union[bool, Callable[[asyncio.Task], bool]]
+
+
+class _Call:
+    __slots__ = ("task", "waiters", "keep")
+
+    def __init__(self, task: asyncio.Task) -> None:
+        self.task, self.waiters = task, 0
+        self.keep: List[Keep] = []
+
+    def kept(self) -> bool:
+        return any(k(self.task) if callable(k) else k for k in self.keep)
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls with the same key into one.
+
+    The first caller starts ``fn``; callers arriving while it runs await the
+    same task and get the same result or exception. A caller that gets
+    cancelled does not cancel the shared call for the others. Once every
+    caller has gone, the call is cancelled too unless one of them passed
+    ``keep=True`` (its result is stored somewhere and still worth having), or
+    a ``keep`` predicate that says yes for the task at that moment.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[str, _Call] = {}
+
+    def _forget(self, key: str, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.task.cancelled():
+            call.task.exception()  # mark retrieved even if every waiter went away
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]], keep: Keep = True) -> Tuple[Any, bool]:
+        """Return ``(result, shared)``; ``shared`` is True for coalesced callers."""
+        call = self._calls.get(key)
+        shared = call is not None
+        if call is None:
+            call = self._calls[key] = _Call(asyncio.ensure_future(fn()))
+            call.task.add_done_callback(lambda t: self._forget(key, call))
+        call.waiters += 1
+        call.keep.append(keep)
+        try:
+            return await asyncio.shield(call.task), shared
+        finally:
+            call.waiters -= 1
+            if not call.waiters and not call.task.done() and not call.kept():
+                call.task.cancel()
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+
+class SharedFlight:
+    """
+    Single-flight across worker processes. A lease row in the shared store
+    marks the worker generating ``key``; the others poll for its result
+    instead of calling upstream as well. The leader renews the lease while it
+    works. If it fails (or dies and the lease expires) the next poller takes
+    over.
+    """
+
+    def __init__(self) -> None:
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    async def _renew(self, key: str) -> None:
+        while True:
+            await asyncio.sleep(settings.shared_lease_seconds / 3)
+            await asyncio.to_thread(shared_store.flight_renew, key, self.owner, settings.shared_lease_seconds)
+
+    async def _lead(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        renew = asyncio.ensure_future(self._renew(key))
+        try:
+            result = await fn()
+        except BaseException:
+            # synchronous on purpose: also runs when this task is being cancelled
+            shared_store.flight_finish(key, self.owner)
+            raise
+        finally:
+            renew.cancel()
+        await asyncio.to_thread(shared_store.flight_finish, key, self.owner, result)
+        return result
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Like ``SingleFlight.do``; ``fn`` must return something JSON-serialisable.
+        A follower stops waiting (``DeadlineExceeded``) when its request deadline passes.
+        """
+        delay = 0.05
+        while True:
+            state, result = await asyncio.to_thread(
+                shared_store.flight_acquire, key, self.owner, settings.shared_lease_seconds
+            )
+            if state == "lead":
+                return await self._lead(key, fn), False
+            if state == "done":
+                return result, True
+            left = deadline.remaining()
+            if left is not None and left <= 0:
+                raise DeadlineExceeded("Request deadline exceeded waiting for another worker's generation")
+            await asyncio.sleep(delay if left is None else min(delay, left))
+            delay = min(delay * 2, 1.0)
+
+
+inflight = SingleFlight()
+shared_flight = SharedFlight()
@@ -0,0 +1,164 @@
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+from pydantic import ValidationError
+
+from app.schemas import GenerateRequest, RequirementItem
+from app.services.admission import admission
+
+Event = Tuple[str, Dict[str, Any]]
+
+
+class RequirementStreamParser:
+    """
+    Incremental scanner for a streamed ``GenerateResponse`` JSON document.
+
+    Feed it raw text deltas; it returns ``("field", {"name", "value"})`` as soon
+    as a top-level value closes and ``("requirement", {...})`` for every object
+    that closes inside the top-level ``requirements`` array. Anything before
+    the first ``{`` (fences, prose) is ignored.
+    """
+
+    def __init__(self) -> None:
+        self._buf = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self._key: str | None = None
+        self._key_start: int | None = None
+        self._value_start: int | None = None
+        self._item_start: int | None = None
+        self.done = False
+
+    def _close_value(self, end: int, out: List[Event]) -> None:
+        key, start = self._key, self._value_start
+        self._key = self._value_start = None
+        if key == "requirements" or start is None:
+            return
+        try:
+            value = json.loads(self._buf[start:end])
+        except ValueError:
+            return
+        out.append(("field", {"name": key, "value": value}))
+
+    def feed(self, chunk: str) -> List[Event]:
+        out: List[Event] = []
+        if self.done:
+            return out
+        self._buf += chunk
+        s = self._buf
+        i = self._pos
+        while i < len(s):
+            ch = s[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif ch == "\\":
+                    self._esc = True
+                elif ch == '"':
+                    self._in_str = False
+                    if self._depth == 1:
+                        if self._key_start is not None:
+                            try:
+                                self._key = json.loads(s[self._key_start:i + 1])
+                            except ValueError:
+                                self._key = ""
+                            self._key_start = None
+                        elif self._value_start is not None:
+                            self._close_value(i + 1, out)
+            elif self._depth == 0:
+                if ch == "{":
+                    self._depth = 1
+            elif ch == '"':
+                self._in_str = True
+                if self._depth == 1:
+                    if self._key is None:
+                        self._key_start = i
+                    elif self._value_start is None:
+                        self._value_start = i
+            elif ch in "{[":
+                if self._depth == 1 and self._key is not None and self._value_start is None:
+                    self._value_start = i
+                self._depth += 1
+                if ch == "{" and self._depth == 3 and self._key == "requirements":
+                    self._item_start = i
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 2 and self._item_start is not None:
+                    try:
+                        item = json.loads(s[self._item_start:i + 1])
+                    except ValueError:
+                        item = None
+                    self._item_start = None
+                    if isinstance(item, dict):
+                        out.append(("requirement", item))
+                elif self._depth == 1 and self._value_start is not None:
+                    self._close_value(i + 1, out)
+                elif self._depth == 0:
+                    if self._value_start is not None:
+                        self._close_value(i, out)
+                    self.done = True
+                    self._pos = i + 1
+                    return out
+            elif self._depth == 1:
+                if ch == ",":
+                    if self._value_start is not None:
+                        self._close_value(i, out)
+                    self._key = None
+                elif ch != ":" and not ch.isspace() and self._key is not None and self._value_start is None:
+                    self._value_start = i
+            i += 1
+        self._pos = i
+        return out
+
+
+async def _text_of(obj: Dict[str, Any]) -> AsyncIterator[str]:
+    yield json.dumps(obj, ensure_ascii=False)
+
+
+async def requirement_events(provider, req: GenerateRequest) -> AsyncIterator[Event]:
+    """
+    Turn a provider's token stream into validated document events:
+    ``meta``, ``summary``, ``categories``, ``requirement``, then ``done``.
+    Providers without ``stream`` fall back to a single ``generate`` call.
+    """
+    yield "meta", {"project_name": req.projectName}
+
+    parser = RequirementStreamParser()
+    categories_sent = False
+    seen_categories: List[str] = []
+    count = skipped = 0
+    async with admission.slot():
+        if hasattr(provider, "stream"):
+            chunks = provider.stream(req)
+        else:
+            chunks = _text_of(await provider.generate(req))
+
+        async for chunk in chunks:
+            for kind, data in parser.feed(chunk):
+                if kind == "requirement":
+                    try:
+                        item = RequirementItem.model_validate(data)
+                    except ValidationError:
+                        skipped += 1
+                        continue
+                    if item.category not in seen_categories:
+                        seen_categories.append(item.category)
+                    yield "requirement", {"index": count, **item.model_dump()}
+                    count += 1
+                elif data["name"] == "summary" and isinstance(data["value"], str):
+                    yield "summary", {"summary": data["value"]}
+                elif data["name"] == "categories" and isinstance(data["value"], list):
+                    categories_sent = True
+                    yield "categories", {"categories": [str(c) for c in data["value"]]}
+
+    if not categories_sent and seen_categories:
+        yield "categories", {"categories": sorted(seen_categories)}
+    yield "done", {
+        "count": count,
+        "skipped": skipped,
+        "complete": parser.done,
+        "generated_at": datetime.utcnow().isoformat() + "Z",
+    }
@@ -0,0 +1,79 @@
+import copy
+from functools import lru_cache
+from typing import Any, Dict
+
+from app.schemas import GenerateResponse
+
+SCHEMA_NAME = "requirements_document"
+
+# Set by the server after generation, never asked from the model.
+_SERVER_FIELDS = ("generated_at",)
+_DROP_KEYS = ("title", "default", "format", "description")
+
+
+def _inline(node: Any, defs: Dict[str, Any], props: bool = False) -> Any:
+    # ``props`` marks a ``properties`` mapping, whose keys are field names.
+    if isinstance(node, dict):
+        if "$ref" in node and not props:
+            return _inline(copy.deepcopy(defs[node["$ref"].rsplit("/", 1)[-1]]), defs)
+        return {
+            k: _inline(v, defs, k == "properties" and not props)
+            for k, v in node.items()
+            if props or (k not in _DROP_KEYS and k != "$defs")
+        }
+    if isinstance(node, list):
+        return [_inline(v, defs) for v in node]
+    return node
+
+
+def _strict(node: Any) -> Any:
+    # Strict structured output: every object closed and every property required
+    # (optional fields stay nullable through their anyOf/null branch).
+    if isinstance(node, dict):
+        node = {k: _strict(v) for k, v in node.items()}
+        if node.get("type") == "object" and "properties" in node:
+            node["required"] = list(node["properties"])
+            node["additionalProperties"] = False
+        return node
+    if isinstance(node, list):
+        return [_strict(v) for v in node]
+    return node
+
+
+@lru_cache(maxsize=1)
+def response_json_schema() -> Dict[str, Any]:
+    """JSON Schema of the model's output, derived from ``GenerateResponse``."""
+    raw = GenerateResponse.model_json_schema()
+    schema = _inline(raw, raw.get("$defs", {}))
+    for f in _SERVER_FIELDS:
+        schema["properties"].pop(f, None)
+    return _strict(schema)
+
+
+def openai_response_format() -> Dict[str, Any]:
+    """``response_format`` for OpenAI-compatible chat completions."""
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": SCHEMA_NAME, "strict": True, "schema": response_json_schema()},
+    }
+
+
+def _to_openapi(node: Any) -> Any:
+    # Gemini's responseSchema is an OpenAPI subset: no additionalProperties and
+    # optional values are spelled ``nullable`` instead of anyOf [..., null].
+    if isinstance(node, list):
+        return [_to_openapi(v) for v in node]
+    if not isinstance(node, dict):
+        return node
+    branches = node.get("anyOf")
+    if branches and any(b.get("type") == "null" for b in branches):
+        rest = [b for b in branches if b.get("type") != "null"]
+        out = _to_openapi(rest[0]) if len(rest) == 1 else {"anyOf": _to_openapi(rest)}
+        out["nullable"] = True
+        return out
+    return {k: _to_openapi(v) for k, v in node.items() if k != "additionalProperties"}
+
+
+@lru_cache(maxsize=1)
+def gemini_response_schema() -> Dict[str, Any]:
+    return _to_openapi(response_json_schema())
@@ -0,0 +1,172 @@
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+import orjson
+
+from app.config import settings
+from app.services.metrics import STAGE_SECONDS
+
+_REQUEST_ID = re.compile(r"^[\w.:-]{1,128}$")
+
+
+class Trace:
+    """Spans recorded for one request; written to the JSONL sink when it ends."""
+
+    def __init__(self, request_id: str) -> None:
+        self.request_id = request_id
+        self.started = time.perf_counter()
+        self.wall = time.time()
+        self.spans: List[Dict[str, Any]] = []
+        self.dropped = 0
+        self._next_id = 0
+
+    def open(self, name: str, parent: Optional[int], attrs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if len(self.spans) >= settings.trace_max_spans:
+            self.dropped += 1
+            return None
+        self._next_id += 1
+        span = {
+            "id": self._next_id,
+            "parent": parent,
+            "name": name,
+            "start_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            "attrs": attrs,
+        }
+        self.spans.append(span)
+        return span
+
+    def record(self, **fields: Any) -> Dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "time": self.wall,
+            "duration_ms": round((time.perf_counter() - self.started) * 1000, 3),
+            **fields,
+            "spans": self.spans,
+            "dropped_spans": self.dropped,
+        }
+
+
+_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+_parent: ContextVar[Optional[int]] = ContextVar("trace_parent", default=None)
+
+
+def current_request_id() -> Optional[str]:
+    t = _trace.get()
+    return t.request_id if t is not None else None
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Optional[Dict[str, Any]]]:
+    """
+    Child span of whatever span is current. Free when the request is not
+    traced. Tasks and ``to_thread`` calls started inside inherit it as parent.
+    """
+    trace = _trace.get()
+    s = trace.open(name, _parent.get(), attrs) if trace is not None else None
+    if s is None:
+        yield None
+        return
+    token = _parent.set(s["id"])
+    start = time.perf_counter()
+    try:
+        yield s
+    except BaseException as e:
+        s["error"] = type(e).__name__
+        raise
+    finally:
+        s["duration_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        _parent.reset(token)
+
+
+@contextmanager
+def stage(name: str, provider: str = "") -> Iterator[None]:
+    """A pipeline stage: ``mai_stage_seconds`` observation plus a trace span."""
+    with STAGE_SECONDS.time(stage=name, provider=provider), span(name, **({"provider": provider} if provider else {})):
+        yield
+
+
+class TraceSink:
+    """Append-only JSONL file, rotated to ``<path>.1`` past ``trace_max_bytes``."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        path = settings.trace_path
+        if not path:
+            return
+        line = orjson.dumps(record) + b"\n"
+        with self._lock:
+            d = os.path.dirname(path)
+            if d:
+                os.makedirs(d, exist_ok=True)
+            try:
+                if os.path.getsize(path) + len(line) > settings.trace_max_bytes:
+                    os.replace(path, path + ".1")
+            except FileNotFoundError:
+                pass
+            with open(path, "ab") as f:
+                f.write(line)
+
+
+trace_sink = TraceSink()
+
+
+class TraceMiddleware:
+    """
+    Pure ASGI middleware (so streamed bodies stay inside the trace): gives every
+    HTTP request an ``X-Request-ID`` (the client's, if sane) and, for sampled
+    requests, records the span tree and writes it once the response is done.
+    """
+
+    SKIP = ("/api/health", "/api/metrics", "/api/debug/profile")
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        incoming = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")
+        request_id = incoming if _REQUEST_ID.match(incoming) else uuid.uuid4().hex
+        path = scope.get("path", "")
+        traced = (
+            settings.trace_enabled
+            and not path.startswith(self.SKIP)
+            and random.random() < settings.trace_sample_rate
+        )
+        trace = Trace(request_id) if traced else None
+        token = _trace.set(trace)
+        status = {"code": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", request_id.encode())]
+            await send(message)
+
+        try:
+            # the app returns only once a streamed body has been fully sent
+            with span("request", method=scope.get("method"), path=path):
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            _trace.reset(token)
+            if trace is not None:
+                await _flush(trace, scope, status["code"])
+
+
+async def _flush(trace: Trace, scope, status: int) -> None:
+    record = trace.record(method=scope.get("method"), path=scope.get("path"), status=status)
+    try:
+        await asyncio.to_thread(trace_sink.write, record)
+    except OSError:
+        pass
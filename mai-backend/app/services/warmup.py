@@ -0,0 +1,34 @@
+"""
+Optional start-up warm-up (``settings.warmup``). Export libraries and
+provider SDKs are imported on first use to keep start-up fast and workers
+small; this loads them in the background right after start-up instead, so
+the first real request does not pay for it.
+"""
+import asyncio
+import importlib
+import logging
+import time
+
+from app.config import settings
+from app.services.export_engine import export_engine
+from app.services.registry import registry
+
+log = logging.getLogger(__name__)
+
+
+async def warm_up() -> None:
+    started = time.perf_counter()
+    # Exports render in the pool processes, so that is where the document
+    # libraries have to be loaded (in this process only with export_workers=0).
+    await export_engine.warm()
+    # Imports are CPU-bound and hold the GIL, but off the loop the server
+    # still answers health checks in between.
+    for module in registry.modules():
+        await asyncio.to_thread(importlib.import_module, module)
+    try:
+        registry.get()
+    except RuntimeError as e:  # e.g. token not configured: the first request will say so
+        log.warning("provider warm-up failed: %s", e)
+    if settings.http_warmup:
+        await registry.warmup()
+    log.info("warm-up done in %.2fs", time.perf_counter() - started)
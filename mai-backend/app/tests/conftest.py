@@ -0,0 +1,12 @@
+import pytest
+from app.config import settings
+
+@pytest.fixture(autouse=True)
+def _isolated_state(tmp_path, monkeypatch):
+    # keep on-disk caches/queues out of the working tree
+    monkeypatch.setattr(settings, "cache_db_path", str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(settings, "export_cache_dir", str(tmp_path / "exports"))
+    monkeypatch.setattr(settings, "job_db_path", str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(settings, "trace_path", str(tmp_path / "traces.jsonl"))
+    monkeypatch.setattr(settings, "library_db_path", str(tmp_path / "library.sqlite3"))
+    monkeypatch.setattr(settings, "shared_state_path", str(tmp_path / "shared.sqlite3"))
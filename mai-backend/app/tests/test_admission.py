@@ -0,0 +1,124 @@
+import asyncio
+import pytest
+from app.config import settings
+from app.services import admission, deadline
+from app.services.admission import BATCH, INTERACTIVE, AdmissionController, AdmissionRejected
+
+async def _hold(gate, who, priority, order, release):
+    with admission.client(who, priority):
+        async with gate.slot():
+            order.append(who)
+            await release.wait()
+
+def test_clients_share_slots_round_robin(monkeypatch):
+    monkeypatch.setattr(settings, "admission_concurrency", 1)
+
+    async def main():
+        gate, order, hold, go = AdmissionController(), [], asyncio.Event(), asyncio.Event()
+        go.set()
+        first = asyncio.ensure_future(_hold(gate, "a", INTERACTIVE, order, hold))
+        await asyncio.sleep(0)
+        # a busy client queues three more, then a second client arrives
+        rest = [asyncio.ensure_future(_hold(gate, w, INTERACTIVE, order, go)) for w in ("a", "a", "a", "b")]
+        await asyncio.sleep(0)
+        assert gate.queued[INTERACTIVE] == 4
+        hold.set()
+        await asyncio.gather(first, *rest)
+        return order, gate
+
+    order, gate = asyncio.run(main())
+    assert order == ["a", "a", "b", "a", "a"]
+    assert gate.stats()["queued"] == {INTERACTIVE: 0, BATCH: 0}
+    assert gate.stats()["active"] == {INTERACTIVE: 0, BATCH: 0}
+
+def test_batch_leaves_reserved_slots_to_interactive(monkeypatch):
+    monkeypatch.setattr(settings, "admission_concurrency", 2)
+    monkeypatch.setattr(settings, "admission_interactive_reserve", 1)
+
+    async def main():
+        gate, order, release = AdmissionController(), [], asyncio.Event()
+        tasks = [asyncio.ensure_future(_hold(gate, w, BATCH, order, release)) for w in ("b1", "b2")]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.ensure_future(_hold(gate, "ui", INTERACTIVE, order, release)))
+        await asyncio.sleep(0)
+        snapshot = list(order)
+        release.set()
+        await asyncio.gather(*tasks)
+        return snapshot, order
+
+    snapshot, order = asyncio.run(main())
+    assert snapshot == ["b1", "ui"]  # the second batch call waits, the interactive one does not
+    assert order == ["b1", "ui", "b2"]
+
+def test_rejects_early_when_the_wait_outlasts_the_deadline(monkeypatch):
+    monkeypatch.setattr(settings, "admission_concurrency", 1)
+    monkeypatch.setattr(settings, "admission_service_seconds", 10.0)
+
+    async def main():
+        gate, release = AdmissionController(), asyncio.Event()
+        busy = asyncio.ensure_future(_hold(gate, "a", INTERACTIVE, [], release))
+        await asyncio.sleep(0)
+        with deadline.scope(5), admission.client("b"):
+            with pytest.raises(AdmissionRejected) as exc:
+                async with gate.slot():
+                    pass
+        monkeypatch.setattr(settings, "admission_max_queue", 0)
+        with admission.client("c"):
+            with pytest.raises(AdmissionRejected):
+                async with gate.slot():
+                    pass
+        release.set()
+        await busy
+        return exc.value
+
+    err = asyncio.run(main())
+    assert err.retry_after == 10
+
+def test_disconnected_request_leaves_the_queue_and_never_calls_upstream(monkeypatch):
+    from app.schemas import GenerateRequest
+    from app.services import pipeline
+    from app.services.admission import admission as gate
+
+    monkeypatch.setattr(settings, "admission_concurrency", 1)
+    monkeypatch.setattr(settings, "cache_enabled", True)
+    calls = []
+
+    class Counting:
+        name = "counting"
+
+        async def generate(self, payload):
+            calls.append(payload.projectName)
+            raise RuntimeError("not reached")
+
+    monkeypatch.setattr(pipeline, "get_provider", lambda: Counting())
+    req = GenerateRequest(projectName="Queued", projectType="Mechanical", description="Waits behind another client.")
+
+    async def main():
+        release, gone = asyncio.Event(), asyncio.Event()
+        busy = asyncio.ensure_future(_hold(gate, "other", INTERACTIVE, [], release))
+        await asyncio.sleep(0)
+
+        async def receive():
+            await gone.wait()
+            return {"type": "http.disconnect"}
+
+        with admission.client("me"):
+            request = asyncio.ensure_future(deadline.unless_disconnected(receive, pipeline.run_generate(req)))
+        for _ in range(20):
+            await asyncio.sleep(0.01)
+            if gate.queued[INTERACTIVE]:
+                break
+        assert gate.queued[INTERACTIVE] == 1
+        gone.set()
+        with pytest.raises(deadline.ClientDisconnected):
+            await request
+        await asyncio.sleep(0.01)
+        queued = gate.queued[INTERACTIVE]
+        release.set()
+        await busy
+        await asyncio.sleep(0.01)
+        return queued
+
+    assert asyncio.run(main()) == 0
+    assert calls == []
+    assert gate.stats()["active"] == {INTERACTIVE: 0, BATCH: 0}
@@ -0,0 +1,31 @@
+import time
+from app.config import settings
+from app.services.cache import GenerationCache
+
+def test_disk_tier_is_bounded_and_purged(monkeypatch):
+    monkeypatch.setattr(settings, "cache_disk_max_entries", 3)
+    cache = GenerationCache()
+    now = time.time() - 60  # rows written a minute ago, reads happen now
+    for i in range(3):
+        cache._disk_set(f"k{i}", now + i, {"n": i})
+    assert cache._disk_get("k0") is not None  # read: k1 is now least recently used
+    cache._disk_set("k3", now + 3, {"n": 3})
+    assert cache._disk_stats()["entries"] == 3
+    assert cache._disk_get("k1") is None
+    assert all(cache._disk_get(k) is not None for k in ("k0", "k2", "k3"))
+
+    # byte cap: one more small row pushes the oldest out
+    size = cache._disk_stats()["bytes"]
+    monkeypatch.setattr(settings, "cache_disk_max_bytes", size)
+    cache._disk_set("k4", now + 4, {"n": 4})
+    assert cache._disk_stats()["bytes"] <= size
+    assert cache._disk_stats()["entries"] == 3
+
+    # expired rows go on the next write even if never read again
+    monkeypatch.setattr(settings, "cache_disk_max_bytes", 0)
+    stale = now - settings.cache_ttl_seconds - 10
+    cache._conn().execute("INSERT INTO gen_cache VALUES ('old', x'7b7d', ?, ?, 2)", (stale, stale))
+    cache._disk_set("k5", time.time(), {"n": 5})
+    keys = {r[0] for r in cache._conn().execute("SELECT key FROM gen_cache")}
+    assert "old" not in keys and "k5" in keys
+    cache.close()
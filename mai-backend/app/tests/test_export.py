@@ -0,0 +1,61 @@
+from fastapi.testclient import TestClient
+from app.main import app
+from app.services.export_engine import export_engine
+
+DOC = {
+    "project_name": "Pump Station",
+    "summary": "Summary line",
+    "categories": ["Functional", "Safety"],
+    "requirements": [
+        {"category": "Safety", "text": "Guard rotating parts.", "acceptance_criteria": ["Inspection"]},
+        {"category": "Functional", "text": "Deliver 5 l/s.", "acceptance_criteria": ["Flow test"],
+         "standard_refs": ["ISO 9906"]},
+    ],
+    "generated_at": "2024-01-01T00:00:00Z",
+}
+
+def test_export_all_formats():
+    with TestClient(app) as c:
+        md = c.post("/api/export?format=md", json=DOC)
+        pdf = c.post("/api/export?format=pdf", json=DOC)
+        docx = c.post("/api/export?format=docx", json=DOC)
+    assert md.status_code == 200
+    assert md.text.index("## Functional") < md.text.index("Deliver 5 l/s.") < md.text.index("## Safety")
+    assert pdf.content.startswith(b"%PDF")
+    assert docx.content.startswith(b"PK")
+    assert docx.headers["content-disposition"].endswith('.docx"')
+
+def test_export_rejects_when_saturated(monkeypatch):
+    monkeypatch.setattr(export_engine, "_pending", export_engine.capacity)
+    c = TestClient(app)
+    r = c.post("/api/export?format=pdf", json={**DOC, "summary": "Not rendered before"})
+    assert r.status_code == 503
+    assert int(r.headers["retry-after"]) >= 1
+
+def test_export_etag_round_trip():
+    c = TestClient(app)
+    doc = {**DOC, "summary": "ETag round trip"}
+    first = c.post("/api/export?format=md", json=doc)
+    etag = first.headers["etag"]
+    again = c.post("/api/export?format=md", json=doc)
+    not_modified = c.post("/api/export?format=md", json=doc, headers={"If-None-Match": etag})
+    other = c.post("/api/export?format=pdf", json=doc, headers={"If-None-Match": etag})
+    assert first.headers["x-cache"] == "MISS" and again.headers["x-cache"] == "HIT"
+    assert again.headers["etag"] == etag
+    assert not_modified.status_code == 304 and not not_modified.content
+    assert other.status_code == 200 and other.headers["etag"] != etag
+
+def test_streamed_export_matches_buffered():
+    c = TestClient(app)
+    doc = {**DOC, "summary": "Streamed " + "word " * 200}
+    streamed = c.post("/api/export?format=pdf&stream=true", json=doc)
+    buffered = c.post("/api/export?format=pdf", json=doc)
+    assert streamed.status_code == 200 and streamed.headers["x-cache"] == "BYPASS"
+    assert buffered.headers["x-cache"] == "MISS"
+    assert streamed.content == buffered.content
+
+def test_streamed_export_is_refused_when_the_pool_is_full(monkeypatch):
+    monkeypatch.setattr(export_engine, "_pending", export_engine.capacity)
+    r = TestClient(app).post("/api/export?format=md&stream=true", json={**DOC, "summary": "Busy"})
+    assert r.status_code == 503
+    assert int(r.headers["retry-after"]) >= 1
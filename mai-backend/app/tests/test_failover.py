@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+from app.config import settings
+from app.schemas import GenerateRequest
+from app.services.failover import ProviderChain
+from app.services.providers.dummy import DummyProvider
+
+REQ = GenerateRequest(projectName="Pump Station", projectType="Mechanical", description="A small water pump station.")
+
+class Slow(DummyProvider):
+    def __init__(self, name, delay=0.0, fail=False):
+        self.name, self.delay, self.fail = name, delay, fail
+        self.cancelled = False
+
+    async def generate(self, payload, categories=None):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.fail:
+            raise RuntimeError(f"{self.name} down")
+        doc = await super().generate(payload, categories)
+        doc["summary"] = self.name
+        return doc
+
+def test_failover_to_next_provider(monkeypatch):
+    monkeypatch.setattr(settings, "hedge_requests", False)
+    chain = ProviderChain([Slow("a", fail=True), Slow("b")])
+    assert asyncio.run(chain.generate(REQ))["summary"] == "b"
+
+def test_slow_primary_is_hedged_and_cancelled(monkeypatch):
+    monkeypatch.setattr(settings, "hedge_default_delay_seconds", 0.05)
+    slow, fast = Slow("a", delay=5), Slow("b", delay=0.01)
+    chain = ProviderChain([slow, fast])
+
+    async def main():
+        doc = await chain.generate(REQ)
+        await asyncio.sleep(0)  # let the cancellation land
+        return doc
+
+    assert asyncio.run(main())["summary"] == "b"
+    assert slow.cancelled
+
+def test_all_failing_reports_every_provider(monkeypatch):
+    monkeypatch.setattr(settings, "hedge_requests", False)
+    chain = ProviderChain([Slow("a", fail=True), Slow("b", fail=True)])
+    with pytest.raises(RuntimeError, match="a down.*b down"):
+        asyncio.run(chain.generate(REQ))
+
+def test_cache_key_follows_a_member_dropping_structured_output():
+    from app.services.cache import cache_key
+    from app.services.providers.gemini import GeminiProvider
+
+    gemini = GeminiProvider.__new__(GeminiProvider)
+    gemini.model, gemini.structured = "gemini-test", True
+    chain = ProviderChain([gemini, Slow("b")])
+    before = cache_key(REQ, provider=chain.name, model=chain.model, prompt_version=chain.prompt_version)
+    gemini.structured = False  # a 400 switched it to prompt-only
+    after = cache_key(REQ, provider=chain.name, model=chain.model, prompt_version=chain.prompt_version)
+    assert before != after
+    assert "-schema" not in chain.prompt_version
@@ -0,0 +1,109 @@
+import json
+from fastapi.testclient import TestClient
+from app.config import settings
+from app.main import app
+
+BRIEF = {
+    "projectName": "Pump Station",
+    "projectType": "Mechanical",
+    "description": "A small water pump station for a housing estate.",
+}
+
+def test_generate_dummy(monkeypatch):
+    monkeypatch.setattr(settings, "ai_provider", "dummy")
+    with TestClient(app) as c:
+        r = c.post("/api/generate", json=BRIEF)
+    assert r.status_code == 200
+    body = r.json()
+    assert body["project_name"] == "Pump Station"
+    assert body["requirements"]
+
+def test_generate_cache_hit_and_bypass(monkeypatch):
+    monkeypatch.setattr(settings, "ai_provider", "dummy")
+    with TestClient(app) as c:
+        first = c.post("/api/generate", json=BRIEF)
+        again = c.post("/api/generate", json={**BRIEF, "description": "  " + BRIEF["description"] + " "})
+        bypass = c.post("/api/generate", json=BRIEF, headers={"Cache-Control": "no-cache"})
+    assert first.headers["X-Cache"] == "MISS"
+    assert again.headers["X-Cache"] == "HIT"
+    assert again.json() == first.json()
+    assert bypass.headers["X-Cache"] == "BYPASS"
+
+def test_generate_sharded_merges_categories(monkeypatch):
+    monkeypatch.setattr(settings, "ai_provider", "dummy")
+    with TestClient(app) as c:
+        r = c.post("/api/generate?sharded=true", json=BRIEF)
+    assert r.status_code == 200
+    body = r.json()
+    assert body["categories"] == ["Functional", "Performance", "Compliance"]
+    assert [x["category"] for x in body["requirements"]] == body["categories"]
+
+def test_generate_batch_ndjson(monkeypatch):
+    monkeypatch.setattr(settings, "ai_provider", "dummy")
+    briefs = [{**BRIEF, "projectName": f"Station {i}"} for i in range(5)]
+    briefs.append({**BRIEF, "projectType": "Spaceship"})
+    with TestClient(app) as c:
+        bad = c.post("/api/generate/batch", json=briefs)
+        r = c.post("/api/generate/batch", json=briefs[:5])
+    assert bad.status_code == 422
+    lines = [json.loads(x) for x in r.text.splitlines()]
+    assert sorted(x["index"] for x in lines) == list(range(5))
+    assert all(x["ok"] and x["result"]["project_name"] == f"Station {x['index']}" for x in lines)
+
+def test_revise_keeps_order_of_untouched_requirements(monkeypatch):
+    monkeypatch.setattr(settings, "ai_provider", "dummy")
+    with TestClient(app) as c:
+        doc = c.post("/api/generate", json=BRIEF).json()
+        by_index = c.post("/api/generate/revise", json={"brief": BRIEF, "document": doc, "mode": "refine", "indexes": [1]})
+        by_cat = c.post("/api/generate/revise", json={"brief": BRIEF, "document": doc, "categories": ["Performance", "Safety"]})
+        extended = c.post("/api/generate/revise", json={"brief": BRIEF, "document": doc, "mode": "extend", "categories": ["Functional"]})
+        bad = c.post("/api/generate/revise", json={"brief": BRIEF, "document": doc, "indexes": [99]})
+    old = doc["requirements"]
+
+    new = by_index.json()["requirements"]
+    assert by_index.status_code == 200
+    assert new[0] == old[0] and new[2] == old[2]
+    assert new[1]["text"] == old[1]["text"] + " (revised)"
+
+    cats = [r["category"] for r in by_cat.json()["requirements"]]
+    assert cats == ["Functional", "Performance", "Compliance", "Safety"]
+    assert by_cat.json()["requirements"][0] == old[0]
+    assert by_cat.json()["categories"][-1] == "Safety"
+
+    assert [r["category"] for r in extended.json()["requirements"]] == ["Functional", "Functional", "Performance", "Compliance"]
+    assert bad.status_code == 422
+
+def test_generated_requirements_are_searchable(monkeypatch):
+    monkeypatch.setattr(settings, "ai_provider", "dummy")
+    with TestClient(app) as c:
+        c.post("/api/generate", json=BRIEF)
+        c.post("/api/generate", json=BRIEF)  # cache hit: not indexed twice
+        r = c.get("/api/requirements/search", params={"q": "generation time"})
+        filtered = c.get("/api/requirements/search", params={"q": "generation", "category": "Functional"})
+        none = c.get("/api/requirements/search", params={"q": "generation", "projectType": "Civil"})
+    results = r.json()["results"]
+    assert len(results) == 1
+    assert results[0]["requirement"]["category"] == "Performance"
+    assert results[0]["project"] == "Pump Station"
+    assert [x["requirement"]["category"] for x in filtered.json()["results"]] == ["Functional"]
+    assert none.json()["results"] == []
+
+def test_generate_honours_request_deadline(monkeypatch):
+    import asyncio
+    import time
+    import httpx
+    from app.services import pipeline
+    from app.services.providers.github_openai import GitHubOpenAIProvider
+
+    async def slow_upstream(request):
+        await asyncio.sleep(1.5)
+        return httpx.Response(200, json={})
+
+    monkeypatch.setattr(settings, "github_token", "test-token")
+    provider = GitHubOpenAIProvider(http_client=httpx.AsyncClient(transport=httpx.MockTransport(slow_upstream)))
+    monkeypatch.setattr(pipeline, "get_provider", lambda: provider)
+    with TestClient(app) as c:
+        started = time.monotonic()
+        r = c.post("/api/generate", json=BRIEF, headers={"X-Request-Timeout": "0.5"})
+    assert r.status_code == 504, r.text
+    assert time.monotonic() - started < 1.4
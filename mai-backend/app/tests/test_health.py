@@ -1,4 +1,5 @@
 from fastapi.testclient import TestClient
+from app.config import settings
 from app.main import app
 
 def test_health():
@@ -6,3 +7,16 @@ def test_health():
     r = c.get("/api/health")
     assert r.status_code == 200
     assert r.json()["status"] == "ok"
+
+def test_metrics_exposition(monkeypatch):
+    monkeypatch.setattr(settings, "ai_provider", "dummy")
+    with TestClient(app) as c:
+        c.post("/api/generate", json={"projectName": "Metrics", "projectType": "Software", "description": "Scrape me after one generate."}, headers={"Cache-Control": "no-cache"})
+        r = c.get("/api/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    body = r.text
+    assert "# TYPE mai_stage_seconds histogram" in body
+    assert 'mai_stage_seconds_bucket{stage="request_validation",provider="",le="+Inf"}' in body
+    assert 'mai_stage_seconds_count{stage="response_validation",provider="dummy"}' in body
+    assert 'mai_cache_requests_total{cache="generation",result="bypass"}' in body
@@ -0,0 +1,69 @@
+import time
+from fastapi.testclient import TestClient
+from app.config import settings
+from app.main import app
+
+BRIEF = {
+    "projectName": "Pump Station",
+    "projectType": "Mechanical",
+    "description": "A small water pump station for a housing estate.",
+}
+
+def test_async_generate_job_round_trip(monkeypatch):
+    monkeypatch.setattr(settings, "ai_provider", "dummy")
+    with TestClient(app) as c:
+        r = c.post("/api/generate?async=true", json=BRIEF)
+        assert r.status_code == 202
+        url = r.json()["status_url"]
+        assert r.headers["location"] == url
+        for _ in range(50):
+            job = c.get(url).json()
+            if job["status"] == "done":
+                break
+            time.sleep(0.05)
+        events = c.get(url + "/events").text
+    assert job["status"] == "done"
+    assert job["result"]["project_name"] == "Pump Station"
+    assert "event: done" in events
+    assert c.get("/api/jobs/nope").status_code == 404
+
+def test_workers_only_requeue_their_own_or_abandoned_jobs(monkeypatch):
+    from app.schemas import GenerateRequest
+    from app.services.jobs import JobStore
+
+    monkeypatch.setattr(settings, "job_lease_seconds", 0.5)
+    a, b = JobStore(), JobStore()  # two worker processes sharing one job table
+    req = GenerateRequest.model_validate(BRIEF)
+    first, second = a.submit(req, None), a.submit(req, None)
+    assert a.claim()["id"] == first
+    assert b.claim()["id"] == second
+
+    # b restarts: its own job goes back, a's live job is left alone
+    assert b.requeue() == 1
+    assert b.requeue(expired_only=True) == 0
+    assert a.get(first)["status"] == "running"
+    assert a.get(second)["status"] == "queued"
+
+    # a dies: once its lease runs out any worker may take the job back
+    time.sleep(0.6)
+    assert b.requeue(expired_only=True) == 1
+    assert a.get(first)["status"] == "queued"
+    a.close()
+    b.close()
+
+def test_waiting_on_a_job_run_elsewhere_leaves_nothing_behind():
+    import asyncio
+    from app.services.jobs import JobQueue
+
+    async def main():
+        q = JobQueue()
+        # two pollers of a job this process never runs (done, unknown, or on another worker)
+        await asyncio.gather(q.wait("elsewhere", timeout=0.02), q.wait("elsewhere", timeout=0.05))
+        waiter = asyncio.ensure_future(q.wait("mine", timeout=5))
+        await asyncio.sleep(0)
+        q._notify("mine")
+        await waiter
+        return q
+
+    q = asyncio.run(main())
+    assert q._waiters == {} and q._watchers == {}
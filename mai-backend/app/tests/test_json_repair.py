@@ -0,0 +1,35 @@
+import json
+from app.services.json_repair import repair_json
+
+DOC = {
+    "project_name": "Pump Station",
+    "summary": "Summary",
+    "categories": ["Functional", "Safety"],
+    "requirements": [
+        {"category": "Functional", "text": "Deliver 5 l/s.", "priority": "MUST",
+         "acceptance_criteria": ["Flow >= 5 l/s"], "standard_refs": []},
+        {"category": "Safety", "text": "Guard rotating parts.", "priority": "MUST",
+         "acceptance_criteria": ["Inspection", "Test"], "standard_refs": ["ISO 14120"]},
+    ],
+}
+
+def test_every_truncation_yields_only_complete_requirements():
+    text = "```json\n" + json.dumps(DOC, indent=2)
+    start = text.index('"requirements"')
+    for cut in range(start, len(text)):
+        obj = repair_json(text[:cut])
+        assert obj is not None, cut
+        assert obj["summary"] == "Summary"
+        assert all(r in DOC["requirements"] for r in obj.get("requirements", [])), cut
+
+def test_truncated_inside_last_requirement_drops_it():
+    text = json.dumps(DOC)
+    obj = repair_json(text[: text.index("Inspection") + 4])
+    assert obj["requirements"] == DOC["requirements"][:1]
+
+def test_trailing_commas_and_smart_quotes():
+    obj = repair_json('Here you go: {“summary”: “He said \\"ok\\"”, "categories": ["A", "B",],}')
+    assert obj == {"summary": 'He said "ok"', "categories": ["A", "B"]}
+
+def test_unrecoverable_returns_none():
+    assert repair_json("I cannot help with that.") is None
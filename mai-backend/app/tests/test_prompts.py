@@ -0,0 +1,37 @@
+from app.schemas import GenerateRequest
+from app.services import prompts
+
+def _req(**kw):
+    base = {"projectName": "Pump", "projectType": "Mechanical", "description": "A small water pump station."}
+    return GenerateRequest(**{**base, **kw})
+
+def test_system_prefix_is_stable_across_requests():
+    a = prompts.build_messages(_req())
+    b = prompts.build_messages(_req(projectName="Other", description="Something else entirely, at length."))
+    assert a[0] == b[0]
+    assert "Pump" not in a[0]["content"] and "Pump" in a[1]["content"]
+    # the brief goes last so the shared part of the user message is as long as possible
+    assert a[1]["content"].rstrip().endswith("A small water pump station.")
+
+def test_budget_follows_level_tone_and_brief():
+    small = prompts.plan(_req(level="high", tone="concise"))
+    large = prompts.plan(_req(level="detailed", tone="formal"))
+    assert small.max_tokens < large.max_tokens
+    assert small.count == "12–20"
+    longer = prompts.plan(_req(description="Pumps, valves and telemetry. " * 60))
+    assert longer.max_tokens > large.max_tokens
+    shard = prompts.plan(_req(), ["Safety", "Compliance"])
+    assert shard.max_tokens < large.max_tokens
+
+def test_count_tokens_is_local():
+    assert prompts.count_tokens("") == 0
+    assert 0 < prompts.count_tokens("hello world") < 10
+
+def test_seed_examples_only_for_their_categories():
+    seed = [{"category": "Safety", "priority": "MUST", "text": "Pumps MUST stop within 2 s of a leak alarm."}]
+    with prompts.examples(seed):
+        full = prompts.user_prompt(_req())
+        shard = prompts.user_prompt(_req(), ["Functional"])
+    assert "stop within 2 s" in full
+    assert "stop within 2 s" not in shard
+    assert "earlier projects" not in prompts.user_prompt(_req())
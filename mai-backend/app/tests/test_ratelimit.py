@@ -0,0 +1,185 @@
+import asyncio
+import io
+import httpx
+import pytest
+import time
+from app.config import settings
+from app.services.ratelimit import CircuitOpen, TokenBucket, UpstreamGuard, UpstreamThrottled, classify
+
+def _status_error(status: int, headers=None) -> httpx.HTTPStatusError:
+    req = httpx.Request("POST", "https://upstream.test/v1")
+    return httpx.HTTPStatusError("boom", request=req, response=httpx.Response(status, headers=headers, request=req))
+
+def test_bucket_queues_callers_in_order():
+    b = TokenBucket(per_minute=60)  # one token per second, burst of 60
+    waits = [b.reserve(1, now=b.updated) for _ in range(62)]
+    assert waits[:60] == [0.0] * 60
+    assert waits[60] == pytest.approx(1.0)
+    assert waits[61] == pytest.approx(2.0)
+
+def test_classify_reads_retry_after():
+    assert classify(_status_error(429, {"retry-after": "7"})) == ("throttled", 7.0)
+    assert classify(_status_error(429, {"x-ratelimit-reset-requests": "1m30s"})) == ("throttled", 90.0)
+    assert classify(_status_error(503))[0] == "transient"
+    assert classify(_status_error(400))[0] == "fatal"
+
+def test_throttle_is_honoured_then_surfaced(monkeypatch):
+    monkeypatch.setattr(settings, "upstream_max_attempts", 2)
+    monkeypatch.setattr(settings, "upstream_max_wait_seconds", 0.5)
+    calls = 0
+
+    async def throttled():
+        nonlocal calls
+        calls += 1
+        raise _status_error(429, {"retry-after": "30"})
+
+    guard = UpstreamGuard("test")
+    with pytest.raises(UpstreamThrottled) as err:
+        asyncio.run(guard.call(throttled))
+    # the second attempt would have to wait 30s, past the cap: fail fast instead
+    assert calls == 1
+    assert 29 <= err.value.retry_after <= 30
+
+def test_breaker_opens_and_recovers(monkeypatch):
+    monkeypatch.setattr(settings, "upstream_max_attempts", 1)
+    monkeypatch.setattr(settings, "breaker_failure_threshold", 2)
+    monkeypatch.setattr(settings, "breaker_cooldown_seconds", 0.05)
+    guard = UpstreamGuard("test")
+
+    async def down():
+        raise _status_error(502)
+
+    async def up():
+        return "ok"
+
+    async def main():
+        for _ in range(2):
+            with pytest.raises(httpx.HTTPStatusError):
+                await guard.call(down)
+        with pytest.raises(CircuitOpen):
+            await guard.call(up)
+        await asyncio.sleep(0.06)
+        return await guard.call(up)
+
+    assert asyncio.run(main()) == "ok"
+    assert guard.breaker.state == "closed"
+
+def test_workers_draw_from_one_shared_quota(monkeypatch):
+    monkeypatch.setattr(settings, "workers", 2)
+    monkeypatch.setattr(settings, "upstream_rpm", 2)
+    # one guard per worker process, same upstream
+    a, b = UpstreamGuard("p:m"), UpstreamGuard("p:m")
+
+    async def main():
+        assert await a._reserve(0) == 0.0 and await b._reserve(0) == 0.0
+        assert await a._reserve(0) > 0  # b's call used the rest of the quota
+        await b.penalize(30)
+
+    asyncio.run(main())
+    assert a.blocked_for() > 29
+
+def test_shared_quota_does_not_block_the_event_loop(monkeypatch):
+    import sqlite3
+    from app.services.shared_state import shared_store
+
+    monkeypatch.setattr(settings, "workers", 2)
+    guard = UpstreamGuard("p:locked")
+    shared_store.blocked_for(guard.name)  # create the store before locking it
+
+    async def up():
+        return "ok"
+
+    async def main():
+        other = sqlite3.connect(settings.shared_state_path, isolation_level=None)
+        other.execute("BEGIN IMMEDIATE")  # another worker mid-write
+        call = asyncio.ensure_future(guard.call(up))
+        started = time.monotonic()
+        for _ in range(5):
+            await asyncio.sleep(0.02)
+        ticked = time.monotonic() - started
+        other.execute("COMMIT")
+        other.close()
+        return ticked, await call
+
+    ticked, result = asyncio.run(main())
+    assert result == "ok"
+    assert ticked < 1.0  # the loop kept running while the guard waited for the lock
+
+def test_deadline_cuts_the_upstream_call_short():
+    from app.services import deadline
+
+    async def slow():
+        await asyncio.sleep(5)
+
+    async def main():
+        g = UpstreamGuard("deadline-test")
+        with deadline.scope(0.1):
+            with pytest.raises(deadline.DeadlineExceeded):
+                await g.call(slow)
+        return g
+
+    g = asyncio.run(main())
+    # our own timeout is not an upstream failure
+    assert g.breaker.failures == 0
+
+def test_github_models_leaves_retries_to_the_guard(monkeypatch):
+    import requests
+    from azure.core.pipeline.transport import RequestsTransport
+    from app.services import deadline
+    from app.services.providers import github_models
+
+    monkeypatch.setattr(settings, "github_token", "test-token")
+    monkeypatch.setattr(settings, "upstream_max_attempts", 2)
+    monkeypatch.setattr(settings, "upstream_max_wait_seconds", 0.5)
+    sent = []
+
+    class Throttled(requests.adapters.HTTPAdapter):
+        def send(self, request, **kwargs):
+            sent.append(kwargs["timeout"])
+            resp = requests.Response()
+            resp.status_code, resp.request, resp.url = 429, request, request.url
+            resp.headers["retry-after"] = "30"
+            resp.raw = io.BytesIO()
+            resp._content = b'{"error": {"code": "RateLimitReached", "message": "slow down"}}'
+            return resp
+
+    session = requests.Session()
+    session.mount("https://", Throttled())
+    real = github_models.ChatCompletionsClient
+    monkeypatch.setattr(
+        github_models, "ChatCompletionsClient",
+        lambda **kw: real(transport=RequestsTransport(session=session, session_owner=False), **kw),
+    )
+    provider = github_models.GitHubModelsProvider()
+    provider.guard = UpstreamGuard("github_models-test")
+
+    async def main():
+        with deadline.scope(5):
+            await provider._complete([github_models.UserMessage("hi")], max_tokens=16)
+
+    with pytest.raises(UpstreamThrottled):
+        asyncio.run(main())
+    # one HTTP call: the SDK did not retry the 429, the guard saw it and gave up
+    assert len(sent) == 1
+    connect, read = sent[0]
+    assert connect <= 5 and read <= 5
+
+def test_cancelled_waiter_returns_its_reservation(monkeypatch):
+    monkeypatch.setattr(settings, "upstream_rpm", 60)  # one request per second once the burst is gone
+
+    async def up():
+        return "ok"
+
+    async def main():
+        g = UpstreamGuard("cancel-test")
+        g.requests.tokens = 0.0  # burst used up
+        g.requests.updated = time.monotonic()
+        waiter = asyncio.ensure_future(g.call(up))
+        await asyncio.sleep(0.05)  # sleeping off its reservation
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return await g._reserve(0)
+
+    # the next caller waits its own turn, not the cancelled caller's as well
+    assert asyncio.run(main()) < 1.5
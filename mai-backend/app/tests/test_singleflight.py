@@ -0,0 +1,105 @@
+import asyncio
+from app.services.singleflight import SharedFlight, SingleFlight
+
+def test_concurrent_calls_share_one_execution():
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"n": calls}
+
+    async def main():
+        sf = SingleFlight()
+        results = await asyncio.gather(*(sf.do("k", work) for _ in range(5)))
+        assert len(sf) == 0
+        return results
+
+    results = asyncio.run(main())
+    assert calls == 1
+    assert [shared for _, shared in results].count(False) == 1
+    assert all(r == {"n": 1} for r, _ in results)
+
+def test_errors_propagate_to_every_waiter():
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def main():
+        sf = SingleFlight()
+        return await asyncio.gather(sf.do("k", boom), sf.do("k", boom), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+def test_workers_share_one_execution_through_the_store():
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.2)
+        return {"n": calls}
+
+    async def main():
+        # two SharedFlight instances stand in for two worker processes
+        return await asyncio.gather(SharedFlight().do("k", work), SharedFlight().do("k", work))
+
+    results = asyncio.run(main())
+    assert calls == 1
+    assert sorted(shared for _, shared in results) == [False, True]
+    assert all(r == {"n": 1} for r, _ in results)
+
+def test_abandoned_call_is_cancelled_unless_kept():
+    async def main(keep):
+        sf = SingleFlight()
+        started = asyncio.Event()
+        state = {}
+
+        async def work():
+            started.set()
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                state["cancelled"] = True
+                raise
+
+        waiters = [asyncio.ensure_future(sf.do("k", work, keep=keep)) for _ in range(2)]
+        await started.wait()
+        waiters[0].cancel()
+        await asyncio.sleep(0.01)
+        state["after_first"] = state.get("cancelled", False)
+        waiters[1].cancel()
+        await asyncio.sleep(0.01)
+        return dict(state)  # a kept call is only cancelled later, by asyncio.run's shutdown
+
+    dropped = asyncio.run(main(keep=False))
+    assert dropped == {"after_first": False, "cancelled": True}
+    assert asyncio.run(main(keep=True)) == {"after_first": False}
+
+def test_follower_stops_waiting_at_its_deadline():
+    import time
+    import pytest
+    from app.services import deadline
+
+    async def main():
+        leader, follower = SharedFlight(), SharedFlight()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return {"n": 1}
+
+        lead = asyncio.ensure_future(leader.do("k", work))
+        await asyncio.sleep(0.05)
+        started = time.monotonic()
+        with deadline.scope(0.2):
+            with pytest.raises(deadline.DeadlineExceeded):
+                await follower.do("k", work)
+        waited = time.monotonic() - started
+        release.set()
+        await lead
+        return waited
+
+    assert asyncio.run(main()) < 1
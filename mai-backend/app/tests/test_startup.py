@@ -0,0 +1,69 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from app.config import settings
+
+ROOT = Path(__file__).resolve().parents[2]
+HEAVY = ("docx", "reportlab", "openai", "azure.ai.inference", "httpx")
+
+# Fresh interpreter: nothing imported yet, so this is a true cold start.
+PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import app.main
+import_s = time.perf_counter() - started
+from starlette.testclient import TestClient
+with TestClient(app.main.app) as c:
+    c.get("/api/health")
+    with open("/proc/self/status") as f:
+        rss_kb = int(f.read().split("VmRSS:")[1].split()[0])
+    print(json.dumps({{"import_s": import_s, "rss_mb": rss_kb / 1024,
+                      "heavy": [m for m in {HEAVY!r} if m in sys.modules]}}))
+"""
+
+def _env(tmp_path):
+    return {
+        **os.environ,
+        "AI_PROVIDER": "dummy",
+        "WARMUP": "false",
+        "CACHE_DB_PATH": str(tmp_path / "cache.sqlite3"),
+        "JOB_DB_PATH": str(tmp_path / "jobs.sqlite3"),
+        "LIBRARY_DB_PATH": str(tmp_path / "library.sqlite3"),
+        "TRACE_PATH": str(tmp_path / "traces.jsonl"),
+        "EXPORT_CACHE_DIR": str(tmp_path / "exports"),
+    }
+
+def test_cold_start_within_budget(tmp_path):
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=ROOT, env=_env(tmp_path), capture_output=True, text=True, timeout=60, check=True,
+    )
+    probe = json.loads(out.stdout.strip().splitlines()[-1])
+    assert probe["heavy"] == [], "loaded at start-up instead of on first use"
+    assert probe["import_s"] <= settings.startup_import_budget_seconds, probe
+    assert probe["rss_mb"] <= settings.startup_rss_budget_mb, probe
+
+# Warm-up must load the document libraries where exports render: in every
+# pool worker (python-docx maps lxml's extension), not in the API process.
+WARM_PROBE = """
+import asyncio, json, sys
+from app.services.export_engine import export_engine
+from app.services.warmup import warm_up
+asyncio.run(warm_up())
+pids = list(export_engine._pool._processes)
+warm = []
+for pid in pids:
+    with open(f"/proc/{pid}/maps") as f:
+        warm.append("lxml" in f.read())
+export_engine.shutdown()
+print(json.dumps({"workers": len(pids), "warm": warm, "api_docx": "docx" in sys.modules}))
+"""
+
+def test_warm_up_preloads_every_export_worker(tmp_path):
+    env = {**_env(tmp_path), "EXPORT_WORKERS": "2"}
+    out = subprocess.run(
+        [sys.executable, "-c", WARM_PROBE], cwd=ROOT, env=env, capture_output=True, text=True, timeout=120, check=True,
+    )
+    probe = json.loads(out.stdout.strip().splitlines()[-1])
+    assert probe == {"workers": 2, "warm": [True, True], "api_docx": False}, probe
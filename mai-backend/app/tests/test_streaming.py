@@ -0,0 +1,52 @@
+import json
+from fastapi.testclient import TestClient
+from app.config import settings
+from app.main import app
+from app.services.streaming import RequirementStreamParser
+
+DOC = {
+    "project_name": "Pump {Station}",
+    "summary": "A \"quoted\" summary, with commas",
+    "categories": ["Functional", "Safety"],
+    "requirements": [
+        {"category": "Functional", "text": "Pump SHALL deliver 5 l/s.", "priority": "MUST",
+         "acceptance_criteria": ["Flow >= 5 l/s [measured]"], "standard_refs": []},
+        {"category": "Safety", "text": "Guard {all} rotating parts.", "priority": "MUST",
+         "acceptance_criteria": ["Inspection"], "rationale": None, "standard_refs": ["ISO 14120"]},
+    ],
+    "generated_at": "2024-01-01T00:00:00Z",
+}
+
+def test_parser_emits_items_as_they_close():
+    text = "```json\n" + json.dumps(DOC, indent=1) + "\n```"
+    p = RequirementStreamParser()
+    events = []
+    for i in range(0, len(text), 7):
+        events.extend(p.feed(text[i:i + 7]))
+    fields = {d["name"]: d["value"] for k, d in events if k == "field"}
+    items = [d for k, d in events if k == "requirement"]
+    assert fields["summary"] == DOC["summary"]
+    assert fields["categories"] == DOC["categories"]
+    assert items == DOC["requirements"]
+    assert p.done
+
+def test_parser_handles_truncated_stream():
+    text = json.dumps(DOC)
+    p = RequirementStreamParser()
+    events = p.feed(text[: text.index("Guard")])
+    assert [d for k, d in events if k == "requirement"] == DOC["requirements"][:1]
+    assert not p.done
+
+def test_generate_stream_ndjson(monkeypatch):
+    monkeypatch.setattr(settings, "ai_provider", "dummy")
+    with TestClient(app) as c:
+        r = c.post("/api/generate/stream", json={
+            "projectName": "Pump Station",
+            "projectType": "Mechanical",
+            "description": "A small water pump station for a housing estate.",
+        })
+    assert r.status_code == 200
+    events = [json.loads(line) for line in r.text.splitlines()]
+    kinds = [e["event"] for e in events]
+    assert kinds[0] == "meta" and kinds[-1] == "done"
+    assert kinds.count("requirement") == events[-1]["data"]["count"] > 0
@@ -0,0 +1,74 @@
+import asyncio
+import json
+import httpx
+from app.config import settings
+from app.schemas import GenerateRequest, RequirementItem
+from app.services.providers.github_openai import GitHubOpenAIProvider
+from app.services.structured_output import response_json_schema
+
+REQ = GenerateRequest(projectName="Pump", projectType="Mechanical", description="A small water pump station.")
+DOC = {"project_name": "Pump", "summary": "s", "categories": ["Functional"], "requirements": [
+    {"category": "Functional", "text": "t", "priority": "MUST", "acceptance_criteria": ["a"],
+     "rationale": None, "standard_refs": []}]}
+
+def test_schema_is_strict_and_tracks_models():
+    schema = response_json_schema()
+    assert "generated_at" not in schema["properties"]
+    item = schema["properties"]["requirements"]["items"]
+    assert set(item["required"]) == set(RequirementItem.model_fields)
+    assert item["additionalProperties"] is False
+    assert "$ref" not in json.dumps(schema)
+
+def _completion(content: str) -> dict:
+    return {"id": "x", "object": "chat.completion", "created": 0, "model": "m",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}]}
+
+def test_falls_back_to_prompt_only_when_schema_rejected(monkeypatch):
+    monkeypatch.setattr(settings, "github_token", "t")
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        seen.append("response_format" in body)
+        if "response_format" in body:
+            return httpx.Response(400, json={"error": {"message": "response_format unsupported"}})
+        return httpx.Response(200, json=_completion(json.dumps(DOC)))
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            p = GitHubOpenAIProvider(http_client=http)
+            p.client = p.client.with_options(max_retries=0)
+            first = await p.generate(REQ)
+            second = await p.generate(REQ)
+            return p, first, second
+
+    p, first, second = asyncio.run(main())
+    assert seen == [True, False, False]
+    assert not p.structured
+    assert first["requirements"] == second["requirements"] == DOC["requirements"]
+
+def test_gemini_leaves_the_schema_out_of_the_prompt_when_enforced(monkeypatch):
+    from app.services import prompts
+    from app.services.providers.gemini import GeminiProvider
+    monkeypatch.setattr(settings, "gemini_api_key", "k")
+    sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(json.loads(request.content))
+        text = json.dumps(DOC)
+        return httpx.Response(200, json={"candidates": [{"content": {"parts": [{"text": text}]}}]})
+
+    async def main(structured):
+        monkeypatch.setattr(settings, "structured_output", structured)
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            p = GeminiProvider(http_client=http)
+            await p.generate(REQ)
+            return p.prompt_version
+
+    enforced, plain = asyncio.run(main(True)), asyncio.run(main(False))
+    assert sent[0]["system_instruction"]["parts"][0]["text"] == prompts.system_prompt(structured=True)
+    assert "response_schema" in sent[0]["generationConfig"]
+    assert sent[1]["system_instruction"]["parts"][0]["text"] == prompts.system_prompt(structured=False)
+    assert "response_schema" not in sent[1]["generationConfig"]
+    assert enforced != plain
@@ -0,0 +1,49 @@
+import json
+from fastapi.testclient import TestClient
+from app.config import settings
+from app.main import app
+
+BRIEF = {
+    "projectName": "Traced Pump",
+    "projectType": "Mechanical",
+    "description": "A small water pump station, traced end to end.",
+}
+
+def test_generate_writes_span_tree(monkeypatch):
+    monkeypatch.setattr(settings, "ai_provider", "dummy")
+    with TestClient(app) as c:
+        r = c.post("/api/generate", json=BRIEF, headers={"X-Request-ID": "req-42", "Cache-Control": "no-cache"})
+        other = c.get("/api/health")
+    assert r.headers["X-Request-ID"] == "req-42"
+    assert len(other.headers["X-Request-ID"]) == 32
+
+    with open(settings.trace_path) as f:
+        records = [json.loads(line) for line in f]
+    rec = next(t for t in records if t["request_id"] == "req-42")
+    assert rec["status"] == 200
+    spans = {s["name"]: s for s in rec["spans"]}
+    assert {"request", "request_validation", "generate", "response_validation"} <= set(spans)
+    assert spans["generate"]["parent"] == spans["request"]["id"]
+    assert all("duration_ms" in s for s in rec["spans"])
+
+def test_profile_is_admin_only(monkeypatch):
+    with TestClient(app) as c:
+        assert c.get("/api/debug/profile").status_code == 404
+        monkeypatch.setattr(settings, "admin_token", "s3cret")
+        assert c.get("/api/debug/profile", headers={"X-Admin-Token": "nope"}).status_code == 403
+        r = c.get(
+            "/api/debug/profile",
+            params={"seconds": 0.2, "all_threads": True},
+            headers={"X-Admin-Token": "s3cret"},
+        )
+    assert r.status_code == 200
+    assert int(r.headers["X-Profile-Samples"]) > 0
+    stack, count = r.text.splitlines()[0].rsplit(" ", 1)
+    assert stack.startswith("thread:") and int(count) > 0
+
+def test_internal_model_construction_is_not_timed():
+    from app.schemas import GenerateRequest
+    from app.services.metrics import STAGE_SECONDS
+    before = STAGE_SECONDS.count(stage="request_validation", provider="")
+    GenerateRequest.model_validate(BRIEF)
+    assert STAGE_SECONDS.count(stage="request_validation", provider="") == before
@@ -0,0 +1,63 @@
+"""
+Peak memory of the streaming md/pdf renderers versus document size.
+
+    python -m benchmarks.export_memory [sizes...]
+
+Only allocations made while rendering are traced (the input document is
+built first), so a flat ``peak_kib`` column means memory does not grow with
+the number of requirements.
+"""
+import sys
+import time
+import tracemalloc
+
+from app.schemas import CATEGORIES, GenerateResponse
+from app.services.renderers import iter_md, iter_pdf
+
+DEFAULT_SIZES = (100, 1000, 5000, 20000)
+
+
+def synthetic_doc(n: int) -> GenerateResponse:
+    return GenerateResponse.model_validate({
+        "project_name": f"Synthetic {n}",
+        "summary": "Synthetic specification used for renderer benchmarks. " * 4,
+        "categories": list(CATEGORIES),
+        "requirements": [
+            {
+                "category": CATEGORIES[i % len(CATEGORIES)],
+                "text": f"Requirement {i}: the system SHALL keep response time below {i % 500} ms "
+                        "for 95% of requests measured over a rolling 24 hour window.",
+                "priority": ("MUST", "SHOULD", "MAY")[i % 3],
+                "acceptance_criteria": [f"Load test {i} passes at p95", "Monitoring alert configured"],
+                "rationale": "Keeps the user experience predictable." if i % 2 else None,
+                "standard_refs": ["ISO/IEC 25010"] if i % 5 == 0 else [],
+            }
+            for i in range(n)
+        ],
+        "generated_at": "2024-01-01T00:00:00Z",
+    })
+
+
+def measure(render, doc) -> tuple[float, int, int]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    total = 0
+    for chunk in render(doc):
+        total += len(chunk)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, total
+
+
+def main(sizes) -> None:
+    print(f"{'format':<6} {'reqs':>7} {'seconds':>8} {'peak_kib':>9} {'out_kib':>9}")
+    for n in sizes:
+        doc = synthetic_doc(n)
+        for name, render in (("md", iter_md), ("pdf", iter_pdf)):
+            elapsed, peak, total = measure(render, doc)
+            print(f"{name:<6} {n:>7} {elapsed:>8.2f} {peak / 1024:>9.0f} {total / 1024:>9.0f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or DEFAULT_SIZES)
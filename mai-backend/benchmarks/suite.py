@@ -0,0 +1,193 @@
+"""
+Micro-benchmarks for the CPU-bound parts of the backend: parsing model
+output, validating documents and rendering exports.
+
+    python -m benchmarks.suite                       # all cases, default sizes
+    python -m benchmarks.suite --sizes 10 1000 --only parse
+    python -m benchmarks.suite --compare benchmarks/results/<old>.json
+
+Every case runs on synthetic documents of ``--sizes`` requirements. Timings
+are the median of ``--repeat`` runs. Peak memory comes from one extra
+tracemalloc run, kept separate so tracing does not skew the timings. Results
+are written to ``benchmarks/results/<commit>.json``. ``--compare`` prints the
+change against an earlier file and exits 1 when a case slowed down by more
+than ``--threshold`` (cases under a millisecond are not judged).
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import orjson
+
+from app.schemas import GenerateResponse
+from app.services.json_repair import repair_json
+from app.services.providers.gemini import _extract_json as gemini_extract
+from app.services.providers.github_openai import _parse_or_raise
+from app.services.providers.hf import _extract_json as hf_extract
+from app.services.renderers import render_docx, render_md, render_pdf
+
+from benchmarks.export_memory import synthetic_doc
+
+DEFAULT_SIZES = (10, 100, 1000, 5000, 20000)
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+Case = Tuple[str, str, Callable[[], Any], int]  # group, name, fn, bytes in
+
+
+def _outputs(doc: GenerateResponse) -> Dict[str, str]:
+    """What a model typically sends back for ``doc``: clean, fenced, truncated."""
+    clean = orjson.dumps(doc.model_dump(mode="json", exclude={"generated_at"})).decode()
+    return {
+        "clean": clean,
+        "fenced": "Here is the JSON:\n```json\n" + clean + "\n```",
+        # cut mid-requirement, as when max_tokens runs out
+        "truncated": clean[: int(len(clean) * 0.9)],
+    }
+
+
+def _parse_then_repair(text: str) -> Any:
+    """The provider path for output cut off at max_tokens: strict parse fails, local repair closes it up."""
+    try:
+        return _parse_or_raise(text)
+    except ValueError:
+        obj = repair_json(text)
+    if obj is None:
+        raise ValueError("local repair failed on truncated benchmark input")
+    return obj
+
+
+def cases(sizes: List[int]) -> Iterator[Case]:
+    for n in sizes:
+        doc = synthetic_doc(n)
+        raw = doc.model_dump(mode="json")
+        for kind, text in _outputs(doc).items():
+            if kind != "truncated":
+                # the truncated text is not JSON at all: it goes through local repair
+                yield "parse", f"openai_parse_or_raise/{kind}/{n}", lambda t=text: _parse_or_raise(t), len(text)
+                yield "parse", f"gemini_extract_json/{kind}/{n}", lambda t=text: gemini_extract(t), len(text)
+                yield "parse", f"hf_extract_json/{kind}/{n}", lambda t=text: hf_extract(t), len(text)
+            else:
+                yield "parse", f"openai_parse_or_raise/{kind}/{n}", lambda t=text: _parse_then_repair(t), len(text)
+                yield "parse", f"gemini_extract_json/{kind}/{n}", lambda t=text: gemini_extract(t), len(text)
+            yield "parse", f"repair_json/{kind}/{n}", lambda t=text: repair_json(t), len(text)
+        yield "validate", f"GenerateResponse.model_validate/{n}", lambda r=raw: GenerateResponse.model_validate(r), 0
+        yield "validate", f"GenerateResponse.model_dump_json/{n}", doc.model_dump_json, 0
+        yield "render", f"md/{n}", lambda d=doc: render_md(d), 0
+        yield "render", f"docx/{n}", lambda d=doc: render_docx(d), 0
+        yield "render", f"pdf/{n}", lambda d=doc: render_pdf(d), 0
+
+
+def _repeats(requested: int, first_run: float) -> int:
+    # Keep very slow cases (big docx) from taking minutes.
+    return max(1, min(requested, int(10 / max(first_run, 1e-9))))
+
+
+def run_case(fn: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    gc.collect()
+    start = time.perf_counter()
+    out = fn()
+    first = time.perf_counter() - start
+    times = [first]
+    for _ in range(_repeats(repeat, first) - 1):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    size = len(out) if isinstance(out, (bytes, str)) else None
+    return {
+        "runs": len(times),
+        "median_s": statistics.median(times),
+        "min_s": min(times),
+        "peak_kib": round(peak / 1024, 1),
+        "output_bytes": size,
+    }
+
+
+def _git(*args: str) -> str:
+    try:
+        return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "commit": _git("rev-parse", "--short", "HEAD") or "unknown",
+        "dirty": bool(_git("status", "--porcelain", "--", ".")),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+    }
+
+
+def compare(results: Dict[str, Any], baseline_path: str, threshold: float) -> bool:
+    with open(baseline_path) as f:
+        baseline = json.load(f)["results"]
+    regressed = False
+    print(f"\nvs {baseline_path}")
+    print(f"{'case':<52} {'before_ms':>10} {'after_ms':>10} {'change':>8}")
+    for name, r in results.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        change = r["median_s"] / old["median_s"] - 1 if old["median_s"] else 0.0
+        flag = ""
+        # sub-millisecond cases are mostly timer noise
+        if change > threshold and old["median_s"] >= 0.001:
+            flag, regressed = "  SLOWER", True
+        print(f"{name:<52} {old['median_s'] * 1000:>10.2f} {r['median_s'] * 1000:>10.2f} {change:>+8.1%}{flag}")
+    return regressed
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    ap.add_argument("--repeat", type=int, default=7)
+    ap.add_argument("--only", nargs="+", choices=("parse", "validate", "render"))
+    ap.add_argument("--output", help="result file (default: benchmarks/results/<commit>.json)")
+    ap.add_argument("--compare", help="earlier result file to diff against")
+    ap.add_argument("--threshold", type=float, default=0.15, help="slow-down that counts as a regression")
+    args = ap.parse_args(argv)
+
+    results: Dict[str, Any] = {}
+    print(f"{'case':<52} {'runs':>4} {'median_ms':>10} {'MB/s':>7} {'peak_kib':>9}")
+    for group, name, fn, bytes_in in cases(args.sizes):
+        if args.only and group not in args.only:
+            continue
+        r = run_case(fn, args.repeat)
+        r["group"] = group
+        if bytes_in:
+            r["input_bytes"] = bytes_in
+        results[f"{group}/{name}"] = r
+        mbps = f"{bytes_in / r['median_s'] / 1e6:7.1f}" if bytes_in else f"{'':>7}"
+        print(f"{group + '/' + name:<52} {r['runs']:>4} {r['median_s'] * 1000:>10.2f} {mbps} {r['peak_kib']:>9.0f}")
+
+    env = environment()
+    out = args.output or os.path.join(RESULTS_DIR, f"{env['commit']}{'-dirty' if env['dirty'] else ''}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump({"environment": env, "sizes": args.sizes, "results": results}, f, indent=1)
+    print(f"\nwrote {out}")
+
+    if args.compare:
+        return 1 if compare(results, args.compare, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""
+Closed-loop load generator for a running backend.
+
+    python -m loadtest.harness --base http://127.0.0.1:8000 \\
+        --scenario generate export --concurrency 1 8 32 --duration 30
+
+For each scenario and concurrency level, ``N`` workers send requests back to
+back for ``--duration`` seconds. The harness reports throughput, p50/p95/p99
+latency, the error rate and the status codes seen, and ``--output`` keeps the
+numbers as JSON.
+
+Generate briefs are unique per request, so every call misses the cache
+(``--cache-hit-ratio`` re-sends earlier briefs instead). Export posts one
+document fetched up front (made unique per request with ``--no-cache``), and
+the format cycles through pdf/docx/md.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import statistics
+import sys
+import time
+import uuid
+from typing import Any, Dict, List
+
+import httpx
+
+FORMATS = ("pdf", "docx", "md")
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def brief(i: int, reuse: bool) -> Dict[str, Any]:
+    tag = "cached" if reuse else uuid.uuid4().hex[:8]
+    return {
+        "projectName": f"Load test {tag}",
+        "projectType": "Software",
+        "description": f"Synthetic brief {tag} #{0 if reuse else i}: an order-tracking web service "
+                       "with a REST API, 500 concurrent users and 99.9% availability.",
+    }
+
+
+class Scenario:
+    def __init__(self, name: str, client: httpx.AsyncClient, args: argparse.Namespace) -> None:
+        self.name, self.client, self.args = name, client, args
+        self.doc: Dict[str, Any] | None = None
+        self._seq = itertools.count()
+
+    async def setup(self) -> None:
+        if self.name == "export":
+            r = await self.client.post("/api/generate", json=brief(0, reuse=True))
+            r.raise_for_status()
+            self.doc = r.json()
+
+    async def one(self) -> int:
+        i = next(self._seq)
+        if self.name == "generate":
+            reuse = self.args.cache_hit_ratio > 0 and (i % 100) < self.args.cache_hit_ratio * 100
+            r = await self.client.post("/api/generate", json=brief(i, reuse))
+        elif self.name == "stream":
+            async with self.client.stream("POST", "/api/generate/stream", json=brief(i, False)) as r:
+                async for _ in r.aiter_bytes():
+                    pass
+        else:
+            fmt = FORMATS[i % len(FORMATS)]
+            doc = self.doc
+            if self.args.no_cache:
+                # the export cache is keyed by content: make every document unique
+                doc = {**doc, "summary": f"{doc['summary']} (#{i})"}
+            r = await self.client.post("/api/export", params={"format": fmt}, json=doc)
+        return r.status_code
+
+
+async def run_level(scenario: Scenario, concurrency: int, duration: float) -> Dict[str, Any]:
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    deadline = time.perf_counter() + duration
+
+    async def worker() -> None:
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                status = str(await scenario.one())
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    total = len(latencies)
+    ok = sum(n for s, n in statuses.items() if s.startswith("2") or s == "304")
+    return {
+        "scenario": scenario.name,
+        "concurrency": concurrency,
+        "requests": total,
+        "throughput_rps": total / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else float("nan"),
+        "error_rate": (total - ok) / total if total else 0.0,
+        "statuses": statuses,
+    }
+
+
+def _row(r: Dict[str, Any]) -> str:
+    codes = " ".join(f"{k}:{v}" for k, v in sorted(r["statuses"].items()))
+    return (f"{r['scenario']:<9} {r['concurrency']:>5} {r['requests']:>7} {r['throughput_rps']:>8.2f} "
+            f"{r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['error_rate']:>7.2%}  {codes}")
+
+
+async def main_async(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    limits = httpx.Limits(max_connections=max(args.concurrency) + 8, max_keepalive_connections=max(args.concurrency))
+    headers = {"Cache-Control": "no-cache"} if args.no_cache else {}
+    results = []
+    async with httpx.AsyncClient(base_url=args.base, timeout=args.timeout, limits=limits, headers=headers) as client:
+        print(f"{'scenario':<9} {'conc':>5} {'reqs':>7} {'req/s':>8} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9} {'errors':>7}  statuses")
+        for name in args.scenario:
+            scenario = Scenario(name, client, args)
+            await scenario.setup()
+            for c in args.concurrency:
+                r = await run_level(scenario, c, args.duration)
+                results.append(r)
+                print(_row(r), flush=True)
+                if args.pause:
+                    await asyncio.sleep(args.pause)
+    return results
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--base", default="http://127.0.0.1:8000")
+    ap.add_argument("--scenario", nargs="+", default=["generate", "export"], choices=("generate", "stream", "export"))
+    ap.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    ap.add_argument("--duration", type=float, default=30.0, help="seconds per concurrency level")
+    ap.add_argument("--pause", type=float, default=2.0, help="idle seconds between levels")
+    ap.add_argument("--timeout", type=float, default=120.0)
+    ap.add_argument("--cache-hit-ratio", type=float, default=0.0, help="share of generate calls reusing one brief")
+    ap.add_argument("--no-cache", action="store_true", help="send Cache-Control: no-cache (bypass result caches)")
+    ap.add_argument("--output", help="write results as JSON here")
+    args = ap.parse_args(argv)
+
+    results = asyncio.run(main_async(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"base": args.base, "duration": args.duration, "results": results}, f, indent=1)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
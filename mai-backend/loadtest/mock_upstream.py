@@ -0,0 +1,197 @@
+"""
+Local stand-in for an OpenAI-compatible chat-completions upstream, so the
+backend can be load-tested without spending real model quota.
+
+    python -m loadtest.mock_upstream --port 8081 --latency lognormal:1500,0.5 \\
+        --tokens-per-second 120 --rate-429 0.05 --truncate 0.1 --fence 0.2
+
+then run the backend against it:
+
+    GITHUB_ENDPOINT=http://127.0.0.1:8081 GITHUB_TOKEN=x AI_PROVIDER=github_openai \\
+        uvicorn app.main:app
+
+Latency specs (milliseconds): ``fixed:800``, ``uniform:300,2000``,
+``lognormal:<median>,<sigma>``, ``exp:<mean>``. Time to first token follows
+``--latency``; the body then arrives at ``--tokens-per-second`` (0 = at once).
+"""
+import argparse
+import asyncio
+import math
+import random
+import re
+import time
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, List
+
+import orjson
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import StreamingResponse
+
+CATEGORIES = ("Functional", "Performance", "Safety", "Compliance", "Reliability", "Maintainability", "Verification")
+
+_NAME = re.compile(r"Project Name:\s*(.+)")
+_COUNT = re.compile(r"Create\s+(\d+)\s*[–-]\s*(\d+)")
+_CATS = re.compile(r"across categories \(([^)]*)\)")
+
+
+def latency_sampler(spec: str) -> Callable[[], float]:
+    """``kind:args`` in milliseconds -> function returning seconds."""
+    kind, _, args = spec.partition(":")
+    nums = [float(a) for a in args.split(",") if a]
+    if kind == "fixed":
+        return lambda: nums[0] / 1000
+    if kind == "uniform":
+        return lambda: random.uniform(nums[0], nums[1]) / 1000
+    if kind == "lognormal":
+        median, sigma = nums[0], (nums[1] if len(nums) > 1 else 0.5)
+        return lambda: random.lognormvariate(math.log(median), sigma) / 1000
+    if kind == "exp":
+        return lambda: random.expovariate(1 / nums[0]) / 1000
+    raise ValueError(f"unknown latency spec {spec!r}")
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def fake_document(prompt: str, count: int | None) -> Dict[str, Any]:
+    name = (_NAME.search(prompt) or [None, "Mock Project"])[1].strip()
+    cats = [c.strip() for c in (_CATS.search(prompt) or [None, ""])[1].split(",") if c.strip() in CATEGORIES]
+    cats = cats or list(CATEGORIES)
+    if count is None:
+        m = _COUNT.search(prompt)
+        count = (int(m[1]) + int(m[2])) // 2 if m else 30
+    return {
+        "project_name": name,
+        "summary": f"Mock requirements for {name}, produced by the load-test upstream.",
+        "categories": cats,
+        "requirements": [
+            {
+                "category": cats[i % len(cats)],
+                "text": f"The system MUST handle scenario {i} within {50 + i * 10} ms at the 95th percentile.",
+                "priority": ("MUST", "SHOULD", "MAY")[i % 3],
+                "acceptance_criteria": [f"Scenario {i} measured under nominal load", "Result logged and reviewed"],
+                "rationale": "Generated by the mock upstream." if i % 2 else None,
+                "standard_refs": ["ISO/IEC 25010"] if i % 4 == 0 else [],
+            }
+            for i in range(count)
+        ],
+    }
+
+
+def create_app(args: argparse.Namespace) -> FastAPI:
+    app = FastAPI(title="Mock chat-completions upstream")
+    sample_latency = latency_sampler(args.latency)
+    stats = {"requests": 0, "throttled": 0, "truncated": 0, "fenced": 0}
+
+    def _content(messages: List[Dict[str, Any]], is_repair: bool) -> tuple[str, str]:
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        text = orjson.dumps(fake_document(prompt, args.requirements)).decode()
+        finish = "stop"
+        if is_repair:
+            # the repair pass always "succeeds" with a well-formed document
+            return text, finish
+        if random.random() < args.truncate:
+            stats["truncated"] += 1
+            text, finish = text[: int(len(text) * random.uniform(0.5, 0.95))], "length"
+        elif random.random() < args.fence:
+            stats["fenced"] += 1
+            text = "```json\n" + text + "\n```"
+        return text, finish
+
+    def _usage(messages, text: str) -> Dict[str, int]:
+        prompt_tokens = sum(_tokens(str(m.get("content", ""))) for m in messages)
+        completion = _tokens(text)
+        return {"prompt_tokens": prompt_tokens, "completion_tokens": completion, "total_tokens": prompt_tokens + completion}
+
+    async def _stream(model: str, text: str, finish: str, usage: Dict[str, int]) -> AsyncIterator[bytes]:
+        cid = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        def chunk(delta: Dict[str, Any], reason: str | None = None, **extra) -> bytes:
+            body = {"id": cid, "object": "chat.completion.chunk", "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": reason}], **extra}
+            return b"data: " + orjson.dumps(body) + b"\n\n"
+
+        yield chunk({"role": "assistant", "content": ""})
+        step = 16  # characters per chunk, about four tokens
+        delay = (step / 4) / args.tokens_per_second if args.tokens_per_second > 0 else 0
+        for i in range(0, len(text), step):
+            if delay:
+                await asyncio.sleep(delay)
+            yield chunk({"content": text[i:i + step]})
+        yield chunk({}, finish, usage=usage)
+        yield b"data: [DONE]\n\n"
+
+    @app.head("/")
+    @app.get("/")
+    async def root():
+        return {"ok": True}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        if random.random() < args.rate_429:
+            stats["throttled"] += 1
+            wait = args.retry_after
+            return Response(
+                orjson.dumps({"error": {"message": "Rate limit exceeded (mock)", "type": "rate_limit_exceeded"}}),
+                status_code=429,
+                media_type="application/json",
+                headers={"Retry-After": f"{wait:g}", "x-ratelimit-remaining-requests": "0",
+                         "x-ratelimit-reset-requests": f"{wait:g}s"},
+            )
+
+        messages = body.get("messages", [])
+        is_repair = any("repair malformed JSON" in str(m.get("content", "")) for m in messages)
+        text, finish = _content(messages, is_repair)
+        usage = _usage(messages, text)
+        model = body.get("model", "mock")
+        await asyncio.sleep(sample_latency())
+
+        if body.get("stream"):
+            return StreamingResponse(_stream(model, text, finish, usage), media_type="text/event-stream")
+        if args.tokens_per_second > 0:
+            await asyncio.sleep(usage["completion_tokens"] / args.tokens_per_second)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": finish}],
+            "usage": usage,
+        }
+
+    return app
+
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8081)
+    ap.add_argument("--latency", default="lognormal:1200,0.4", help="time to first token (ms), see above")
+    ap.add_argument("--tokens-per-second", type=float, default=0, help="completion speed; 0 = instant body")
+    ap.add_argument("--requirements", type=int, default=None, help="requirements per document (default: from prompt)")
+    ap.add_argument("--rate-429", type=float, default=0.0, help="share of calls answered 429")
+    ap.add_argument("--retry-after", type=float, default=2.0, help="Retry-After seconds sent with 429s")
+    ap.add_argument("--truncate", type=float, default=0.0, help="share of outputs cut short (finish_reason=length)")
+    ap.add_argument("--fence", type=float, default=0.0, help="share of outputs wrapped in ```json fences")
+    ap.add_argument("--seed", type=int, default=None)
+    return ap.parse_args(argv)
+
+
+def main(argv: List[str] | None = None) -> None:
+    args = parse_args(argv)
+    if args.seed is not None:
+        random.seed(args.seed)
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
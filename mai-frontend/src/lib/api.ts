@@ -31,3 +31,30 @@ export async function generateRequirements(payload: GenerateReq) {
 export async function exportRequirements(format: "pdf" | "docx" | "md", payload: any) {
   return API.post(`/export?format=${format}`, payload, { responseType: "blob" });
 }
+
+export type StreamEvent = { event: string; data: any };
+
+// NDJSON variant of /generate: onEvent fires for meta, summary, categories,
+// each requirement as soon as it is produced, then done (or error).
+export async function streamRequirements(payload: GenerateReq, onEvent: (e: StreamEvent) => void) {
+  const res = await fetch(`${baseURL}/generate/stream`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(payload),
+  });
+  if (!res.ok || !res.body) throw new Error(`stream failed: ${res.status}`);
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buf = "";
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buf += decoder.decode(value, { stream: true });
+    let nl;
+    while ((nl = buf.indexOf("\n")) >= 0) {
+      const line = buf.slice(0, nl).trim();
+      buf = buf.slice(nl + 1);
+      if (line) onEvent(JSON.parse(line));
+    }
+  }
+}